@@ -0,0 +1,268 @@
+"""Result cache for seeded simulation requests.
+
+A seeded request is a pure function of its request model, so its result can be
+reused verbatim. Results live in a bounded in-process LRU with a TTL, optionally
+backed by a shared store (a SQLite file) so several workers on one host can
+reuse each other's results. Unseeded requests are never cached — each one is
+meant to be a fresh random run.
+
+The cache only helps once a result exists. :class:`SingleFlight` covers the
+window before that: concurrent identical seeded requests share the one
+computation already in flight instead of each starting their own.
+"""
+from __future__ import annotations
+
+import asyncio
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from collections.abc import Awaitable, Callable
+from functools import partial
+from typing import Protocol
+
+from pydantic import BaseModel
+
+from app import config, metrics
+
+
+class Backend(Protocol):
+    """Storage used by :class:`ResultCache`."""
+
+    def get(self, key: str) -> dict | None: ...
+
+    def set(self, key: str, value: dict) -> None: ...
+
+    def __len__(self) -> int: ...
+
+
+class MemoryBackend:
+    """Thread-safe LRU with per-entry expiry."""
+
+    def __init__(
+        self,
+        max_size: int,
+        ttl: float,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.max_size = max_size
+        self.ttl = ttl
+        self._clock = clock
+        self._entries: OrderedDict[str, tuple[float, dict]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> dict | None:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires, value = entry
+            if expires <= self._clock():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: dict) -> None:
+        if self.max_size <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (self._clock() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class SQLiteBackend:
+    """Shared LRU in a local SQLite file, e.g. for several uvicorn workers.
+
+    Each row records when it was last read or written; once the table outgrows
+    ``max_size`` the least recently used rows go first.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        max_size: int,
+        ttl: float,
+        clock: Callable[[], float] = time.time,
+    ) -> None:
+        self.max_size = max_size
+        self.ttl = ttl
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS results "
+            "(key TEXT PRIMARY KEY, value TEXT NOT NULL, expires REAL NOT NULL, "
+            "used REAL NOT NULL DEFAULT 0)"
+        )
+        columns = {row[1] for row in self._db.execute("PRAGMA table_info(results)")}
+        if "used" not in columns:  # a store written before access times were kept
+            self._db.execute("ALTER TABLE results ADD COLUMN used REAL NOT NULL DEFAULT 0")
+
+    def get(self, key: str) -> dict | None:
+        now = self._clock()
+        with self._lock:
+            row = self._db.execute(
+                "SELECT value FROM results WHERE key = ? AND expires > ?", (key, now)
+            ).fetchone()
+            if row:
+                self._db.execute("UPDATE results SET used = ? WHERE key = ?", (now, key))
+        return json.loads(row[0]) if row else None
+
+    def set(self, key: str, value: dict) -> None:
+        now = self._clock()
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO results (key, value, expires, used) VALUES (?, ?, ?, ?)",
+                (key, json.dumps(value), now + self.ttl, now),
+            )
+            # Drop expired rows, then the least recently used beyond the size bound.
+            self._db.execute("DELETE FROM results WHERE expires <= ?", (now,))
+            self._db.execute(
+                "DELETE FROM results WHERE key NOT IN "
+                "(SELECT key FROM results ORDER BY used DESC LIMIT ?)",
+                (self.max_size,),
+            )
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM results").fetchone()[0]
+
+
+def cache_key(namespace: str, request: BaseModel) -> str:
+    """Canonical key: the endpoint plus the request's fields in sorted order."""
+    params = json.dumps(request.model_dump(mode="json"), sort_keys=True, separators=(",", ":"))
+    return f"{namespace}:{params}"
+
+
+class ResultCache:
+    """Memoizes seeded simulation results and counts hits and misses.
+
+    Lookups happen on executor threads as well as the event loop, so the
+    counters are only touched under a lock.
+    """
+
+    def __init__(self, local: Backend, shared: Backend | None = None) -> None:
+        self.local = local
+        self.shared = shared
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.shared_hits = 0
+        self.misses = 0
+        self.bypassed = 0
+
+    def get(self, namespace: str, request: BaseModel) -> dict | None:
+        """Cached result for ``request``, or ``None`` (always for unseeded requests)."""
+        if getattr(request, "seed", None) is None:
+            self._count("bypassed")
+            return None
+
+        key = cache_key(namespace, request)
+        result = self.local.get(key)
+        if result is not None:
+            self._count("hits")
+            return result
+        if self.shared is not None:
+            result = self.shared.get(key)
+            if result is not None:
+                self._count("shared_hits")
+                self.local.set(key, result)
+                return result
+        self._count("misses")
+        return None
+
+    def _count(self, counter: str) -> None:
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def put(self, namespace: str, request: BaseModel, result: dict) -> None:
+        """Store a freshly computed result (a no-op for unseeded requests)."""
+        if getattr(request, "seed", None) is None:
+            return
+        key = cache_key(namespace, request)
+        self.local.set(key, result)
+        if self.shared is not None:
+            self.shared.set(key, result)
+
+    def stats(self) -> dict:
+        with self._lock:
+            hits, shared_hits = self.hits, self.shared_hits
+            misses, bypassed = self.misses, self.bypassed
+        lookups = hits + shared_hits + misses
+        return {
+            "hits": hits,
+            "shared_hits": shared_hits,
+            "misses": misses,
+            "bypassed": bypassed,
+            "hit_rate": (hits + shared_hits) / lookups if lookups else 0.0,
+            "size": len(self.local),
+            "max_size": config.RESULT_CACHE_SIZE,
+            "ttl_seconds": config.RESULT_CACHE_TTL,
+            "shared_backend": self.shared is not None,
+        }
+
+
+class SingleFlight:
+    """Runs one computation per key at a time and shares it with every caller.
+
+    The first caller for a key (the *leader*) starts the computation as its
+    own task; callers arriving while it runs (*followers*) await the same task
+    and get the same result or exception. Awaiting through
+    :func:`asyncio.shield` means a caller that goes away doesn't cancel the
+    work for the others. Followers' wait shows up as the ``coalesce`` stage.
+    """
+
+    def __init__(self) -> None:
+        self._flights: dict[str, asyncio.Task] = {}
+        self.leaders = 0
+        self.followers = 0
+
+    async def run(self, key: str, compute: Callable[[], Awaitable[dict]]) -> dict:
+        task = self._flights.get(key)
+        if task is not None:
+            self.followers += 1
+            with metrics.stage("coalesce"):
+                return await asyncio.shield(task)
+
+        self.leaders += 1
+        task = asyncio.ensure_future(compute())
+        self._flights[key] = task
+        task.add_done_callback(partial(self._land, key))
+        return await asyncio.shield(task)
+
+    def _land(self, key: str, task: asyncio.Task) -> None:
+        if self._flights.get(key) is task:
+            del self._flights[key]
+        # Mark a failure as retrieved even if every caller has gone.
+        if not task.cancelled():
+            task.exception()
+
+    def stats(self) -> dict:
+        calls = self.leaders + self.followers
+        return {
+            "leaders": self.leaders,
+            "coalesced": self.followers,
+            "in_flight": len(self._flights),
+            "coalesced_rate": self.followers / calls if calls else 0.0,
+        }
+
+
+def _build() -> ResultCache:
+    local = MemoryBackend(config.RESULT_CACHE_SIZE, config.RESULT_CACHE_TTL)
+    shared = None
+    if config.RESULT_CACHE_PATH:
+        shared = SQLiteBackend(
+            config.RESULT_CACHE_PATH, config.RESULT_CACHE_SHARED_SIZE, config.RESULT_CACHE_TTL
+        )
+    return ResultCache(local, shared)
+
+
+results = _build()
+flights = SingleFlight()
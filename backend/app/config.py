@@ -15,5 +15,75 @@ ALLOWED_ORIGINS: list[str] = _split_csv(
     os.getenv("ALLOWED_ORIGINS", "http://localhost:3000,http://127.0.0.1:3000")
 )
 
+# Upper bound on values drawn per simulation batch. Simulators run in batches of
+# roughly this many random values, so peak memory stays flat however many trials
+# a request asks for (1M int64 values ≈ 8 MB per array).
+SIMULATION_CHUNK_ELEMENTS: int = int(os.getenv("SIMULATION_CHUNK_ELEMENTS", str(1 << 20)))
+
+# Large runs are split into shards of roughly this many values, each with its own
+# RNG stream spawned from the request seed. The shard layout depends only on the
+# request, never on the worker count, so a seed always reproduces the same result.
+SIMULATION_SHARD_ELEMENTS: int = int(os.getenv("SIMULATION_SHARD_ELEMENTS", str(1 << 24)))
+
+# Processes used to run shards in parallel. 1 (the default) keeps everything in
+# the request thread; set it to the core count on multi-core hosts.
+SIMULATION_WORKERS: int = int(os.getenv("SIMULATION_WORKERS", "1"))
+
+# Seeded simulation results are cached in-process: at most RESULT_CACHE_SIZE
+# entries, each kept for RESULT_CACHE_TTL seconds. Set RESULT_CACHE_PATH to a
+# SQLite file to also share results between workers on the same host.
+RESULT_CACHE_SIZE: int = int(os.getenv("RESULT_CACHE_SIZE", "1024"))
+RESULT_CACHE_TTL: float = float(os.getenv("RESULT_CACHE_TTL", "3600"))
+RESULT_CACHE_PATH: str = os.getenv("RESULT_CACHE_PATH", "")
+RESULT_CACHE_SHARED_SIZE: int = int(os.getenv("RESULT_CACHE_SHARED_SIZE", "100000"))
+
+# Simulation requests run on their own pool instead of Starlette's shared
+# threadpool, so cheap routes stay responsive under load. SIMULATION_EXECUTOR is
+# "thread" (NumPy releases the GIL for most of the work) or "process".
+SIMULATION_EXECUTOR: str = os.getenv("SIMULATION_EXECUTOR", "thread")
+SIMULATION_POOL_SIZE: int = int(os.getenv("SIMULATION_POOL_SIZE", str(os.cpu_count() or 1)))
+# Per endpoint: runs executing at once, and further requests allowed to wait.
+# Anything beyond that is rejected with 503 + Retry-After.
+SIMULATION_CONCURRENCY: int = int(os.getenv("SIMULATION_CONCURRENCY", str(SIMULATION_POOL_SIZE)))
+SIMULATION_QUEUE_DEPTH: int = int(os.getenv("SIMULATION_QUEUE_DEPTH", "16"))
+
+# Requests sent with "X-Debug-Profile: 1" are profiled with cProfile and the
+# stats written to PROFILE_DIR (disabled while it's empty). PROFILE_SAMPLE_RATE
+# is the fraction of such requests actually profiled.
+PROFILE_DIR: str = os.getenv("PROFILE_DIR", "")
+PROFILE_SAMPLE_RATE: float = float(os.getenv("PROFILE_SAMPLE_RATE", "1.0"))
+
+# Serve simulator output without re-validating it against the response models,
+# encoded with orjson when installed. Off by default.
+FAST_JSON: bool = os.getenv("FAST_JSON", "0").lower() in ("1", "true", "yes")
+
+# Import the simulators (and NumPy) and build the default birthday table at
+# startup instead of on first use. Worth it on long-running servers; leave it
+# off on serverless, where it only lengthens every cold start.
+PREWARM: bool = os.getenv("PREWARM", "0").lower() in ("1", "true", "yes")
+
+# Deterministic responses (catalog, Simpson's dataset, birthday curves) are
+# serialized once and served with a strong ETag and this Cache-Control, so
+# browsers and CDN edges can keep them. STATIC_CACHE_SIZE bounds how many
+# distinct bodies (mostly curve parameter combinations) stay in memory.
+STATIC_CACHE_CONTROL: str = os.getenv(
+    "STATIC_CACHE_CONTROL", "public, max-age=3600, s-maxage=86400, stale-while-revalidate=604800"
+)
+STATIC_CACHE_SIZE: int = int(os.getenv("STATIC_CACHE_SIZE", "256"))
+
+# Largest body accepted by POST /api/simpsons/analyze. Uploads are parsed as
+# they arrive, so this bounds the work per request rather than memory.
+SIMPSONS_MAX_UPLOAD_BYTES: int = int(os.getenv("SIMPSONS_MAX_UPLOAD_BYTES", str(1 << 30)))
+
+# Background jobs (POST /api/jobs) for runs beyond the synchronous caps. Jobs and
+# their shard checkpoints live in a SQLite file at JOB_STORE_PATH (default: the
+# temp dir; point it at a persistent disk to survive redeploys). JOB_WORKERS
+# threads run them; at most JOB_QUEUE_DEPTH may wait. A running job whose
+# heartbeat is older than JOB_LEASE_SECONDS is presumed dead and resumed.
+JOB_STORE_PATH: str = os.getenv("JOB_STORE_PATH", "")
+JOB_WORKERS: int = int(os.getenv("JOB_WORKERS", "1"))
+JOB_QUEUE_DEPTH: int = int(os.getenv("JOB_QUEUE_DEPTH", "64"))
+JOB_LEASE_SECONDS: float = float(os.getenv("JOB_LEASE_SECONDS", "30"))
+
 PROJECT_NAME = "Paradoxes API"
 VERSION = "1.0.0"
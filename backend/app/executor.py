@@ -0,0 +1,142 @@
+"""Runs CPU-bound simulations off the event loop, with admission control.
+
+Sync FastAPI handlers all share Starlette's default threadpool, so a handful of
+huge simulations could starve cheap routes like ``/health``. Simulation
+endpoints instead await :meth:`SimulationExecutor.run`, which
+
+- runs the work on a dedicated, sized thread or process pool,
+- caps how many runs of each endpoint execute at once, and
+- queues at most ``queue_depth`` more per endpoint, rejecting the rest with
+  :class:`Busy` (served as ``503 Service Unavailable`` with ``Retry-After``).
+"""
+from __future__ import annotations
+
+import asyncio
+from collections.abc import AsyncIterator, Callable
+from concurrent.futures import Executor, ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from functools import partial
+from typing import Any
+
+from app import config, metrics
+
+
+class Busy(Exception):
+    """An endpoint's concurrency limit and queue are both full."""
+
+    def __init__(self, name: str) -> None:
+        super().__init__(f"too many concurrent '{name}' simulations; retry shortly")
+        self.name = name
+
+
+class _Limit:
+    def __init__(self, concurrency: int) -> None:
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self.running = 0
+        self.waiting = 0
+        self.rejected = 0
+
+
+class SimulationExecutor:
+    """A sized worker pool plus per-endpoint concurrency limits."""
+
+    def __init__(
+        self,
+        kind: str = "thread",
+        workers: int = 4,
+        concurrency: int = 4,
+        queue_depth: int = 16,
+    ) -> None:
+        if kind not in ("thread", "process"):
+            raise ValueError(f"unknown executor kind {kind!r}")
+        self.kind = kind
+        self.workers = workers
+        self.concurrency = concurrency
+        self.queue_depth = queue_depth
+        # Generators (streams) can't cross process boundaries, so there is
+        # always a thread pool; the process pool is only built when configured.
+        self.threads = ThreadPoolExecutor(workers, thread_name_prefix="simulation")
+        self._processes: Executor | None = None
+        self._limits: dict[str, _Limit] = {}
+
+    @property
+    def pool(self) -> Executor:
+        if self.kind == "thread":
+            return self.threads
+        if self._processes is None:
+            # Imported here: multiprocessing is a noticeable share of cold start.
+            import multiprocessing
+            from concurrent.futures import ProcessPoolExecutor
+
+            context = multiprocessing.get_context("spawn")
+            self._processes = ProcessPoolExecutor(self.workers, mp_context=context)
+        return self._processes
+
+    def check(self, name: str) -> None:
+        """Raise :class:`Busy` if a new ``name`` run would be rejected right now."""
+        limit = self._limits.get(name)
+        if limit and limit.semaphore.locked() and limit.waiting >= self.queue_depth:
+            limit.rejected += 1
+            raise Busy(name)
+
+    @asynccontextmanager
+    async def limit(self, name: str) -> AsyncIterator[None]:
+        """Hold one of ``name``'s concurrency slots, queueing if allowed."""
+        self.check(name)
+        limit = self._limits.setdefault(name, _Limit(self.concurrency))
+        limit.waiting += 1
+        try:
+            with metrics.stage("queue"):
+                await limit.semaphore.acquire()
+        finally:
+            limit.waiting -= 1
+        limit.running += 1
+        try:
+            yield
+        finally:
+            limit.running -= 1
+            limit.semaphore.release()
+
+    async def call(self, fn: Callable[..., Any], *args: Any, threads: bool = False) -> Any:
+        """Run ``fn(*args)`` on the pool (or the thread pool if ``threads``).
+
+        On threads the call joins the current request's metrics trace.
+        """
+        pool = self.threads if threads else self.pool
+        job = partial(fn, *args)
+        if pool is self.threads:
+            job = metrics.bind(job)
+        return await asyncio.get_running_loop().run_in_executor(pool, job)
+
+    async def run(self, name: str, fn: Callable[[], Any]) -> Any:
+        """Run ``fn`` under ``name``'s concurrency limit, off the event loop."""
+        async with self.limit(name):
+            return await self.call(fn)
+
+    def stats(self) -> dict:
+        return {
+            "kind": self.kind,
+            "workers": self.workers,
+            "concurrency": self.concurrency,
+            "queue_depth": self.queue_depth,
+            "endpoints": {
+                name: {"running": lim.running, "waiting": lim.waiting, "rejected": lim.rejected}
+                for name, lim in self._limits.items()
+            },
+        }
+
+    def shutdown(self) -> None:
+        """Stop the pools. Fresh ones replace them, so the app can start again."""
+        self.threads.shutdown(cancel_futures=True)
+        self.threads = ThreadPoolExecutor(self.workers, thread_name_prefix="simulation")
+        if self._processes is not None:
+            self._processes.shutdown(cancel_futures=True)
+            self._processes = None
+
+
+simulations = SimulationExecutor(
+    kind=config.SIMULATION_EXECUTOR,
+    workers=config.SIMULATION_POOL_SIZE,
+    concurrency=config.SIMULATION_CONCURRENCY,
+    queue_depth=config.SIMULATION_QUEUE_DEPTH,
+)
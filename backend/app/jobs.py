@@ -0,0 +1,391 @@
+"""Background jobs for simulations too large for a synchronous request.
+
+``POST /api/jobs`` stores the request in a SQLite file and returns at once; a
+small pool of worker threads claims queued jobs and runs them, and ``GET
+/api/jobs/{id}`` reports status, progress and, finally, the result.
+
+- **Checkpoints.** Jobs run under :func:`engine.checkpointing`, so each
+  finished shard's totals are written to the store. A job interrupted by a
+  restart is picked up again once its lease lapses and skips the shards it
+  already has; shards depend only on the seed, so the result is unchanged.
+- **Reproducible reruns.** A seeded job is keyed on its canonical request; a
+  repeat submission returns the existing job (and its stored result) instead
+  of running again. Unseeded jobs are assigned a seed up front so that a
+  resumed run stays consistent.
+- **Several processes.** Jobs are claimed with an atomic update that records
+  a fresh claim token, and a heartbeat thread renews the claim while the job
+  runs. A worker whose claim lapsed (it stalled, and another worker took the
+  job over) can no longer save shards, report a result or drop checkpoints, so
+  web workers sharing one store never run the same job twice. A unique index
+  on the request key keeps concurrent identical submissions down to one job.
+
+No broker is involved: the store is a local file (``JOB_STORE_PATH``), which
+makes jobs per-host.
+"""
+from __future__ import annotations
+
+import json
+import os
+import secrets
+import sqlite3
+import tempfile
+import threading
+import time
+import uuid
+from collections.abc import Callable
+from typing import Any
+
+from app import config
+
+# Statuses, in order; the last three are final.
+STATUSES = ("queued", "running", "done", "failed", "cancelled")
+
+# Jobs that count for deduplication: a failed or cancelled one may be retried.
+_LIVE = "status NOT IN ('failed', 'cancelled')"
+
+
+class Cancelled(Exception):
+    """Raised inside a running job once it was cancelled or its claim was lost."""
+
+
+class JobStore:
+    """Jobs and their shard checkpoints in a SQLite file."""
+
+    def __init__(self, path: str, clock: Callable[[], float] = time.time) -> None:
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            "id TEXT PRIMARY KEY, key TEXT, paradox TEXT NOT NULL, params TEXT NOT NULL, "
+            "status TEXT NOT NULL, progress REAL NOT NULL, result TEXT, error TEXT, "
+            "created REAL NOT NULL, updated REAL NOT NULL, owner TEXT)"
+        )
+        columns = {row[1] for row in self._db.execute("PRAGMA table_info(jobs)")}
+        if "owner" not in columns:  # a store written before claims carried a token
+            self._db.execute("ALTER TABLE jobs ADD COLUMN owner TEXT")
+        self._unique_keys()
+        self._db.execute("CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, created)")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS checkpoints ("
+            "job TEXT NOT NULL, run INTEGER NOT NULL, shard INTEGER NOT NULL, "
+            "shards INTEGER NOT NULL, totals TEXT NOT NULL, PRIMARY KEY (job, run, shard))"
+        )
+
+    def _unique_keys(self) -> None:
+        # At most one live job per key; failed and cancelled ones may be retried.
+        # Older stores had a plain index and may hold duplicates: keep the newest.
+        self._db.execute("DROP INDEX IF EXISTS jobs_key")
+        self._db.execute(
+            f"UPDATE jobs SET key = NULL WHERE key IS NOT NULL AND {_LIVE} AND created < "
+            f"(SELECT MAX(created) FROM jobs AS newer WHERE newer.key = jobs.key AND {_LIVE})"
+        )
+        self._db.execute(
+            f"CREATE UNIQUE INDEX IF NOT EXISTS jobs_live_key ON jobs (key) WHERE {_LIVE}"
+        )
+
+    def _row(self, row: tuple | None) -> dict | None:
+        if row is None:
+            return None
+        id_, paradox, params, status, progress, result, error, created, updated = row
+        job = {
+            "id": id_,
+            "paradox": paradox,
+            "request": json.loads(params),
+            "status": status,
+            "progress": progress,
+            "created": created,
+            "updated": updated,
+        }
+        if result is not None:
+            job["result"] = json.loads(result)
+        if error is not None:
+            job["error"] = error
+        return job
+
+    _COLUMNS = "id, paradox, params, status, progress, result, error, created, updated"
+
+    def create(self, paradox: str, params: dict, key: str | None = None) -> tuple[dict, bool]:
+        """Queue a job; ``(job, created)``, or the live job already under ``key``."""
+        job_id = uuid.uuid4().hex
+        while True:
+            now = self._clock()
+            with self._lock:
+                created = self._db.execute(
+                    "INSERT INTO jobs "
+                    "(id, key, paradox, params, status, progress, created, updated) "
+                    "VALUES (?, ?, ?, ?, 'queued', 0, ?, ?) ON CONFLICT DO NOTHING",
+                    (job_id, key, paradox, json.dumps(params), now, now),
+                ).rowcount
+            if created:
+                return self.get(job_id), True
+            # Retry if the conflicting job failed or was cancelled meanwhile.
+            existing = self.find(key)
+            if existing is not None:
+                return existing, False
+
+    def get(self, job_id: str) -> dict | None:
+        with self._lock:
+            row = self._db.execute(
+                f"SELECT {self._COLUMNS} FROM jobs WHERE id = ?", (job_id,)
+            ).fetchone()
+        return self._row(row)
+
+    def find(self, key: str) -> dict | None:
+        """The latest job for ``key`` that hasn't failed or been cancelled."""
+        with self._lock:
+            row = self._db.execute(
+                f"SELECT {self._COLUMNS} FROM jobs WHERE key = ? AND {_LIVE} "
+                "ORDER BY created DESC LIMIT 1",
+                (key,),
+            ).fetchone()
+        return self._row(row)
+
+    def queued(self) -> int:
+        with self._lock:
+            return self._db.execute(
+                "SELECT COUNT(*) FROM jobs WHERE status = 'queued'"
+            ).fetchone()[0]
+
+    def claim(self, lease: float) -> dict | None:
+        """Mark the oldest runnable job as running and return it.
+
+        Runnable means queued, or running with no heartbeat for ``lease``
+        seconds — its worker died or stalled. The job's ``"token"`` identifies
+        this claim: only its holder may save, finish or clean up the job.
+        """
+        now = self._clock()
+        token = uuid.uuid4().hex
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._db.execute(
+                    "SELECT id FROM jobs WHERE status = 'queued' "
+                    "OR (status = 'running' AND updated < ?) ORDER BY created LIMIT 1",
+                    (now - lease,),
+                ).fetchone()
+                if row is not None:
+                    self._db.execute(
+                        "UPDATE jobs SET status = 'running', updated = ?, owner = ? WHERE id = ?",
+                        (now, token, row[0]),
+                    )
+                self._db.execute("COMMIT")
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+        if row is None:
+            return None
+        return {**self.get(row[0]), "token": token}
+
+    def update(self, job_id: str, token: str, **fields: Any) -> bool:
+        """Set ``status``, ``progress``, ``result`` or ``error``, and the heartbeat.
+
+        Only while the job is running under claim ``token``; ``False`` otherwise
+        (it was cancelled, or another worker has claimed it since).
+        """
+        if "result" in fields:
+            fields["result"] = json.dumps(fields["result"])
+        columns = "".join(f"{name} = ?, " for name in fields)
+        with self._lock:
+            return self._db.execute(
+                f"UPDATE jobs SET {columns}updated = ? "
+                "WHERE id = ? AND owner = ? AND status = 'running'",
+                (*fields.values(), self._clock(), job_id, token),
+            ).rowcount > 0
+
+    def cancel(self, job_id: str) -> None:
+        with self._lock:
+            cancelled = self._db.execute(
+                "UPDATE jobs SET status = 'cancelled', updated = ? "
+                "WHERE id = ? AND status IN ('queued', 'running')",
+                (self._clock(), job_id),
+            ).rowcount
+        if cancelled:
+            # A running worker may save one more shard; it drops them again
+            # once it notices the cancellation.
+            self.drop_checkpoints(job_id)
+
+    def checkpoints(self, job_id: str, run: int) -> list[tuple[int, int, dict]]:
+        """``(shard, shard count, totals)`` saved for one of a job's runs."""
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT shard, shards, totals FROM checkpoints WHERE job = ? AND run = ?",
+                (job_id, run),
+            ).fetchall()
+        return [(shard, shards, json.loads(totals)) for shard, shards, totals in rows]
+
+    def checkpoint(
+        self, job_id: str, token: str, run: int, shard: int, shards: int, totals: dict
+    ) -> bool:
+        """Save a shard's totals if the job still runs under ``token``."""
+        with self._lock:
+            return self._db.execute(
+                "INSERT OR REPLACE INTO checkpoints SELECT ?, ?, ?, ?, ? WHERE EXISTS "
+                "(SELECT 1 FROM jobs WHERE id = ? AND owner = ? AND status = 'running')",
+                (job_id, run, shard, shards, json.dumps(totals), job_id, token),
+            ).rowcount > 0
+
+    def drop_checkpoints(self, job_id: str, token: str | None = None) -> None:
+        """Delete a job's checkpoints; with ``token``, only if that claim is the latest."""
+        query, args = "DELETE FROM checkpoints WHERE job = ?", (job_id,)
+        if token is not None:
+            query += " AND EXISTS (SELECT 1 FROM jobs WHERE id = ? AND owner = ?)"
+            args += (job_id, token)
+        with self._lock:
+            self._db.execute(query, args)
+
+
+class _Checkpoint:
+    """Saves one job's shards (see :class:`engine.Checkpoint`)."""
+
+    def __init__(self, store: JobStore, job_id: str, token: str) -> None:
+        self.store = store
+        self.job_id = job_id
+        self.token = token
+        self.runs = 0
+
+    def restore(self, shards: int) -> dict[int, dict]:
+        self.run, self.shards = self.runs, shards
+        self.runs += 1
+        # A different shard count means the layout changed; start that run over.
+        saved = self.store.checkpoints(self.job_id, self.run)
+        return {shard: totals for shard, count, totals in saved if count == shards}
+
+    def save(self, shard: int, totals: dict, done: int, trials: int) -> None:
+        saved = self.store.checkpoint(
+            self.job_id, self.token, self.run, shard, self.shards, totals
+        )
+        if not saved or not self.store.update(self.job_id, self.token, progress=done / trials):
+            raise Cancelled(self.job_id)
+
+
+class Full(Exception):
+    """The job queue is at ``JOB_QUEUE_DEPTH``."""
+
+
+# Resolves a stored ``(paradox, request params)`` to the call that runs it.
+Resolver = Callable[[str, dict], Callable[[], dict]]
+
+
+class JobRunner:
+    """Worker threads that claim and run jobs from a :class:`JobStore`."""
+
+    def __init__(
+        self,
+        path: str,
+        workers: int = 1,
+        queue_depth: int = 64,
+        lease: float = 30.0,
+        poll: float = 1.0,
+    ) -> None:
+        self.path = path
+        self.workers = workers
+        self.queue_depth = queue_depth
+        self.lease = lease
+        self.poll = poll
+        self._store: JobStore | None = None
+        self._resolve: Resolver | None = None
+        self._threads: list[threading.Thread] = []
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._start_lock = threading.Lock()
+
+    @property
+    def store(self) -> JobStore:
+        # Opened on first use, so importing the app doesn't touch the disk.
+        if self._store is None:
+            self._store = JobStore(self.path)
+        return self._store
+
+    def start(self, resolve: Resolver) -> None:
+        """Start the workers (once); they also resume jobs left by a previous run."""
+        with self._start_lock:
+            self._resolve = resolve
+            if self._threads:
+                return
+            self._stop.clear()
+            for i in range(self.workers):
+                thread = threading.Thread(target=self._work, name=f"job-{i}", daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def submit(self, paradox: str, params: dict, key: str | None = None) -> tuple[dict, bool]:
+        """Queue a job, or return the existing one for ``key``; ``(job, created)``."""
+        if key is not None:
+            existing = self.store.find(key)
+            if existing is not None:
+                return existing, False
+        if self.store.queued() >= self.queue_depth:
+            raise Full(f"{self.queue_depth} jobs are already queued; retry later")
+        if params.get("seed") is None:
+            # Fix the seed now so a resumed job continues the same run.
+            params = {**params, "seed": secrets.randbits(63)}
+        # Checked again atomically on insert: a concurrent twin may have won.
+        job, created = self.store.create(paradox, params, key)
+        if created:
+            self._wake.set()
+        return job, created
+
+    def _work(self) -> None:
+        while not self._stop.is_set():
+            job = self.store.claim(self.lease)
+            if job is None:
+                self._wake.wait(self.poll)
+                self._wake.clear()
+                continue
+            self._run(job)
+
+    def _run(self, job: dict) -> None:
+        from app.simulations import engine
+
+        job_id, token = job["id"], job["token"]
+        finished = threading.Event()
+        heartbeat = threading.Thread(
+            target=self._heartbeat, args=(job_id, token, finished), daemon=True
+        )
+        heartbeat.start()
+        try:
+            call = self._resolve(job["paradox"], job["request"])
+            with engine.checkpointing(_Checkpoint(self.store, job_id, token)):
+                result = call()
+        except Cancelled:
+            pass
+        except Exception as exc:  # noqa: BLE001 - reported on the job
+            error = f"{type(exc).__name__}: {exc}"
+            self.store.update(job_id, token, status="failed", error=error)
+        else:
+            # A no-op if the job was cancelled after its last shard.
+            self.store.update(job_id, token, status="done", progress=1.0, result=result)
+        finally:
+            finished.set()
+            heartbeat.join()
+        # Finished one way or another: nothing will resume from these, unless
+        # another worker has taken the job over.
+        self.store.drop_checkpoints(job_id, token)
+
+    def _heartbeat(self, job_id: str, token: str, finished: threading.Event) -> None:
+        # Renews the claim well inside the lease, however long a shard takes.
+        interval = self.lease / 3 if self.lease > 0 else self.poll
+        while not finished.wait(interval):
+            if not self.store.update(job_id, token):
+                return
+
+    def shutdown(self) -> None:
+        self._stop.set()
+        self._wake.set()
+        for thread in self._threads:
+            thread.join(timeout=self.poll)
+        self._threads.clear()
+
+
+def _default_path() -> str:
+    return config.JOB_STORE_PATH or os.path.join(tempfile.gettempdir(), "paradoxes-jobs.sqlite3")
+
+
+runner = JobRunner(
+    _default_path(),
+    workers=config.JOB_WORKERS,
+    queue_depth=config.JOB_QUEUE_DEPTH,
+    lease=config.JOB_LEASE_SECONDS,
+)
@@ -1,13 +1,35 @@
 """FastAPI entry point for the Paradoxes API."""
 from __future__ import annotations
 
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse
 
-from app import config
+from app import cache, config, executor, jobs, metrics, responses, simulations
 from app.routers import paradoxes
 
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Simulators load lazily by default; see config.PREWARM.
+    if config.PREWARM:
+        simulations.prewarm()
+    paradoxes.prerender(datasets=config.PREWARM)
+    # Resumes any jobs a previous process left unfinished.
+    jobs.runner.start(paradoxes.run_job)
+    yield
+    jobs.runner.shutdown()
+    executor.simulations.shutdown()
+    simulations.shutdown()
+
+
 app = FastAPI(
+    lifespan=lifespan,
+    default_response_class=(
+        responses.FastJSONResponse if config.FAST_JSON else responses.JSONResponse
+    ),
     title=config.PROJECT_NAME,
     version=config.VERSION,
     description="Monte Carlo simulations and datasets behind classic probability paradoxes.",
@@ -19,17 +41,48 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["Server-Timing", "ETag", "Content-Disposition", "X-Seed"],
 )
+app.add_middleware(metrics.MetricsMiddleware)
 
 app.include_router(paradoxes.router)
 
 
 @app.get("/health", tags=["meta"])
-def health():
+async def health():
     """Liveness probe used by Render and uptime checks."""
     return {"status": "ok", "version": config.VERSION}
 
 
+@app.get("/api/cache/stats", tags=["meta"])
+def cache_stats():
+    """Hit/miss counters for the seeded-result cache, plus request coalescing."""
+    return {**cache.results.stats(), "single_flight": cache.flights.stats()}
+
+
+@app.get("/api/executor/stats", tags=["meta"])
+def executor_stats():
+    """Pool settings and per-endpoint running/waiting/rejected counts."""
+    return executor.simulations.stats()
+
+
+@app.get("/metrics", tags=["meta"], response_class=PlainTextResponse)
+def prometheus_metrics():
+    """Request, stage, cache and executor counters in Prometheus text format."""
+    gauges = {
+        f"paradoxes_cache_{key}": value
+        for key, value in cache.results.stats().items()
+        if key in ("hits", "shared_hits", "misses", "bypassed", "size")
+    }
+    for key, value in cache.flights.stats().items():
+        if key != "coalesced_rate":
+            gauges[f"paradoxes_single_flight_{key}"] = value
+    for name, lim in executor.simulations.stats()["endpoints"].items():
+        for key, value in lim.items():
+            gauges[f'paradoxes_executor_{key}{{endpoint="{name}"}}'] = value
+    return metrics.registry.render(gauges)
+
+
 @app.get("/", tags=["meta"])
 def root():
     return {
@@ -0,0 +1,270 @@
+"""Per-request stage timings, Prometheus metrics and on-demand profiles.
+
+:class:`MetricsMiddleware` opens a *trace* for every HTTP request. Code on the
+hot path marks its stages — ``with stage("sort"):`` or ``timed("rng", fn, ...)``
+— and each stage's self time (nested stages are subtracted from their parent)
+and allocated bytes add up in the trace. When no request is being traced, as in
+tests and benchmarks, a stage costs a single context-variable lookup.
+
+A finished trace is reported twice: as a ``Server-Timing`` header on the
+response, and folded into the process-wide :data:`registry` served as Prometheus
+text at ``/metrics``. Stages recorded in worker *processes*
+(``SIMULATION_EXECUTOR=process`` or ``SIMULATION_WORKERS > 1``) aren't seen.
+
+With ``PROFILE_DIR`` set, a request carrying ``X-Debug-Profile: 1`` is also
+run under :mod:`cProfile` — on the event loop and on the simulation thread —
+and the merged stats are written to ``PROFILE_DIR``, named in the
+``X-Profile-File`` response header. The event-loop profile also catches other
+requests' coroutines that ran in the meantime; profile on a quiet instance.
+"""
+from __future__ import annotations
+
+import contextvars
+import cProfile
+import pstats
+import random
+import threading
+import time
+import uuid
+from collections.abc import Callable, Iterator
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any
+
+from app import config
+
+# Request latency histogram buckets, in seconds.
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+PROFILE_HEADER = "x-debug-profile"
+
+# cProfile allows one active profiler per thread, so profile one request at a time.
+_profiling = threading.Lock()
+
+
+class Trace:
+    """Stage totals for one request."""
+
+    def __init__(self, profile: bool = False) -> None:
+        # stage -> [self seconds, bytes, calls]
+        self.stages: dict[str, list[float]] = {}
+        self.profile = profile
+        self.profilers: list[cProfile.Profile] = []
+        self._stack: list[float] = []
+
+    def add(self, name: str, seconds: float, nbytes: int = 0) -> None:
+        totals = self.stages.setdefault(name, [0.0, 0, 0])
+        totals[0] += seconds
+        totals[1] += nbytes
+        totals[2] += 1
+
+
+_trace: contextvars.ContextVar[Trace | None] = contextvars.ContextVar("trace", default=None)
+
+
+@contextmanager
+def stage(name: str) -> Iterator[None]:
+    """Time a block as stage ``name`` of the current request."""
+    trace = _trace.get()
+    if trace is None:
+        yield
+        return
+    trace._stack.append(0.0)
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        nested = trace._stack.pop()
+        if trace._stack:
+            trace._stack[-1] += elapsed
+        trace.add(name, elapsed - nested)
+
+
+def _nbytes(value: Any) -> int:
+    # Arrays, or a batch's dict of them.
+    if isinstance(value, dict):
+        return sum(_nbytes(v) for v in value.values())
+    return getattr(value, "nbytes", 0)
+
+
+def timed(name: str, fn: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+    """Call ``fn`` as stage ``name``, counting the bytes of the arrays it returns."""
+    trace = _trace.get()
+    if trace is None:
+        return fn(*args, **kwargs)
+    with stage(name):
+        result = fn(*args, **kwargs)
+    trace.stages[name][1] += _nbytes(result)
+    return result
+
+
+def bind(fn: Callable[[], Any]) -> Callable[[], Any]:
+    """Carry the current trace (and profiler) into ``fn`` on another thread."""
+    trace = _trace.get()
+    if trace is None:
+        return fn
+    context = contextvars.copy_context()
+
+    def run() -> Any:
+        if not trace.profile:
+            return context.run(fn)
+        profiler = cProfile.Profile()
+        trace.profilers.append(profiler)
+        profiler.enable()
+        try:
+            return context.run(fn)
+        finally:
+            profiler.disable()
+
+    return run
+
+
+class Registry:
+    """Process-wide request and stage counters, rendered as Prometheus text."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self.requests: dict[tuple[str, str, int], int] = {}
+        # route -> [bucket counts..., sum, count]
+        self.durations: dict[str, list[float]] = {}
+        # (route, stage) -> [seconds, bytes, calls]
+        self.stages: dict[tuple[str, str], list[float]] = {}
+
+    def observe(self, route: str, method: str, status: int, seconds: float, trace: Trace) -> None:
+        with self._lock:
+            key = (route, method, status)
+            self.requests[key] = self.requests.get(key, 0) + 1
+            hist = self.durations.setdefault(route, [0] * (len(BUCKETS) + 2))
+            for i, bound in enumerate(BUCKETS):
+                if seconds <= bound:
+                    hist[i] += 1
+            hist[-2] += seconds
+            hist[-1] += 1
+            for name, (secs, nbytes, calls) in trace.stages.items():
+                totals = self.stages.setdefault((route, name), [0.0, 0, 0])
+                totals[0] += secs
+                totals[1] += nbytes
+                totals[2] += calls
+
+    def render(self, gauges: dict[str, float] | None = None) -> str:
+        lines = [
+            "# HELP paradoxes_requests_total HTTP requests handled.",
+            "# TYPE paradoxes_requests_total counter",
+        ]
+        with self._lock:
+            for (route, method, status), count in sorted(self.requests.items()):
+                labels = f'route="{route}",method="{method}",status="{status}"'
+                lines.append(f"paradoxes_requests_total{{{labels}}} {count}")
+
+            lines += [
+                "# HELP paradoxes_request_duration_seconds Time to the response headers.",
+                "# TYPE paradoxes_request_duration_seconds histogram",
+            ]
+            metric = "paradoxes_request_duration_seconds"
+            for route, hist in sorted(self.durations.items()):
+                bounds = [*BUCKETS, "+Inf"]
+                counts = [*hist[: len(BUCKETS)], hist[-1]]
+                for bound, count in zip(bounds, counts):
+                    lines.append(f'{metric}_bucket{{route="{route}",le="{bound}"}} {count}')
+                lines += [
+                    f'{metric}_sum{{route="{route}"}} {hist[-2]}',
+                    f'{metric}_count{{route="{route}"}} {hist[-1]}',
+                ]
+
+            for index, (metric, help_text) in enumerate([
+                ("paradoxes_stage_seconds_total", "Self time spent in each request stage."),
+                ("paradoxes_stage_bytes_total", "Array bytes allocated in each stage."),
+                ("paradoxes_stage_calls_total", "Times each stage ran."),
+            ]):
+                lines += [f"# HELP {metric} {help_text}", f"# TYPE {metric} counter"]
+                for (route, name), totals in sorted(self.stages.items()):
+                    lines.append(f'{metric}{{route="{route}",stage="{name}"}} {totals[index]}')
+
+        typed = set()
+        for name, value in (gauges or {}).items():
+            base = name.split("{")[0]
+            if base not in typed:
+                typed.add(base)
+                lines.append(f"# TYPE {base} gauge")
+            lines.append(f"{name} {value}")
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+
+def server_timing(trace: Trace, total: float) -> str:
+    """``Server-Timing`` header value; ``other`` is time outside any stage."""
+    entries = [f"{name};dur={secs * 1e3:.3f}" for name, (secs, _, _) in trace.stages.items()]
+    other = total - sum(secs for secs, _, _ in trace.stages.values())
+    entries += [f"other;dur={max(other, 0) * 1e3:.3f}", f"total;dur={total * 1e3:.3f}"]
+    return ", ".join(entries)
+
+
+def _save_profile(trace: Trace, main: cProfile.Profile) -> str:
+    stats = pstats.Stats(main)
+    for profiler in trace.profilers:
+        stats.add(profiler)
+    name = f"{time.strftime('%Y%m%dT%H%M%S')}-{uuid.uuid4().hex[:8]}.prof"
+    directory = Path(config.PROFILE_DIR)
+    directory.mkdir(parents=True, exist_ok=True)
+    stats.dump_stats(directory / name)
+    return name
+
+
+class MetricsMiddleware:
+    """ASGI middleware that traces each HTTP request (see the module docstring)."""
+
+    def __init__(self, app) -> None:
+        self.app = app
+
+    async def __call__(self, scope, receive, send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        headers = dict(scope["headers"])
+        profile = (
+            bool(config.PROFILE_DIR)
+            and headers.get(PROFILE_HEADER.encode()) == b"1"
+            and random.random() < config.PROFILE_SAMPLE_RATE
+            and _profiling.acquire(blocking=False)
+        )
+        trace = Trace(profile)
+        token = _trace.set(trace)
+        profiler = cProfile.Profile() if profile else None
+        start = time.perf_counter()
+        observed = False
+
+        def observe(status: int) -> float:
+            nonlocal observed
+            observed = True
+            elapsed = time.perf_counter() - start
+            route = getattr(scope.get("route"), "path", "unmatched")
+            registry.observe(route, scope["method"], status, elapsed, trace)
+            return elapsed
+
+        async def send_with_timing(message) -> None:
+            if message["type"] == "http.response.start":
+                elapsed = observe(message["status"])
+                extra = [(b"server-timing", server_timing(trace, elapsed).encode())]
+                if profiler is not None:
+                    profiler.disable()
+                    extra.append((b"x-profile-file", _save_profile(trace, profiler).encode()))
+                message["headers"] = list(message.get("headers", [])) + extra
+            await send(message)
+
+        if profiler is not None:
+            profiler.enable()
+        try:
+            await self.app(scope, receive, send_with_timing)
+        except Exception:
+            if not observed:
+                observe(500)
+            raise
+        finally:
+            if profiler is not None:
+                profiler.disable()
+                _profiling.release()
+            _trace.reset(token)
@@ -0,0 +1,135 @@
+"""JSON responses: the default (timed) encoder, the opt-in fast path, and
+memoized static responses.
+
+By default endpoints return plain dicts that FastAPI validates against their
+``response_model`` and encodes with the standard library. Simulator output is
+generated by us and already has the documented shape, so with ``FAST_JSON``
+enabled the router hands it straight to :class:`FastJSONResponse` instead —
+skipping model validation and ``jsonable_encoder`` — and encodes with orjson
+when it is installed (falling back to the standard library otherwise).
+
+Deterministic endpoints (the catalog, the Simpson's dataset, birthday curves)
+go further: :func:`static` validates and serializes each distinct body once,
+then serves the stored bytes with a strong ``ETag`` and ``Cache-Control``, and
+answers a matching ``If-None-Match`` with ``304 Not Modified``.
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+from collections.abc import Callable, Hashable
+from typing import Any
+
+from fastapi import Request, responses
+from pydantic import TypeAdapter
+
+from app import config, metrics
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - orjson is optional
+    orjson = None
+
+
+def dumps(content: Any) -> bytes:
+    """Compact JSON bytes, via orjson when available."""
+    if orjson is not None:
+        return orjson.dumps(content, option=orjson.OPT_SERIALIZE_NUMPY)
+    return json.dumps(content, ensure_ascii=False, separators=(",", ":")).encode()
+
+
+def encode(content: Any) -> str:
+    """JSON text for streamed lines, using the fast encoder under ``FAST_JSON``."""
+    if config.FAST_JSON:
+        return dumps(content).decode()
+    return json.dumps(content)
+
+
+class JSONResponse(responses.JSONResponse):
+    """Stock JSON response whose encoding is recorded as the ``encode`` stage."""
+
+    def render(self, content: Any) -> bytes:
+        with metrics.stage("encode"):
+            return super().render(content)
+
+
+class FastJSONResponse(responses.JSONResponse):
+    """JSON response encoded with :func:`dumps`."""
+
+    def render(self, content: Any) -> bytes:
+        with metrics.stage("encode"):
+            return dumps(content)
+
+
+def trusted(content: Any) -> Any:
+    """Return simulator output, pre-encoded when ``FAST_JSON`` is on.
+
+    A ``Response`` returned from an endpoint bypasses its ``response_model``,
+    so only use this for values that already match the declared model.
+    """
+    if config.FAST_JSON:
+        return FastJSONResponse(content)
+    return content
+
+
+class _Static:
+    """Serialized bodies and their ETags, least recently used evicted first."""
+
+    def __init__(self, max_size: int) -> None:
+        self.max_size = max_size
+        self._entries: OrderedDict[Hashable, tuple[bytes, str]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable, build: Callable[[], Any], model: Any) -> tuple[bytes, str]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                return entry
+        # Built outside the lock: two first requests may both build, harmlessly.
+        adapter = TypeAdapter(model)
+        content = adapter.dump_python(adapter.validate_python(build()), mode="json")
+        with metrics.stage("encode"):
+            body = dumps(content)
+        entry = body, f'"{hashlib.sha256(body).hexdigest()[:32]}"'
+        with self._lock:
+            self._entries[key] = entry
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+        return entry
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+_static = _Static(config.STATIC_CACHE_SIZE)
+
+
+def warm(key: Hashable, build: Callable[[], Any], model: Any) -> None:
+    """Serialize a :func:`static` body now rather than on its first request."""
+    _static.get(key, build, model)
+
+
+def _matches(if_none_match: str | None, etag: str) -> bool:
+    # If-None-Match uses weak comparison, so a W/ prefix doesn't matter.
+    if not if_none_match:
+        return False
+    tags = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+    return "*" in tags or etag in tags
+
+
+def static(
+    request: Request, key: Hashable, build: Callable[[], Any], model: Any
+) -> responses.Response:
+    """Serve ``build()`` (validated as ``model``) from bytes serialized once per ``key``.
+
+    The body is cached for the life of the process, so only use this for
+    content that is a pure function of ``key``.
+    """
+    body, etag = _static.get(key, build, model)
+    headers = {"ETag": etag, "Cache-Control": config.STATIC_CACHE_CONTROL}
+    if _matches(request.headers.get("if-none-match"), etag):
+        return responses.Response(status_code=304, headers=headers)
+    return responses.Response(body, media_type="application/json", headers=headers)
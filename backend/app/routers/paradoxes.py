@@ -1,51 +1,616 @@
 """API routes for every paradox simulation and dataset."""
 from __future__ import annotations
 
-from fastapi import APIRouter, Query
-
-from app import catalog, schemas
-from app.simulations import (
-    birthday,
-    monty_hall,
-    simpsons,
-    sleeping_beauty,
-    two_envelopes,
+import secrets
+import tempfile
+from collections.abc import Callable, Iterable, Iterator
+from functools import partial
+from typing import Any
+
+from fastapi import APIRouter, HTTPException, Query, Request, Response
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel
+
+from app import (
+    cache,
+    catalog,
+    config,
+    executor,
+    jobs,
+    metrics,
+    responses,
+    schemas,
+    simulations,
 )
 
 router = APIRouter(prefix="/api", tags=["paradoxes"])
 
 
+def _busy(exc: executor.Busy) -> HTTPException:
+    return HTTPException(503, detail=str(exc), headers={"Retry-After": "1"})
+
+
+# Per paradox: the request model, and a picklable zero-argument call that runs
+# the simulation a request describes.
+_REQUESTS: dict[str, type[schemas.SimulationRequest]] = {
+    "monty-hall": schemas.MontyHallRequest,
+    "birthday": schemas.BirthdayRequest,
+    "two-envelopes": schemas.TwoEnvelopesRequest,
+    "sleeping-beauty": schemas.SleepingBeautyRequest,
+}
+
+
+def _options(r: schemas.SimulationRequest) -> dict:
+    """Keyword arguments shared by every ``simulate``: method and run options.
+
+    Only target-precision, traced and sampled results carry ``"precision"``,
+    ``"trace"`` and ``"sampling"``, so simulate endpoints leave unset fields
+    out of the response.
+    """
+    options = {"method": r.method}
+    if r.precision is not None:
+        options.update(target_se=r.precision.target_se(), confidence=r.precision.confidence)
+    if r.trace_points is not None:
+        options.update(trace_points=r.trace_points, trace_spacing=r.trace_spacing)
+    if r.sampling != "iid":
+        options["sampling_mode"] = r.sampling
+    return options
+
+
+def _rules(r: schemas.MontyHallRequest) -> dict:
+    """A Monty Hall request's variant: doors, opened doors and host behaviour."""
+    return {"doors": r.doors, "opened": r.opened, "host": r.host, "host_bias": r.host_bias}
+
+
+def _calendar(r: schemas.BirthdayRequest) -> dict:
+    """A Birthday request's calendar: days, their weights, near-match window, groups."""
+    return {"days": r.days, "weights": r.weights, "window": r.window, "groups": r.groups}
+
+
+def _prior(r: schemas.TwoEnvelopesRequest) -> dict:
+    """A Two Envelopes request's prior on the smaller amount."""
+    return {"prior": r.prior, "ratio": r.ratio}
+
+
+# Simulation modules are looked up on each call, so NumPy loads with the first
+# simulation rather than with the app.
+_RUNNERS: dict[str, Callable[[Any], Callable[[], dict]]] = {
+    "monty-hall": lambda r: partial(
+        simulations.monty_hall.simulate, r.games, r.seed, **_options(r), **_rules(r)
+    ),
+    "birthday": lambda r: partial(
+        simulations.birthday.simulate,
+        r.group_size,
+        r.trials,
+        r.seed,
+        **_options(r),
+        **_calendar(r),
+    ),
+    "two-envelopes": lambda r: partial(
+        simulations.two_envelopes.simulate,
+        r.trials,
+        r.max_base,
+        r.seed,
+        **_options(r),
+        **_prior(r),
+    ),
+    "sleeping-beauty": lambda r: partial(
+        simulations.sleeping_beauty.simulate, r.trials, r.seed, **_options(r)
+    ),
+    "simpsons": lambda r: partial(
+        simulations.simpsons.generate, r.rows, r.strata, r.groups, r.seed, r.strata_limit
+    ),
+}
+
+
+async def _run(name: str, fn: Callable[[], Any]) -> Any:
+    try:
+        return await executor.simulations.run(name, fn)
+    except executor.Busy as exc:
+        raise _busy(exc) from exc
+
+
+async def _compute(name: str, req: BaseModel) -> dict:
+    result = await _run(name, _RUNNERS[name](req))
+    with metrics.stage("cache"):
+        cache.results.put(name, req, result)
+    return result
+
+
+async def _simulate(name: str, req: BaseModel) -> dict:
+    """Run a simulation off the event loop, reusing cached seeded results.
+
+    Identical seeded requests that arrive while the first is still running
+    join its computation (see :class:`cache.SingleFlight`). Unseeded requests
+    are independent draws by definition, so each runs on its own.
+    """
+    with metrics.stage("cache"):
+        result = cache.results.get(name, req)
+    if result is not None:
+        return result
+    if getattr(req, "seed", None) is None:
+        return await _compute(name, req)
+    return await cache.flights.run(cache.cache_key(name, req), partial(_compute, name, req))
+
+
+def _run_all(jobs: list[Callable[[], Any]]) -> list[Any]:
+    return [job() for job in jobs]
+
+
+def _stream(
+    name: str,
+    request: Request,
+    req: schemas.SimulationRequest,
+    stream: Callable[[], Iterable[dict]],
+    simulate: Callable[[], dict],
+) -> StreamingResponse:
+    """Stream running estimates as NDJSON, or as Server-Sent Events on request.
+
+    Each line carries the result so far plus its progress; the last one is the
+    same result the matching ``/simulate`` call returns. Exact runs have no
+    intermediate state and emit a single line. Disconnecting stops the run at
+    the next batch boundary. Streams share the endpoint's concurrency limit with
+    ``/simulate`` and advance one batch at a time on the simulation threads.
+    Precision targets aren't supported (progress is against a fixed trial
+    count), nor are traces (the stream already is one) or sampling designs.
+    """
+    if req.precision is not None or req.trace_points is not None or req.sampling != "iid":
+        raise HTTPException(
+            422, detail="streams don't support precision, trace_points or sampling"
+        )
+    total = getattr(req, req.size_field)
+    sse = "text/event-stream" in request.headers.get("accept", "")
+    pool = executor.simulations
+    try:
+        pool.check(name)
+    except executor.Busy as exc:
+        raise _busy(exc) from exc
+
+    async def events():
+        async with pool.limit(name):
+            if req.method == "exact":
+                results = iter([await pool.call(simulate, threads=True)])
+            else:
+                results = stream()
+            while (result := await pool.call(next, results, None, threads=True)) is not None:
+                progress = result[req.size_field] / total
+                update = {"progress": progress, "done": progress == 1, "result": result}
+                line = responses.encode(update)
+                yield f"data: {line}\n\n" if sse else f"{line}\n"
+
+    media_type = "text/event-stream" if sse else "application/x-ndjson"
+    return StreamingResponse(events(), media_type=media_type)
+
+
+def _export(
+    name: str,
+    req: schemas.SimulationRequest,
+    fmt: str,
+    export: Callable[[int], Iterator[dict]],
+) -> StreamingResponse:
+    """Stream the per-trial data of a seeded Monte Carlo run as a binary file.
+
+    ``export(seed)`` yields the run's batches of columns, which are encoded as
+    they're drawn (see :mod:`simulations.columnar`), so memory stays at one
+    batch however large the run. The columns are the same draws ``/simulate``
+    counts for that seed; an unseeded request gets a fresh seed, returned in
+    the ``X-Seed`` header and the file name. Only fixed-size Monte Carlo runs
+    have per-trial data, and exports share the endpoint's concurrency limit.
+    """
+    if req.method == "exact" or req.precision is not None or req.trace_points is not None:
+        raise HTTPException(422, detail="exports replay fixed-size Monte Carlo runs only")
+    if req.sampling != "iid":
+        raise HTTPException(422, detail="exports don't support sampling designs")
+    if not simulations.columnar.available(fmt):
+        raise HTTPException(406, detail=f"{fmt} exports need pyarrow; use format=npy")
+    pool = executor.simulations
+    try:
+        pool.check(name)
+    except executor.Busy as exc:
+        raise _busy(exc) from exc
+    seed = req.seed if req.seed is not None else secrets.randbits(63)
+    rows = getattr(req, req.size_field)
+
+    async def chunks():
+        async with pool.limit(name):
+            encoded = simulations.columnar.encode(fmt, export(seed), rows)
+            while (chunk := await pool.call(next, encoded, None, threads=True)) is not None:
+                yield chunk
+
+    media_type, extension = simulations.columnar.FORMATS[fmt]
+    headers = {
+        "Content-Disposition": f'attachment; filename="{name}-{seed}.{extension}"',
+        "X-Seed": str(seed),
+    }
+    return StreamingResponse(chunks(), media_type=media_type, headers=headers)
+
+
+_FormatQuery = Query("npy", alias="format", description="npy, arrow (IPC stream) or parquet.")
+
+
+def _catalog() -> list[dict]:
+    return catalog.PARADOXES
+
+
+def _simpsons_data() -> dict:
+    return simulations.simpsons.dataset()
+
+
+def prerender(datasets: bool = False) -> None:
+    """Serialize the static responses ahead of the first request.
+
+    The catalog is always cheap; ``datasets`` also builds the Simpson's dataset
+    and the default birthday curve, which loads NumPy.
+    """
+    responses.warm("paradoxes", _catalog, list[schemas.ParadoxMeta])
+    if datasets:
+        responses.warm("simpsons", _simpsons_data, schemas.SimpsonsData)
+        responses.warm(
+            ("curve", 100, 365, 2),
+            partial(simulations.birthday.curve, 100, 365, 2),
+            schemas.BirthdayCurve,
+        )
+
+
 @router.get("/paradoxes", response_model=list[schemas.ParadoxMeta])
-def list_paradoxes():
+def list_paradoxes(request: Request):
     """Catalog of all paradoxes with display metadata."""
-    return catalog.PARADOXES
+    return responses.static(request, "paradoxes", _catalog, list[schemas.ParadoxMeta])
+
+
+@router.post(
+    "/monty-hall/simulate",
+    response_model=schemas.MontyHallResult,
+    response_model_exclude_unset=True,
+)
+async def monty_hall_simulate(req: schemas.MontyHallRequest):
+    return responses.trusted(await _simulate("monty-hall", req))
+
 
+@router.post("/monty-hall/stream")
+def monty_hall_stream(req: schemas.MontyHallRequest, request: Request):
+    return _stream(
+        "monty-hall",
+        request,
+        req,
+        partial(simulations.monty_hall.stream, req.games, req.seed, **_rules(req)),
+        _RUNNERS["monty-hall"](req),
+    )
 
-@router.post("/monty-hall/simulate", response_model=schemas.MontyHallResult)
-def monty_hall_simulate(req: schemas.MontyHallRequest):
-    return monty_hall.simulate(req.games, req.seed)
 
+@router.post("/monty-hall/export")
+def monty_hall_export(req: schemas.MontyHallRequest, fmt: schemas.ExportFormat = _FormatQuery):
+    """Per game: ``car``, ``first_choice`` (and ``switch`` for variants) and the outcomes."""
+    return _export(
+        "monty-hall",
+        req,
+        fmt,
+        lambda seed: simulations.monty_hall.export(req.games, seed, **_rules(req)),
+    )
 
-@router.post("/birthday/simulate", response_model=schemas.BirthdayResult)
-def birthday_simulate(req: schemas.BirthdayRequest):
-    return birthday.simulate(req.group_size, req.trials, req.seed)
+
+@router.post(
+    "/birthday/simulate",
+    response_model=schemas.BirthdayResult,
+    response_model_exclude_unset=True,
+)
+async def birthday_simulate(req: schemas.BirthdayRequest):
+    return responses.trusted(await _simulate("birthday", req))
+
+
+@router.post("/birthday/stream")
+def birthday_stream(req: schemas.BirthdayRequest, request: Request):
+    return _stream(
+        "birthday",
+        request,
+        req,
+        partial(
+            simulations.birthday.stream, req.group_size, req.trials, req.seed, **_calendar(req)
+        ),
+        _RUNNERS["birthday"](req),
+    )
+
+
+@router.post("/birthday/export")
+def birthday_export(req: schemas.BirthdayRequest, fmt: schemas.ExportFormat = _FormatQuery):
+    """Per group: ``matches``, whether anyone shares a birthday."""
+    return _export(
+        "birthday",
+        req,
+        fmt,
+        lambda seed: simulations.birthday.export(
+            req.group_size, req.trials, seed, **_calendar(req)
+        ),
+    )
 
 
 @router.get("/birthday/curve", response_model=schemas.BirthdayCurve)
-def birthday_curve(max_size: int = Query(100, ge=2, le=365)):
-    return birthday.curve(max_size)
+def birthday_curve(
+    request: Request,
+    max_size: int = Query(100, ge=2, le=2000),
+    days: int = Query(365, ge=2, le=5000, description="Days in the calendar."),
+    k: int = Query(2, ge=2, le=10, description="People that must share a day."),
+):
+    return responses.static(
+        request,
+        ("curve", max_size, days, k),
+        partial(simulations.birthday.curve, max_size, days, k),
+        schemas.BirthdayCurve,
+    )
+
+
+@router.post(
+    "/two-envelopes/simulate",
+    response_model=schemas.TwoEnvelopesResult,
+    response_model_exclude_unset=True,
+)
+async def two_envelopes_simulate(req: schemas.TwoEnvelopesRequest):
+    return responses.trusted(await _simulate("two-envelopes", req))
+
+
+@router.post("/two-envelopes/stream")
+def two_envelopes_stream(req: schemas.TwoEnvelopesRequest, request: Request):
+    return _stream(
+        "two-envelopes",
+        request,
+        req,
+        partial(
+            simulations.two_envelopes.stream, req.trials, req.max_base, req.seed, **_prior(req)
+        ),
+        _RUNNERS["two-envelopes"](req),
+    )
+
+
+@router.post("/two-envelopes/export")
+def two_envelopes_export(
+    req: schemas.TwoEnvelopesRequest, fmt: schemas.ExportFormat = _FormatQuery
+):
+    """Per round: ``base``, ``picked_smaller`` and the ``stay`` and ``switch`` amounts."""
+    return _export(
+        "two-envelopes",
+        req,
+        fmt,
+        lambda seed: simulations.two_envelopes.export(
+            req.trials, req.max_base, seed, **_prior(req)
+        ),
+    )
 
 
-@router.post("/two-envelopes/simulate", response_model=schemas.TwoEnvelopesResult)
-def two_envelopes_simulate(req: schemas.TwoEnvelopesRequest):
-    return two_envelopes.simulate(req.trials, req.max_base, req.seed)
+@router.post(
+    "/sleeping-beauty/simulate",
+    response_model=schemas.SleepingBeautyResult,
+    response_model_exclude_unset=True,
+)
+async def sleeping_beauty_simulate(req: schemas.SleepingBeautyRequest):
+    return responses.trusted(await _simulate("sleeping-beauty", req))
+
+
+@router.post("/sleeping-beauty/stream")
+def sleeping_beauty_stream(req: schemas.SleepingBeautyRequest, request: Request):
+    return _stream(
+        "sleeping-beauty",
+        request,
+        req,
+        partial(simulations.sleeping_beauty.stream, req.trials, req.seed),
+        _RUNNERS["sleeping-beauty"](req),
+    )
+
+
+@router.post("/sleeping-beauty/export")
+def sleeping_beauty_export(
+    req: schemas.SleepingBeautyRequest, fmt: schemas.ExportFormat = _FormatQuery
+):
+    """Per toss: ``heads``."""
+    return _export(
+        "sleeping-beauty",
+        req,
+        fmt,
+        lambda seed: simulations.sleeping_beauty.export(req.trials, seed),
+    )
+
+
+_CLASSIC_CALENDAR = {"days": 365, "weights": None, "window": 0, "groups": 1}
 
 
-@router.post("/sleeping-beauty/simulate", response_model=schemas.SleepingBeautyResult)
-def sleeping_beauty_simulate(req: schemas.SleepingBeautyRequest):
-    return sleeping_beauty.simulate(req.trials, req.seed)
+def _plan_sweeps(requests: list[tuple[str, Any]]) -> tuple[list[list[int]], list[int]]:
+    """Group plain Monte Carlo 365-day birthday items into shared sweeps; the rest run alone.
+
+    Items share a sweep when they have the same ``trials`` and ``seed``. Unseeded
+    runs must stay independent, so a repeated size with no seed opens a new
+    sweep rather than reusing the same draws.
+    """
+    buckets: dict[tuple[int, int | None], list[list[int]]] = {}
+    singles: list[int] = []
+    for i, (name, req) in enumerate(requests):
+        if (
+            name != "birthday"
+            or req.method != "monte-carlo"
+            or req.precision is not None
+            or req.trace_points is not None
+            or req.sampling != "iid"
+            or _calendar(req) != _CLASSIC_CALENDAR
+        ):
+            singles.append(i)
+            continue
+        sweeps = buckets.setdefault((req.trials, req.seed), [])
+        for sweep in sweeps:
+            sizes = {requests[j][1].group_size for j in sweep}
+            if req.seed is not None or req.group_size not in sizes:
+                sweep.append(i)
+                break
+        else:
+            sweeps.append([i])
+
+    shared = [sweep for sweeps in buckets.values() for sweep in sweeps if len(sweep) > 1]
+    singles += [sweep[0] for sweeps in buckets.values() for sweep in sweeps if len(sweep) == 1]
+    return shared, sorted(singles)
+
+
+@router.post(
+    "/batch/simulate",
+    response_model=schemas.BatchResult,
+    response_model_exclude_unset=True,
+)
+async def batch_simulate(batch: schemas.BatchRequest):
+    """Run many simulations, across paradoxes, in one request.
+
+    Items run together as a single job. Monte Carlo birthday items that share
+    ``trials`` and ``seed`` are answered by one sweep — a single draw of the
+    largest group, read off at every requested size — so their seeded results
+    differ from (but are distributed like) separate ``/birthday/simulate``
+    calls. Every other item returns exactly what its own endpoint would, cache
+    included.
+    """
+    requests = [
+        (item.paradox, _REQUESTS[item.paradox].model_construct(**dict(item)))
+        for item in batch.requests
+    ]
+    results: list[dict | None] = [None] * len(requests)
+    sweeps, singles = _plan_sweeps(requests)
+
+    jobs: list[Callable[[], list[dict]]] = []
+    targets: list[list[int]] = []
+    for sweep in sweeps:
+        first = requests[sweep[0]][1]
+        sizes = [requests[i][1].group_size for i in sweep]
+        jobs.append(partial(simulations.birthday.sweep, sizes, first.trials, first.seed))
+        targets.append(sweep)
+    for i in singles:
+        results[i] = cache.results.get(*requests[i])
+        if results[i] is None:
+            jobs.append(partial(_run_all, [_RUNNERS[requests[i][0]](requests[i][1])]))
+            targets.append([i])
+
+    for target, outputs in zip(targets, await _run("batch", partial(_run_all, jobs))):
+        for i, result in zip(target, outputs):
+            results[i] = result
+        if len(target) == 1:
+            cache.results.put(*requests[target[0]], outputs[0])
+
+    return responses.trusted({
+        "results": [
+            {"paradox": name, "result": result}
+            for (name, _), result in zip(requests, results)
+        ]
+    })
+
+
+_JOB_REQUESTS: dict[str, type[schemas.SimulationRequest]] = {
+    "monty-hall": schemas.MontyHallJobItem,
+    "birthday": schemas.BirthdayJobItem,
+    "two-envelopes": schemas.TwoEnvelopesJobItem,
+    "sleeping-beauty": schemas.SleepingBeautyJobItem,
+}
+
+
+def run_job(paradox: str, params: dict) -> Callable[[], dict]:
+    """The simulation a stored job describes (see :class:`jobs.JobRunner`)."""
+    return _RUNNERS[paradox](_JOB_REQUESTS[paradox].model_validate(params))
+
+
+def _job(job_id: str) -> dict:
+    job = jobs.runner.store.get(job_id)
+    if job is None:
+        raise HTTPException(404, detail=f"no job {job_id!r}")
+    return job
+
+
+@router.post(
+    "/jobs",
+    response_model=schemas.Job,
+    response_model_exclude_unset=True,
+    status_code=202,
+)
+def submit_job(req: schemas.JobItem, response: Response):
+    """Queue a simulation too large to run synchronously.
+
+    Takes a ``/batch/simulate`` item with caps raised ``JOB_CAP_FACTOR``-fold.
+    Returns ``202`` and the new job; a seeded request that matches an earlier
+    job returns that job (``200``), with its result if it has finished.
+    """
+    jobs.runner.start(run_job)
+    key = cache.cache_key("job", req) if req.seed is not None else None
+    try:
+        job, created = jobs.runner.submit(req.paradox, req.model_dump(mode="json"), key)
+    except jobs.Full as exc:
+        raise HTTPException(503, detail=str(exc), headers={"Retry-After": "5"}) from exc
+    if not created:
+        response.status_code = 200
+    return job
+
+
+@router.get("/jobs/{job_id}", response_model=schemas.Job, response_model_exclude_unset=True)
+def get_job(job_id: str):
+    """A job's status and progress (0–1), plus its result once ``done``."""
+    return _job(job_id)
+
+
+@router.delete("/jobs/{job_id}", response_model=schemas.Job, response_model_exclude_unset=True)
+def cancel_job(job_id: str):
+    """Cancel a queued or running job; running ones stop at the next shard."""
+    _job(job_id)
+    jobs.runner.store.cancel(job_id)
+    return _job(job_id)
 
 
 @router.get("/simpsons/data", response_model=schemas.SimpsonsData)
-def simpsons_data():
-    return simpsons.dataset()
+def simpsons_data(request: Request):
+    return responses.static(request, "simpsons", _simpsons_data, schemas.SimpsonsData)
+
+
+@router.post("/simpsons/generate", response_model=schemas.SimpsonsAnalysis)
+async def simpsons_generate(req: schemas.SimpsonsGenerateRequest):
+    """Analyze a synthetic stratified table built to show the reversal."""
+    return responses.trusted(await _simulate("simpsons", req))
+
+
+async def _upload(request: Request, sink: Callable[[bytes], Any]) -> None:
+    """Hand the request body to ``sink`` chunk by chunk, enforcing the size cap."""
+    received = 0
+    async for chunk in request.stream():
+        received += len(chunk)
+        if received > config.SIMPSONS_MAX_UPLOAD_BYTES:
+            raise HTTPException(413, detail="upload exceeds SIMPSONS_MAX_UPLOAD_BYTES")
+        if chunk:
+            await sink(chunk)
+
+
+@router.post("/simpsons/analyze", response_model=schemas.SimpsonsAnalysis)
+async def simpsons_analyze(
+    request: Request,
+    strata_limit: int = Query(50, ge=0, le=1000, description="Largest strata to list."),
+):
+    """Look for Simpson's paradox in an uploaded table.
+
+    Send the file as the raw request body: CSV (``text/csv``, with a header
+    naming ``stratum``, ``group``, ``success`` and optionally ``count``) or
+    Parquet (``application/vnd.apache.parquet``, needs pyarrow) with the same
+    columns. CSV is tallied as it arrives; Parquet keeps its index at the end
+    of the file, so it is spooled to a temporary file first and then read a
+    record batch at a time.
+    """
+    parquet = "parquet" in request.headers.get("content-type", "")
+    if parquet and simulations.simpsons.pq is None:
+        raise HTTPException(415, detail="Parquet uploads need pyarrow; send CSV instead")
+    pool = executor.simulations
+    try:
+        pool.check("simpsons")
+    except executor.Busy as exc:
+        raise _busy(exc) from exc
+
+    table = simulations.simpsons.Table()
+    try:
+        async with pool.limit("simpsons"):
+            # The table is stateful, so every step runs on the thread pool.
+            if parquet:
+                with tempfile.SpooledTemporaryFile(simulations.simpsons.CSV_CHUNK_BYTES) as f:
+                    await _upload(request, partial(pool.call, f.write, threads=True))
+                    f.seek(0)
+                    await pool.call(table.read_parquet, f, threads=True)
+            else:
+                await _upload(request, partial(pool.call, table.feed_csv, threads=True))
+                await pool.call(table.close, threads=True)
+            result = await pool.call(table.analysis, strata_limit, threads=True)
+    except ValueError as exc:
+        raise HTTPException(422, detail=str(exc)) from exc
+    return responses.trusted(result)
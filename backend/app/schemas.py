@@ -1,7 +1,9 @@
 """Pydantic request/response models for the paradox API."""
 from __future__ import annotations
 
-from pydantic import BaseModel, Field
+from typing import Annotated, ClassVar, Literal
+
+from pydantic import BaseModel, Field, model_validator
 
 # --- Shared --------------------------------------------------------------
 
@@ -10,12 +12,216 @@ SeedField = Field(
     description="Optional RNG seed for reproducible runs.",
 )
 
+Method = Literal["monte-carlo", "exact"]
+
+MethodField = Field(
+    default="monte-carlo",
+    description=(
+        "'monte-carlo' plays out every trial; 'exact' samples the final counts "
+        "straight from their exact distribution — same output distribution, "
+        "constant time and memory."
+    ),
+)
+
+
+class PrecisionTarget(BaseModel):
+    """Run until the headline estimate is this precise, instead of a fixed count."""
+
+    standard_error: float | None = Field(None, gt=0, description="Target standard error.")
+    half_width: float | None = Field(None, gt=0, description="Target CI half-width.")
+    confidence: float = Field(0.95, gt=0, lt=1, description="Confidence level of the CI.")
+
+    @model_validator(mode="after")
+    def _one_target(self):
+        if (self.standard_error is None) == (self.half_width is None):
+            raise ValueError("set exactly one of standard_error or half_width")
+        return self
+
+    def target_se(self) -> float:
+        """The target as a standard error (a half-width divided by its z-score)."""
+        if self.standard_error is not None:
+            return self.standard_error
+        # Imported here, like every simulations module, so schemas load without them.
+        from app.simulations.precision import z_score
+
+        return self.half_width / z_score(self.confidence)
+
+
+PrecisionField = Field(
+    default=None,
+    description=(
+        "Stop as soon as the estimate reaches this precision. The trial count "
+        "becomes a budget; the result reports the trials actually used."
+    ),
+)
+
+
+class PrecisionReport(BaseModel):
+    estimate: float
+    standard_error: float
+    confidence: float
+    ci_low: float
+    ci_high: float
+    target_standard_error: float
+    target_met: bool
+    trials_used: int
+
+
+TraceSpacing = Literal["log", "lttb"]
+
+TracePointsField = Field(
+    default=None,
+    ge=3,
+    le=2000,
+    description="Also return the running estimate, downsampled to this many points.",
+)
+
+TraceSpacingField = Field(
+    default="log",
+    description=(
+        "'log' spaces trace points evenly on a log axis; 'lttb' keeps the points "
+        "that best preserve the curve's shape on a linear axis."
+    ),
+)
+
+
+class TracePoint(BaseModel):
+    trials: int
+    estimate: float
+
+
+Sampling = Literal["iid", "antithetic", "stratified", "qmc", "control-variate"]
+
+SamplingField = Field(
+    default="iid",
+    description=(
+        "'iid' draws every trial independently; 'antithetic', 'stratified' and "
+        "'qmc' correlate them, and 'control-variate' corrects the estimate by a "
+        "control with a known mean. The result reports the variance reduction."
+    ),
+)
+
+# Two stratified / QMC blocks (``sampling.BLOCK`` trials each), the fewest that
+# give a standard error.
+SAMPLING_MIN_TRIALS = 512
+
+
+class SamplingReport(BaseModel):
+    sampling: Sampling
+    estimate: float
+    standard_error: float
+    iid_standard_error: float
+    # Plain trials each sampled trial is worth; null when the variance vanished.
+    variance_reduction: float | None = None
+
+
+# Encodings for raw per-trial exports (see ``simulations/columnar.py``).
+ExportFormat = Literal["npy", "arrow", "parquet"]
+
+
+# Exact sampling costs the same for any size; only Monte Carlo runs need the
+# tighter per-model caps below.
+EXACT_MAX_TRIALS = 10**12
+
+
+class SimulationRequest(BaseModel):
+    """Base for simulate requests: caps the trial count for Monte Carlo runs.
+
+    With a ``precision`` target the trial count is a budget rather than an
+    exact size, so the same cap bounds the work.
+    """
+
+    size_field: ClassVar[str] = "trials"
+    max_monte_carlo: ClassVar[int] = 100_000_000
+    # Designs other than "iid" this paradox supports.
+    sampling_designs: ClassVar[tuple[str, ...]] = ("antithetic", "stratified", "qmc")
+
+    @model_validator(mode="after")
+    def _cap_monte_carlo(self):
+        size = getattr(self, self.size_field)
+        if self.method == "monte-carlo" and size > self.max_monte_carlo:
+            raise ValueError(
+                f"{self.size_field} must be <= {self.max_monte_carlo:_} for "
+                "method='monte-carlo'; use method='exact' for larger runs"
+            )
+        if self.method == "exact" and (self.precision or self.trace_points):
+            raise ValueError("precision and trace_points apply to method='monte-carlo' only")
+        if self.precision is not None and self.trace_points is not None:
+            raise ValueError("precision and trace_points can't be combined")
+        if self.sampling != "iid":
+            if self.sampling not in self.sampling_designs:
+                raise ValueError(f"sampling={self.sampling!r} isn't supported here")
+            if self.method == "exact" or self.precision or self.trace_points:
+                raise ValueError(
+                    "sampling applies to fixed-size method='monte-carlo' runs without a trace"
+                )
+            if size < SAMPLING_MIN_TRIALS:
+                raise ValueError(f"sampling needs {self.size_field} >= {SAMPLING_MIN_TRIALS}")
+        return self
+
+    def work_share(self) -> float:
+        """This run's share of what one request may do: 1.0 at its Monte Carlo cap."""
+        if self.method != "monte-carlo":
+            return 0.0
+        return getattr(self, self.size_field) / self.max_monte_carlo
+
 
 # --- Monty Hall ----------------------------------------------------------
 
-class MontyHallRequest(BaseModel):
-    games: int = Field(1000, ge=1, le=1_000_000, description="Number of games to simulate.")
+Host = Literal["standard", "ignorant", "biased"]
+
+
+class MontyHallRequest(SimulationRequest):
+    size_field: ClassVar[str] = "games"
+    # Variants play out a (games, doors) matrix, so cap games × doors instead.
+    max_variant_cells: ClassVar[int] = 100_000_000
+
+    games: int = Field(1000, ge=1, le=EXACT_MAX_TRIALS, description="Number of games to simulate.")
+    doors: int = Field(3, ge=3, le=100, description="Doors in the game.")
+    opened: int | None = Field(
+        None, ge=1, description="Doors the host opens (default: all but one besides yours)."
+    )
+    host: Host = Field(
+        "standard",
+        description=(
+            "'standard' always reveals goats; 'ignorant' opens doors at random "
+            "(games where he reveals the car don't count); 'biased' prefers the "
+            "lowest-numbered doors."
+        ),
+    )
+    host_bias: float = Field(
+        1.0, ge=0, le=1, description="How often a biased host opens the lowest doors he may."
+    )
     seed: int | None = SeedField
+    method: Method = MethodField
+    precision: PrecisionTarget | None = PrecisionField
+    trace_points: int | None = TracePointsField
+    trace_spacing: TraceSpacing = TraceSpacingField
+    sampling: Sampling = SamplingField
+
+    @model_validator(mode="after")
+    def _check_variant(self):
+        if self.opened is not None and self.opened > self.doors - 2:
+            raise ValueError("opened must leave your door and at least one other closed")
+        if self.method == "exact" and self.host == "biased":
+            raise ValueError("method='exact' supports the standard and ignorant hosts")
+        if self._variant() and self.sampling != "iid":
+            raise ValueError("sampling applies to the classic game only")
+        cells = self.games * self.doors
+        if self._variant() and self.method == "monte-carlo" and cells > self.max_variant_cells:
+            raise ValueError(
+                f"games × doors must be <= {self.max_variant_cells:_} for Monte Carlo variants"
+            )
+        return self
+
+    def _variant(self) -> bool:
+        return (self.doors, self.opened or 1, self.host) != (3, 1, "standard")
+
+    def work_share(self) -> float:
+        share = super().work_share()
+        if share and self._variant():
+            share = max(share, self.games * self.doors / self.max_variant_cells)
+        return share
 
 
 class MontyHallResult(BaseModel):
@@ -26,14 +232,97 @@ class MontyHallResult(BaseModel):
     switch_rate: float
     theoretical_stay_rate: float
     theoretical_switch_rate: float
+    doors: int = 3
+    opened: int = 1
+    host: Host = "standard"
+    # Ignorant host: games discarded because the car was revealed.
+    car_revealed: int | None = None
+    # Biased host: games where the lowest doors were opened, and switching's
+    # win rate in just those games.
+    lowest_opened: int | None = None
+    switch_rate_given_lowest: float | None = None
+    precision: PrecisionReport | None = None
+    trace: list[TracePoint] | None = None
+    sampling: SamplingReport | None = None
 
 
 # --- Birthday ------------------------------------------------------------
 
-class BirthdayRequest(BaseModel):
+class BirthdayRequest(SimulationRequest):
+    max_monte_carlo: ClassVar[int] = 10_000_000
+    # The control: pairs sharing a birthday, with mean C(group_size, 2) / 365.
+    sampling_designs: ClassVar[tuple[str, ...]] = (
+        *SimulationRequest.sampling_designs, "control-variate"
+    )
+
+    # Other calendars cap trials × the kernel's per-trial width (see
+    # birthday.calendar_width): people drawn, plus calendar cells when counting.
+    max_calendar_work: ClassVar[int] = 1_000_000_000
+
     group_size: int = Field(23, ge=1, le=365, description="People in the group.")
-    trials: int = Field(2000, ge=1, le=500_000, description="Number of random groups.")
+    trials: int = Field(2000, ge=1, le=EXACT_MAX_TRIALS, description="Number of random groups.")
+    days: int = Field(365, ge=2, le=5000, description="Days in the calendar.")
+    weights: list[float] | None = Field(
+        None,
+        max_length=5000,
+        description=(
+            "Relative frequency of each day (one per day, e.g. 366 with Feb 29 at "
+            "0.25); equally likely days when omitted."
+        ),
+    )
+    window: int = Field(
+        0, ge=0, le=2500, description="Count near matches: birthdays within this many days."
+    )
+    groups: int = Field(
+        1, ge=1, le=10, description="Groups of group_size; only matches across groups count."
+    )
     seed: int | None = SeedField
+    method: Method = MethodField
+    precision: PrecisionTarget | None = PrecisionField
+    trace_points: int | None = TracePointsField
+    trace_spacing: TraceSpacing = TraceSpacingField
+    sampling: Sampling = SamplingField
+
+    @model_validator(mode="after")
+    def _check_calendar(self):
+        if self.weights is not None:
+            if len(self.weights) != self.days:
+                raise ValueError("weights must have one entry per day (set days to match)")
+            if min(self.weights) < 0 or sum(self.weights) <= 0:
+                raise ValueError("weights must be non-negative and not all zero")
+        if 2 * self.window >= self.days:
+            raise ValueError("window must be less than half the calendar")
+        if self._classic():
+            return self
+        if self.sampling != "iid":
+            raise ValueError("sampling designs apply to the classic 365-day calendar only")
+        # Mirrors birthday.calendar_probability: the cases with a closed form.
+        if self.method == "exact" and (self.groups > 1 or (self.weights and self.window)):
+            raise ValueError(
+                "method='exact' needs one group and either weights or a window, not both"
+            )
+        if self.method == "monte-carlo" and self.calendar_work() > self.max_calendar_work:
+            raise ValueError(
+                f"trials × calendar width must be <= {self.max_calendar_work:_} for Monte "
+                "Carlo calendars; use fewer trials, groups or days"
+            )
+        return self
+
+    def calendar_work(self) -> int:
+        """Elements a Monte Carlo run of this (non-classic) calendar works through."""
+        # Imported here to keep NumPy out of schema import.
+        from app.simulations.birthday import calendar_width
+
+        return self.trials * calendar_width(self.group_size, self.days, self.window, self.groups)
+
+    def _classic(self) -> bool:
+        return (self.days, self.weights, self.window, self.groups) == (365, None, 0, 1)
+
+    def work_share(self) -> float:
+        share = super().work_share()
+        if share and not self._classic():
+            share = max(share, self.calendar_work() / self.max_calendar_work)
+        return share
 
 
 class BirthdayResult(BaseModel):
@@ -41,8 +330,15 @@ class BirthdayResult(BaseModel):
     trials: int
     matches: int
     simulated_probability: float
-    theoretical_probability: float
-    difference: float
+    # Null when no closed form is known for the calendar (e.g. several groups).
+    theoretical_probability: float | None
+    difference: float | None
+    days: int = 365
+    window: int = 0
+    groups: int = 1
+    precision: PrecisionReport | None = None
+    trace: list[TracePoint] | None = None
+    sampling: SamplingReport | None = None
 
 
 class BirthdayCurvePoint(BaseModel):
@@ -52,30 +348,87 @@ class BirthdayCurvePoint(BaseModel):
 
 class BirthdayCurve(BaseModel):
     max_size: int
+    days: int = 365
+    k: int = 2
     points: list[BirthdayCurvePoint]
 
 
 # --- Two Envelopes -------------------------------------------------------
 
-class TwoEnvelopesRequest(BaseModel):
-    trials: int = Field(5000, ge=1, le=1_000_000, description="Number of rounds.")
-    max_base: int = Field(100, ge=1, le=10_000, description="Max value of the smaller amount.")
+Prior = Literal["uniform", "geometric", "doubling", "log-uniform"]
+
+# Doubling amounts are 2^K in float64, which overflows at K = 1024. Below this
+# ratio P(K >= 1000) is under 1e-45, so no run can plausibly get there.
+DOUBLING_MAX_RATIO = 0.9
+
+
+class TwoEnvelopesRequest(SimulationRequest):
+    # The control: the sign of the switch advantage, with mean zero.
+    sampling_designs: ClassVar[tuple[str, ...]] = (
+        *SimulationRequest.sampling_designs, "control-variate"
+    )
+
+    trials: int = Field(5000, ge=1, le=EXACT_MAX_TRIALS, description="Number of rounds.")
+    max_base: int = Field(
+        100, ge=1, le=10_000, description="Max value of the smaller amount (uniform, log-uniform)."
+    )
+    prior: Prior = Field(
+        "uniform",
+        description=(
+            "Distribution of the smaller amount: uniform on 1..max_base, geometric, "
+            "doubling (2^K with K geometric; infinite mean for ratio >= 1/2), or "
+            "log-uniform on [1, max_base]."
+        ),
+    )
+    ratio: float = Field(
+        2 / 3, gt=0, lt=1, description="Decay ratio of the geometric and doubling priors."
+    )
     seed: int | None = SeedField
+    method: Method = MethodField
+    precision: PrecisionTarget | None = PrecisionField
+    trace_points: int | None = TracePointsField
+    trace_spacing: TraceSpacing = TraceSpacingField
+    sampling: Sampling = SamplingField
+
+    @model_validator(mode="after")
+    def _check_prior(self):
+        if self.method == "exact" and self.prior not in ("uniform", "geometric"):
+            raise ValueError("method='exact' supports the uniform and geometric priors")
+        if self.prior == "doubling" and self.ratio > DOUBLING_MAX_RATIO:
+            raise ValueError(
+                f"the doubling prior needs ratio <= {DOUBLING_MAX_RATIO} (2^K overflows float64)"
+            )
+        # Mirrors two_envelopes.finite_variance: E[X²] diverges for ratio >= 1/4.
+        sized = self.precision is not None or self.sampling != "iid"
+        if sized and self.prior == "doubling" and self.ratio >= 0.25:
+            raise ValueError("precision targets and sampling need a prior with a finite variance")
+        return self
 
 
 class TwoEnvelopesResult(BaseModel):
     trials: int
+    prior: Prior = "uniform"
     avg_stay: float
     avg_switch: float
     switch_advantage: float
     switch_advantage_pct: float
+    # 1.5 × E[X]; null when the prior's expectation is infinite.
+    theoretical_avg: float | None = None
+    precision: PrecisionReport | None = None
+    trace: list[TracePoint] | None = None
+    sampling: SamplingReport | None = None
 
 
 # --- Sleeping Beauty -----------------------------------------------------
 
-class SleepingBeautyRequest(BaseModel):
-    trials: int = Field(2000, ge=1, le=1_000_000, description="Number of coin tosses.")
+class SleepingBeautyRequest(SimulationRequest):
+    trials: int = Field(2000, ge=1, le=EXACT_MAX_TRIALS, description="Number of coin tosses.")
     seed: int | None = SeedField
+    method: Method = MethodField
+    precision: PrecisionTarget | None = PrecisionField
+    trace_points: int | None = TracePointsField
+    trace_spacing: TraceSpacing = TraceSpacingField
+    sampling: Sampling = SamplingField
 
 
 class SleepingBeautyResult(BaseModel):
@@ -87,6 +440,117 @@ class SleepingBeautyResult(BaseModel):
     p_tails_given_awake: float
     halfer_position: float
     thirder_position: float
+    precision: PrecisionReport | None = None
+    trace: list[TracePoint] | None = None
+    sampling: SamplingReport | None = None
+
+
+# --- Batch ---------------------------------------------------------------
+
+class MontyHallBatchItem(MontyHallRequest):
+    paradox: Literal["monty-hall"]
+
+
+class BirthdayBatchItem(BirthdayRequest):
+    paradox: Literal["birthday"]
+
+
+class TwoEnvelopesBatchItem(TwoEnvelopesRequest):
+    paradox: Literal["two-envelopes"]
+
+
+class SleepingBeautyBatchItem(SleepingBeautyRequest):
+    paradox: Literal["sleeping-beauty"]
+
+
+BatchItem = Annotated[
+    MontyHallBatchItem | BirthdayBatchItem | TwoEnvelopesBatchItem | SleepingBeautyBatchItem,
+    Field(discriminator="paradox"),
+]
+
+
+class BatchRequest(BaseModel):
+    # Items' work, each as a share of its own paradox's caps (work_share), may
+    # add up to this many single requests at their caps.
+    max_work: ClassVar[float] = 1.0
+
+    requests: list[BatchItem] = Field(min_length=1, max_length=500)
+
+    @model_validator(mode="after")
+    def _cap_total_work(self):
+        if sum(item.work_share() for item in self.requests) > self.max_work:
+            raise ValueError(
+                "Monte Carlo work across the batch must total at most one request at its "
+                "caps (e.g. games <= 100_000_000 for Monty Hall, trials <= 10_000_000 "
+                "for birthday)"
+            )
+        return self
+
+
+class BatchResultItem(BaseModel):
+    paradox: str
+    result: MontyHallResult | BirthdayResult | TwoEnvelopesResult | SleepingBeautyResult
+
+
+class BatchResult(BaseModel):
+    results: list[BatchResultItem]
+
+
+# --- Jobs ----------------------------------------------------------------
+
+# Jobs run in the background, so their Monte Carlo runs may go this many times
+# past the synchronous caps.
+JOB_CAP_FACTOR = 1000
+
+
+class _JobItem(BaseModel):
+    @model_validator(mode="after")
+    def _fixed_size(self):
+        # Checkpoints follow the shards of a fixed-size run.
+        if self.precision is not None or self.trace_points is not None:
+            raise ValueError("jobs don't support precision or trace_points")
+        if self.sampling != "iid":
+            raise ValueError("jobs don't support sampling designs")
+        return self
+
+
+class MontyHallJobItem(_JobItem, MontyHallBatchItem):
+    max_monte_carlo: ClassVar[int] = JOB_CAP_FACTOR * MontyHallRequest.max_monte_carlo
+    max_variant_cells: ClassVar[int] = JOB_CAP_FACTOR * MontyHallRequest.max_variant_cells
+
+
+class BirthdayJobItem(_JobItem, BirthdayBatchItem):
+    max_monte_carlo: ClassVar[int] = JOB_CAP_FACTOR * BirthdayRequest.max_monte_carlo
+    max_calendar_work: ClassVar[int] = JOB_CAP_FACTOR * BirthdayRequest.max_calendar_work
+
+
+class TwoEnvelopesJobItem(_JobItem, TwoEnvelopesBatchItem):
+    max_monte_carlo: ClassVar[int] = JOB_CAP_FACTOR * TwoEnvelopesRequest.max_monte_carlo
+
+
+class SleepingBeautyJobItem(_JobItem, SleepingBeautyBatchItem):
+    max_monte_carlo: ClassVar[int] = JOB_CAP_FACTOR * SleepingBeautyRequest.max_monte_carlo
+
+
+JobItem = Annotated[
+    MontyHallJobItem | BirthdayJobItem | TwoEnvelopesJobItem | SleepingBeautyJobItem,
+    Field(discriminator="paradox"),
+]
+
+JobStatus = Literal["queued", "running", "done", "failed", "cancelled"]
+
+
+class Job(BaseModel):
+    id: str
+    paradox: str
+    request: dict
+    status: JobStatus
+    progress: float
+    created: float
+    updated: float
+    # The paradox's usual simulate result, once done.
+    result: dict | None = None
+    error: str | None = None
 
 
 # --- Simpson's -----------------------------------------------------------
@@ -116,6 +580,56 @@ class SimpsonsData(BaseModel):
     paradox: bool
 
 
+StrataLimitField = Field(
+    default=50,
+    ge=0,
+    le=1000,
+    description="Return per-group counts for this many of the largest strata.",
+)
+
+
+class SimpsonsGenerateRequest(BaseModel):
+    rows: int = Field(1_000_000, ge=1, le=50_000_000, description="Synthetic rows to draw.")
+    strata: int = Field(100, ge=1, le=10_000)
+    groups: int = Field(2, ge=2, le=50)
+    seed: int | None = SeedField
+    strata_limit: int = StrataLimitField
+
+
+class SimpsonsGroup(BaseModel):
+    name: str
+    trials: int
+    successes: int
+    rate: float
+
+
+class SimpsonsStratum(BaseModel):
+    name: str
+    trials: list[int]
+    successes: list[int]
+    rates: list[float]
+
+
+class SimpsonsReversal(BaseModel):
+    pooled_leader: str
+    stratum_leader: str
+    pooled_gap: float
+    adjusted_gap: float
+    strata: int
+    strata_agreeing: int
+    every_stratum: bool
+
+
+class SimpsonsAnalysis(BaseModel):
+    rows: int
+    strata_count: int
+    groups: list[SimpsonsGroup]
+    strata: list[SimpsonsStratum]
+    reversals: list[SimpsonsReversal]
+    pairs_checked: int
+    paradox: bool
+
+
 # --- Catalog -------------------------------------------------------------
 
 class ParadoxMeta(BaseModel):
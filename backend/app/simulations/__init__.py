@@ -0,0 +1,49 @@
+"""Simulation modules, imported on first use.
+
+The simulators pull in NumPy, which dominates the app's import time; serverless
+cold starts shouldn't pay for it before a request needs it. Accessing
+``simulations.birthday`` (or ``from app.simulations import birthday``) imports
+the module then; :func:`prewarm` does it ahead of time.
+"""
+from __future__ import annotations
+
+import importlib
+import sys
+from types import ModuleType
+
+_MODULES = (
+    "birthday",
+    "columnar",
+    "engine",
+    "monty_hall",
+    "precision",
+    "sampling",
+    "simpsons",
+    "sleeping_beauty",
+    "traces",
+    "two_envelopes",
+)
+
+
+def __getattr__(name: str) -> ModuleType:
+    if name in _MODULES:
+        return importlib.import_module(f"{__name__}.{name}")
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def __dir__() -> list[str]:
+    return sorted([*globals(), *_MODULES])
+
+
+def prewarm() -> None:
+    """Import every simulator and build the default birthday table."""
+    for name in _MODULES:
+        importlib.import_module(f"{__name__}.{name}")
+    __getattr__("birthday").prewarm()
+
+
+def shutdown() -> None:
+    """Stop the engine's shard pools, if the engine was ever loaded."""
+    engine = sys.modules.get(f"{__name__}.engine")
+    if engine is not None:
+        engine.shutdown()
@@ -1,48 +1,555 @@
-"""Birthday paradox: simulation plus the exact theoretical probability."""
+"""Birthday paradox: simulation plus the exact theoretical probability.
+
+Besides the classic question (365 equally likely days, an exact match within
+one group), :func:`simulate` takes a *calendar*:
+
+- ``days`` and ``weights``: any number of days, optionally with unequal
+  weights — an empirical table of birth frequencies, or a leap-year calendar
+  (:func:`leap_year_weights`). Weighted days are drawn with Walker's alias
+  method: one integer and one uniform per person, whatever the table.
+- ``window``: count a *near* match, two people born within ``window`` days of
+  each other on a circular calendar (Dec 31 and Jan 1 are one day apart).
+- ``groups``: that many groups of ``group_size`` people; only matches between
+  people in *different* groups count.
+
+Single-group calendars sort each group's days and compare neighbours (plus the
+wrap-around pair), like the classic ``sort`` kernel; cross-group matches count
+each group's occupancy of every day in one ``bincount`` and slide the window
+over a cumulative sum.
+"""
 from __future__ import annotations
 
+import math
+from collections.abc import Iterator, Sequence
+from functools import lru_cache, partial
+
 import numpy as np
 
+from app import metrics
+from app.simulations import engine, precision, sampling, traces
+
 DAYS_IN_YEAR = 365
 
 
-def theoretical_probability(group_size: int) -> float:
-    """Exact probability that at least two people in a group share a birthday."""
+# Largest group size served from a precomputed k-way table; the pairwise (k=2)
+# table always covers every group size.
+MAX_CURVE_SIZE = 2000
+
+
+def _no_k_match(days: int, k: int, size: int) -> np.ndarray:
+    """P(no day is shared by k or more people) for group sizes 0..size.
+
+    Assigns people one day at a time: with ``m`` days left, the number landing
+    on the next day is Binomial(n, 1/m) and must stay below ``k``. Every term is
+    a probability, so the recurrence is numerically stable for any calendar.
+    """
+    n = np.arange(size + 1)
+    log_fact = np.concatenate(([0.0], np.cumsum(np.log(np.arange(1, size + 1)))))
+    # One remaining day: everyone lands on it.
+    no_match = (n < k).astype(float)
+    for m in range(2, days + 1):
+        p, q = np.log(1 / m), np.log1p(-1 / m)
+        nxt = np.zeros(size + 1)
+        for j in range(min(k, size + 1)):
+            tail = n[j:]
+            log_pmf = log_fact[tail] - log_fact[j] - log_fact[tail - j] + j * p + (tail - j) * q
+            nxt[j:] += np.exp(log_pmf) * no_match[: size + 1 - j]
+        no_match = nxt
+    return no_match
+
+
+@lru_cache(maxsize=32)
+def probability_table(days: int = DAYS_IN_YEAR, k: int = 2) -> np.ndarray:
+    """P(at least ``k`` people share a birthday) indexed by group size.
+
+    Covers every size up to certainty ((k-1)·days + 1), capped at
+    ``MAX_CURVE_SIZE`` for k > 2. The returned array is read-only.
+    """
+    if k == 2:
+        # P(no match among n) = prod_{i<n} (days - i) / days: one cumulative product.
+        no_match = np.ones(days + 2)
+        no_match[1:] = np.cumprod((days - np.arange(days + 1)) / days)
+    else:
+        no_match = _no_k_match(days, k, min((k - 1) * days + 1, MAX_CURVE_SIZE))
+    table = 1.0 - no_match
+    table.flags.writeable = False
+    return table
+
+
+@lru_cache(maxsize=256)
+def calendar_probability(
+    group_size: int,
+    days: int = DAYS_IN_YEAR,
+    weights: tuple[float, ...] | None = None,
+    window: int = 0,
+    groups: int = 1,
+) -> float | None:
+    """Exact P(match) for a calendar (see the module docstring), where known.
+
+    Covers a single group with either unequal weights or a near-match window
+    (not both); ``None`` otherwise.
+    """
+    if groups > 1 or (weights is not None and window):
+        return None
     if group_size < 2:
         return 0.0
-    if group_size > DAYS_IN_YEAR:
+    if weights is not None:
+        # distinct[k] = P(k people all on different days) = k! e_k(p), built up
+        # a day at a time; every intermediate value is a probability.
+        p = np.asarray(weights, dtype=np.float64) / math.fsum(weights)
+        distinct = np.zeros(group_size + 1)
+        distinct[0] = 1.0
+        ks = np.arange(1, group_size + 1)
+        for day in p:
+            distinct[1:] += ks * day * distinct[:-1]
+        return float(1.0 - distinct[group_size])
+    if group_size * (window + 1) > days:
         return 1.0
-    prob_no_match = 1.0
-    for i in range(group_size):
-        prob_no_match *= (DAYS_IN_YEAR - i) / DAYS_IN_YEAR
-    return 1.0 - prob_no_match
+    # Naus (1968): P(no two within ``window`` days on a circle of ``days``) =
+    # (days - g·window - 1)! / ((days - g·(window + 1))! · days^(g - 1)).
+    log_none = (
+        math.lgamma(days - group_size * window)
+        - math.lgamma(days - group_size * (window + 1) + 1)
+        - (group_size - 1) * math.log(days)
+    )
+    return 1.0 - math.exp(log_none)
+
+
+def theoretical_probability(group_size: int, days: int = DAYS_IN_YEAR, k: int = 2) -> float:
+    """Exact probability that at least ``k`` people in a group share a birthday."""
+    if group_size < k:
+        return 0.0
+    if group_size > (k - 1) * days:
+        return 1.0
+    table = probability_table(days, k)
+    if group_size < len(table):
+        return float(table[group_size])
+    return float(1.0 - _no_k_match(days, k, group_size)[group_size])
+
 
+def leap_year_weights() -> tuple[float, ...]:
+    """Day weights for a calendar with Feb 29, one year in four (366 days)."""
+    weights = [1.0] * 366
+    weights[31 + 28] = 0.25
+    return tuple(weights)
 
-def simulate(group_size: int, trials: int, seed: int | None = None) -> dict:
-    """Estimate the shared-birthday probability by sampling ``trials`` groups."""
-    rng = np.random.default_rng(seed)
-    birthdays = rng.integers(0, DAYS_IN_YEAR, size=(trials, group_size))
-    birthdays.sort(axis=1)
+
+def _is_classic(days: int, weights: Sequence[float] | None, window: int, groups: int) -> bool:
+    return days == DAYS_IN_YEAR and weights is None and window == 0 and groups == 1
+
+
+@lru_cache(maxsize=32)
+def alias_table(weights: tuple[float, ...]) -> tuple[np.ndarray, np.ndarray]:
+    """Walker/Vose alias table ``(prob, alias)`` for sampling days by ``weights``.
+
+    Day ``i`` is kept with probability ``prob[i]`` and otherwise replaced by
+    ``alias[i]``. The returned arrays are read-only.
+    """
+    scaled = np.asarray(weights, dtype=np.float64)
+    scaled = scaled * len(scaled) / scaled.sum()
+    prob = np.ones(len(scaled))
+    alias = np.arange(len(scaled), dtype=np.uint16)
+    small = [i for i, p in enumerate(scaled) if p < 1]
+    large = [i for i, p in enumerate(scaled) if p >= 1]
+    while small and large:
+        lo, hi = small.pop(), large.pop()
+        prob[lo], alias[lo] = scaled[lo], hi
+        # The large day donates the rest of the small day's column.
+        scaled[hi] -= 1 - scaled[lo]
+        (small if scaled[hi] < 1 else large).append(hi)
+    # Whatever is left is 1 up to rounding and keeps its own column.
+    prob.flags.writeable = alias.flags.writeable = False
+    return prob, alias
+
+
+def _days(
+    rng: np.random.Generator,
+    size: tuple[int, ...],
+    days: int,
+    table: tuple[np.ndarray, np.ndarray] | None,
+) -> np.ndarray:
+    if table is None:
+        return metrics.timed("rng", rng.integers, 0, days, size=size, dtype=np.uint16)
+    # One uniform per person: its integer part picks the column, its
+    # fraction decides between the column's day and its alias.
+    scaled = metrics.timed("rng", rng.random, size) * days
+    column = scaled.astype(np.uint16)
+    prob, alias = table
+    return np.where(scaled - column < prob[column], column, alias[column])
+
+
+def _batch_calendar(
+    rng: np.random.Generator,
+    n: int,
+    group_size: int,
+    days: int,
+    table: tuple[np.ndarray, np.ndarray] | None,
+    window: int,
+    groups: int = 1,
+) -> dict[str, np.ndarray]:
+    birthdays = _days(rng, (n, groups * group_size), days, table)
+    if groups > 1:
+        # Sort (day, group) keys: people in different groups a few days apart
+        # have, somewhere between them, two neighbours from different groups.
+        dtype = np.uint16 if 2 * days * groups <= np.iinfo(np.uint16).max else np.int32
+        member = (np.arange(groups * group_size) // group_size).astype(dtype)
+        birthdays = birthdays.astype(dtype) * dtype(groups) + member
+    with metrics.stage("sort"):
+        birthdays.sort(axis=1)
+    day, group = np.divmod(birthdays, groups)
+    # Sorted, the closest pair is adjacent — or the last and first days,
+    # across the turn of the year.
+    gap = np.diff(day, axis=1, append=day[:, :1] + days)
+    near = gap <= window
+    if groups > 1:
+        near &= group != np.roll(group, -1, axis=1)
+    return {"matches": near.any(axis=1)}
+
+
+def _batch_cross(
+    rng: np.random.Generator,
+    n: int,
+    group_size: int,
+    days: int,
+    table: tuple[np.ndarray, np.ndarray] | None,
+    groups: int,
+) -> dict[str, np.ndarray]:
+    birthdays = _days(rng, (n, groups, group_size), days, table)
+    # People per (trial, group, day), from one bincount over flat cells.
+    cells = np.arange(n * groups).reshape(n, groups, 1) * days + birthdays
+    occupancy = np.bincount(cells.ravel(), minlength=n * groups * days).reshape(n, groups, days)
+    # A cross-group match: some day is occupied by two groups or more.
+    present = np.count_nonzero(occupancy, axis=1)
+    return {"matches": (present >= 2).any(axis=1)}
+
+
+def _batch_sort(rng: np.random.Generator, n: int, group_size: int) -> dict[str, np.ndarray]:
+    birthdays = metrics.timed(
+        "rng", rng.integers, 0, DAYS_IN_YEAR, size=(n, group_size), dtype=np.uint16
+    )
+    with metrics.stage("sort"):
+        birthdays.sort(axis=1)
     # A collision exists iff two adjacent values match after sorting each row.
-    has_match = np.any(birthdays[:, 1:] == birthdays[:, :-1], axis=1)
-    matches = int(np.count_nonzero(has_match))
+    return {"matches": np.any(birthdays[:, 1:] == birthdays[:, :-1], axis=1)}
+
+
+def _batch_pairwise(rng: np.random.Generator, n: int, group_size: int) -> dict[str, np.ndarray]:
+    # Compare every pair of people column against column. O(group_size²) cheap,
+    # contiguous passes into a reused buffer — fastest for small groups.
+    birthdays = metrics.timed(
+        "rng", rng.integers, 0, DAYS_IN_YEAR, size=(group_size, n), dtype=np.uint16
+    )
+    matches = np.zeros(n, dtype=bool)
+    equal = np.empty(n, dtype=bool)
+    for j in range(1, group_size):
+        for i in range(j):
+            np.equal(birthdays[i], birthdays[j], out=equal)
+            matches |= equal
+    return {"matches": matches}
+
+
+_WORDS = (DAYS_IN_YEAR + 63) // 64
+
+
+def _first_match(rng: np.random.Generator, n: int, group_size: int) -> np.ndarray:
+    # Seat people one at a time, tracking each group's occupied days in a
+    # 365-bit set. A group leaves the active set at its first collision, so only
+    # still-unmatched groups draw the next birthday — past ~23 people most rows
+    # are already done and the remaining columns are never drawn at all.
+    # Returns the group size at which each row first matched (group_size + 1
+    # if it never did).
+    seen = np.zeros(n * _WORDS, dtype=np.uint64)
+    first = np.full(n, group_size + 1, dtype=np.int32)
+    active = np.arange(n)
+    for person in range(group_size):
+        day = metrics.timed(
+            "rng", rng.integers, 0, DAYS_IN_YEAR, size=active.size, dtype=np.uint16
+        )
+        slot = active * _WORDS + (day >> 6)
+        bit = np.left_shift(np.uint64(1), (day & 63).astype(np.uint64))
+        hit = (seen[slot] & bit) != 0
+        first[active[hit]] = person + 1
+        keep = ~hit
+        active = active[keep]
+        if not active.size:
+            break
+        seen[slot[keep]] |= bit[keep]
+    return first
+
+
+def _batch_bitset(rng: np.random.Generator, n: int, group_size: int) -> dict[str, np.ndarray]:
+    return {"matches": _first_match(rng, n, group_size) <= group_size}
+
+
+def _from_uniforms(u: np.ndarray) -> dict[str, np.ndarray]:
+    # One uniform per person. Besides whether any day is shared, count the
+    # pairs sharing a day: a control variate with known mean C(g, 2) / 365.
+    birthdays = (u * DAYS_IN_YEAR).astype(np.uint16)
+    with metrics.stage("sort"):
+        birthdays.sort(axis=1)
+    same = birthdays[:, 1:] == birthdays[:, :-1]
+    # Within a run of equal days, the j-th person pairs with the j before them.
+    position = np.arange(u.shape[1])
+    run_start = np.where(np.pad(~same, ((0, 0), (1, 0)), constant_values=True), position, 0)
+    np.maximum.accumulate(run_start, axis=1, out=run_start)
+    return {"matches": same.any(axis=1), "pairs": (position - run_start).sum(axis=1)}
+
+
+def _batch_sweep(
+    rng: np.random.Generator, n: int, group_sizes: tuple[int, ...]
+) -> dict[str, np.ndarray]:
+    # A group of g people matches iff its first g members do, so one seating of
+    # the largest group answers every smaller size at once.
+    largest = max(group_sizes)
+    first = _first_match(rng, n, largest)
+    matched_by = np.cumsum(np.bincount(first, minlength=largest + 2))
+    return {str(g): matched_by[g] for g in group_sizes}
+
+
+# Collision kernels selectable from ``simulate``: the batch function plus the
+# values held per group, which sizes the engine's batches.
+KERNELS = {
+    "pairwise": (_batch_pairwise, lambda group_size: group_size),
+    "sort": (_batch_sort, lambda group_size: group_size),
+    "bitset": (_batch_bitset, lambda group_size: _WORDS),
+}
+
+
+def pick_kernel(group_size: int) -> str:
+    """Fastest kernel for a group size (see ``benchmarks/birthday_kernels.py``)."""
+    if group_size <= 30:
+        return "pairwise"
+    if group_size < 200:
+        return "sort"
+    return "bitset"
+
+
+def _counts_occupancy(group_size: int, days: int, window: int, groups: int) -> bool:
+    # Sorting wins until the groups fill about a quarter of the calendar; past
+    # that, counting occupancy is cheaper (near-match windows always sort).
+    return groups > 1 and window == 0 and 4 * groups * group_size >= days
+
+
+def calendar_width(
+    group_size: int, days: int = DAYS_IN_YEAR, window: int = 0, groups: int = 1
+) -> int:
+    """Elements per trial a non-classic calendar run works through.
+
+    That's the people drawn when sorting, plus every (group, day) cell when
+    counting occupancy; request caps bound ``trials`` times this.
+    """
+    people = groups * group_size
+    if _counts_occupancy(group_size, days, window, groups):
+        return groups * (group_size + 2 * days)
+    return people
+
+
+def _step(
+    group_size: int,
+    kernel: str,
+    days: int = DAYS_IN_YEAR,
+    weights: Sequence[float] | None = None,
+    window: int = 0,
+    groups: int = 1,
+) -> tuple[engine.Step, int]:
+    if not _is_classic(days, weights, window, groups):
+        table = alias_table(tuple(weights)) if weights is not None else None
+        calendar = {"group_size": group_size, "days": days, "table": table, "groups": groups}
+        width = calendar_width(group_size, days, window, groups)
+        if _counts_occupancy(group_size, days, window, groups):
+            return partial(_batch_cross, **calendar), width
+        return partial(_batch_calendar, window=window, **calendar), width
+    if kernel == "auto":
+        kernel = pick_kernel(group_size)
+    batch, width = KERNELS[kernel]
+    return partial(batch, group_size=group_size), width(group_size)
+
+
+def _error(totals: dict, trials: int) -> float:
+    return precision.proportion_se(totals["matches"], trials)
+
+
+def simulate(
+    group_size: int,
+    trials: int,
+    seed: int | None = None,
+    kernel: str = "auto",
+    method: str = "monte-carlo",
+    target_se: float | None = None,
+    confidence: float = 0.95,
+    trace_points: int | None = None,
+    trace_spacing: str = "log",
+    sampling_mode: str = "iid",
+    days: int = DAYS_IN_YEAR,
+    weights: Sequence[float] | None = None,
+    window: int = 0,
+    groups: int = 1,
+) -> dict:
+    """Estimate the shared-birthday probability by sampling ``trials`` groups.
+
+    ``kernel`` selects the collision detector (one of ``KERNELS``); ``"auto"``
+    picks the fastest for the group size. Kernels consume the RNG differently,
+    so a seed reproduces results for a given kernel only. ``method="exact"``
+    draws the match count from Binomial(trials, p) with the exact ``p``. With
+    ``target_se``, ``trials`` is a budget: sample only until the estimate's
+    standard error reaches it. ``trace_points`` adds a ``"trace"`` of the
+    running estimate (see :mod:`traces`). ``sampling_mode`` picks a
+    variance-reduced design (see :mod:`sampling`; the control variate is the
+    number of pairs sharing a day) and adds a ``"sampling"`` report.
+    ``days``, ``weights``, ``window`` and ``groups`` describe the calendar
+    (see the module docstring); other calendars ignore ``kernel``, support
+    ``method="exact"`` only where :func:`calendar_probability` is known, and
+    don't support sampling designs.
+    """
+    weights = tuple(weights) if weights is not None else None
+    calendar = {"days": days, "weights": weights, "window": window, "groups": groups}
+    classic = _is_classic(**calendar)
+    if target_se is not None:
+        step, width = _step(group_size, kernel, **calendar)
+        trials, totals = engine.run_to_precision(
+            step, trials, seed, error=_error, target=target_se, width=width
+        )
+        result = _result(group_size, trials, totals["matches"], **calendar)
+        result["precision"] = precision.report(
+            result["simulated_probability"], _error(totals, trials), trials, target_se, confidence
+        )
+        return result
+    if trace_points is not None:
+        at = traces.positions(trials, trace_points, trace_spacing)
+        step, width = _step(group_size, kernel, **calendar)
+        totals, running = engine.run_traced(step, trials, seed, at=at, width=width)
+        result = _result(group_size, trials, totals["matches"], **calendar)
+        estimate = running["matches"] / at
+        result["trace"] = traces.series(at, estimate, trace_points, trace_spacing)
+        return result
+    if sampling_mode != "iid":
+        if not classic:
+            raise ValueError("sampling designs support the classic 365-day calendar only")
+        pairs_mean = group_size * (group_size - 1) / 2 / DAYS_IN_YEAR
+        totals, report = sampling.run(
+            _from_uniforms, group_size, trials, seed, sampling_mode,
+            estimand="matches", control="pairs", control_mean=pairs_mean,
+        )
+        result = _result(group_size, trials, totals["matches"])
+        result["sampling"] = report
+        return result
+    if method == "exact":
+        p = _theoretical(group_size, **calendar)
+        if p is None:
+            raise ValueError("method='exact' has no closed form for this calendar")
+        matches = int(np.random.default_rng(seed).binomial(trials, p))
+    else:
+        step, width = _step(group_size, kernel, **calendar)
+        matches = engine.run(step, trials, seed, width=width)["matches"]
+    return _result(group_size, trials, matches, **calendar)
+
+
+def stream(
+    group_size: int,
+    trials: int,
+    seed: int | None = None,
+    kernel: str = "auto",
+    days: int = DAYS_IN_YEAR,
+    weights: Sequence[float] | None = None,
+    window: int = 0,
+    groups: int = 1,
+) -> Iterator[dict]:
+    """Like :func:`simulate`, yielding the running result after every batch."""
+    weights = tuple(weights) if weights is not None else None
+    calendar = {"days": days, "weights": weights, "window": window, "groups": groups}
+    step, width = _step(group_size, kernel, **calendar)
+    for done, totals in engine.iterate(step, trials, seed, width=width):
+        yield _result(group_size, done, totals["matches"], **calendar)
+
+
+def export(
+    group_size: int,
+    trials: int,
+    seed: int | None = None,
+    kernel: str = "auto",
+    days: int = DAYS_IN_YEAR,
+    weights: Sequence[float] | None = None,
+    window: int = 0,
+    groups: int = 1,
+) -> Iterator[dict[str, np.ndarray]]:
+    """The per-group collision flags behind :func:`simulate`, a batch at a time."""
+    step, width = _step(group_size, kernel, days, weights, window, groups)
+    yield from engine.outcomes(step, trials, seed, width=width)
+
+
+def _theoretical(
+    group_size: int,
+    days: int = DAYS_IN_YEAR,
+    weights: tuple[float, ...] | None = None,
+    window: int = 0,
+    groups: int = 1,
+) -> float | None:
+    if _is_classic(days, weights, window, groups):
+        return theoretical_probability(group_size)
+    return calendar_probability(group_size, days, weights, window, groups)
+
+
+def _result(
+    group_size: int,
+    trials: int,
+    matches: int,
+    days: int = DAYS_IN_YEAR,
+    weights: tuple[float, ...] | None = None,
+    window: int = 0,
+    groups: int = 1,
+) -> dict:
     simulated = matches / trials
-    theoretical = theoretical_probability(group_size)
+    theoretical = _theoretical(group_size, days, weights, window, groups)
 
     return {
         "group_size": group_size,
         "trials": trials,
         "matches": matches,
+        "days": days,
+        "window": window,
+        "groups": groups,
         "simulated_probability": simulated,
+        # None when no closed form is known for the calendar.
         "theoretical_probability": theoretical,
-        "difference": abs(simulated - theoretical),
+        "difference": abs(simulated - theoretical) if theoretical is not None else None,
     }
 
 
-def curve(max_size: int = 100) -> dict:
-    """Theoretical probability curve for group sizes 1..max_size."""
-    points = [
-        {"group_size": n, "probability": theoretical_probability(n)}
-        for n in range(1, max_size + 1)
+def sweep(group_sizes: list[int], trials: int, seed: int | None = None) -> list[dict]:
+    """Simulate several group sizes from one shared draw of ``trials`` groups.
+
+    Each result is distributed exactly like ``simulate(g, trials)``, but they
+    are correlated with each other (smaller groups are prefixes of larger ones)
+    and a seed reproduces the sweep, not the individual ``simulate`` calls.
+    """
+    sizes = tuple(sorted(set(group_sizes)))
+    step = partial(_batch_sweep, group_sizes=sizes)
+    totals = engine.run(step, trials, seed, width=_WORDS)
+    return [_result(g, trials, totals[str(g)]) for g in group_sizes]
+
+
+@lru_cache(maxsize=32)
+def _points(days: int, k: int) -> list[dict]:
+    return [
+        {"group_size": n, "probability": float(p)}
+        for n, p in enumerate(probability_table(days, k))
+        if n >= 1
     ]
-    return {"max_size": max_size, "points": points}
+
+
+def curve(max_size: int = 100, days: int = DAYS_IN_YEAR, k: int = 2) -> dict:
+    """Theoretical probability curve for group sizes 1..max_size.
+
+    A slice of a memoized table; sizes past the table are certain matches.
+    """
+    points = _points(days, k)[:max_size]
+    if len(points) < max_size:
+        points = points + [
+            {"group_size": n, "probability": 1.0} for n in range(len(points) + 1, max_size + 1)
+        ]
+    return {"max_size": max_size, "days": days, "k": k, "points": points}
+
+
+def prewarm() -> None:
+    """Build the default curve now so the first request only slices it."""
+    _points(DAYS_IN_YEAR, 2)
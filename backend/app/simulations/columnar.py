@@ -0,0 +1,112 @@
+"""Streaming binary encodings of per-trial columns, for raw-data exports.
+
+Simulators' ``export`` functions yield one batch of named per-trial arrays at a
+time; the encoders here turn that into bytes as it arrives, so an export of
+millions of trials holds one batch in memory, never the whole run:
+
+- ``"npy"``: a single NumPy ``.npy`` file holding a structured array (one
+  field per column). The header needs the row count, which is known up front.
+- ``"arrow"``: an Arrow IPC stream, one record batch per batch (needs pyarrow).
+- ``"parquet"``: a Parquet file, one row group per batch (needs pyarrow).
+"""
+from __future__ import annotations
+
+import io
+from collections.abc import Iterable, Iterator
+from itertools import chain
+
+import numpy as np
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # pragma: no cover - pyarrow is optional
+    pa = pq = None
+
+# Media type and file extension per format.
+FORMATS = {
+    "npy": ("application/octet-stream", "npy"),
+    "arrow": ("application/vnd.apache.arrow.stream", "arrows"),
+    "parquet": ("application/vnd.apache.parquet", "parquet"),
+}
+
+
+def available(fmt: str) -> bool:
+    """Whether ``fmt`` can be written here (Arrow formats need pyarrow)."""
+    return fmt == "npy" or pa is not None
+
+
+def npy(batches: Iterable[dict[str, np.ndarray]], rows: int) -> Iterator[bytes]:
+    """A ``.npy`` file of ``rows`` records, written a batch at a time."""
+    batches = iter(batches)
+    first = next(batches, None)
+    if first is None:
+        return
+    dtype = np.dtype([(name, values.dtype) for name, values in first.items()])
+    header = io.BytesIO()
+    np.lib.format.write_array_header_1_0(
+        header,
+        {"descr": np.lib.format.dtype_to_descr(dtype), "fortran_order": False, "shape": (rows,)},
+    )
+    yield header.getvalue()
+    for batch in chain([first], batches):
+        records = np.empty(len(next(iter(batch.values()))), dtype=dtype)
+        for name, values in batch.items():
+            records[name] = values
+        yield records.tobytes()
+
+
+class _Drain(io.RawIOBase):
+    """A write-only file whose contents are handed out as they're written."""
+
+    def __init__(self) -> None:
+        self._chunks: list[bytes] = []
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def arrow(batches: Iterable[dict[str, np.ndarray]]) -> Iterator[bytes]:
+    """An Arrow IPC stream with one record batch per batch."""
+    sink, writer = _Drain(), None
+    for batch in batches:
+        record = pa.RecordBatch.from_pydict(batch)
+        if writer is None:
+            writer = pa.ipc.new_stream(sink, record.schema)
+        writer.write_batch(record)
+        yield sink.drain()
+    if writer is not None:
+        writer.close()
+        yield sink.drain()
+
+
+def parquet(batches: Iterable[dict[str, np.ndarray]]) -> Iterator[bytes]:
+    """A Parquet file with one row group per batch; the footer comes last."""
+    sink, writer = _Drain(), None
+    for batch in batches:
+        table = pa.Table.from_pydict(batch)
+        if writer is None:
+            writer = pq.ParquetWriter(sink, table.schema)
+        writer.write_table(table)
+        yield sink.drain()
+    if writer is not None:
+        writer.close()
+        yield sink.drain()
+
+
+def encode(fmt: str, batches: Iterable[dict[str, np.ndarray]], rows: int) -> Iterator[bytes]:
+    """Encode ``rows`` trials arriving as ``batches`` of columns in ``fmt``."""
+    if not available(fmt):
+        raise RuntimeError(f"{fmt} exports require pyarrow")
+    if fmt == "npy":
+        return npy(batches, rows)
+    return arrow(batches) if fmt == "arrow" else parquet(batches)
@@ -0,0 +1,354 @@
+"""Chunked, optionally parallel execution shared by every Monte Carlo simulator.
+
+Drawing every trial at once makes peak memory grow with ``trials`` — a 500k-group
+birthday run used to allocate well over a gigabyte before sorting. Instead, each
+simulator describes a single *batch*: a function of an RNG and a batch size that
+returns per-trial outcome arrays. :func:`run` feeds it fixed-size batches and
+sums the outcomes into plain Python counters, so peak memory is bounded by the
+batch size no matter how many trials are requested.
+
+Runs are also split into *shards*, each drawing from its own stream spawned off
+the request seed with :meth:`numpy.random.SeedSequence.spawn`. The shard layout
+is a function of the request alone, so shards can run serially or across a
+process pool and still merge into exactly the same totals for a given seed.
+
+Each batch is timed as the ``kernel`` stage and its summation as ``reduce``
+(see :mod:`app.metrics`); simulators mark their RNG draws as ``rng``.
+
+Inside :func:`checkpointing`, :func:`run` reports every finished shard's totals
+to a :class:`Checkpoint` and skips shards it already holds, so a long run that
+was interrupted resumes where it stopped — with identical results, since each
+shard's stream depends only on the seed and its position.
+
+Besides arrays, a step may return :class:`Moments` for a quantity whose spread
+matters: they combine across batches and shards with Welford/Chan updates
+instead of raw sums of squares.
+"""
+from __future__ import annotations
+
+import math
+import multiprocessing
+from collections.abc import Callable, Iterator
+from concurrent.futures import Executor, ProcessPoolExecutor
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import NamedTuple, Protocol
+
+import numpy as np
+
+from app import config, metrics
+
+# A batch: ``step(rng, n)`` draws ``n`` trials and returns named per-trial
+# outcomes (boolean masks or numeric arrays), which are summed across batches.
+# Steps must be picklable (module-level functions or ``functools.partial`` of
+# them) to run on the process pool.
+Step = Callable[[np.random.Generator, int], dict[str, np.ndarray]]
+
+_pools: dict[int, Executor] = {}
+
+
+class Checkpoint(Protocol):
+    """Where :func:`run` keeps finished shards while :func:`checkpointing`."""
+
+    def restore(self, shards: int) -> dict[int, dict[str, int | float]]:
+        """Totals saved for this run so far, by shard index.
+
+        Called once at the start of each :func:`run`; runs are told apart by
+        the order they start in, and ``shards`` by the layout they expect.
+        """
+
+    def save(self, shard: int, totals: dict[str, int | float], done: int, trials: int) -> None:
+        """Persist a finished shard; ``done`` of ``trials`` are now complete."""
+
+
+_checkpoint: ContextVar[Checkpoint | None] = ContextVar("checkpoint", default=None)
+
+
+@contextmanager
+def checkpointing(checkpoint: Checkpoint) -> Iterator[None]:
+    """Route every :func:`run` in this context through ``checkpoint``."""
+    token = _checkpoint.set(checkpoint)
+    try:
+        yield
+    finally:
+        _checkpoint.reset(token)
+
+
+class Moments(NamedTuple):
+    """Count, mean and sum of squared deviations (``m2``) of some values.
+
+    Adding two combines them exactly (Chan et al.'s parallel Welford update),
+    so the variance never comes from subtracting two huge sums of squares —
+    which loses every significant digit, or overflows, for heavy-tailed values.
+    ``0 + moments`` is ``moments``, so they total like plain numbers.
+    """
+
+    n: int
+    mean: float
+    m2: float
+
+    @classmethod
+    def of(cls, values: np.ndarray) -> Moments:
+        values = np.asarray(values, dtype=np.float64)
+        mean = values.mean() if len(values) else 0.0
+        return cls(len(values), float(mean), float(((values - mean) ** 2).sum()))
+
+    def __add__(self, other):
+        if isinstance(other, int) and other == 0:
+            return self
+        n = self.n + other.n
+        if n == 0:
+            return self
+        delta = other.mean - self.mean
+        return Moments(
+            n,
+            self.mean + delta * other.n / n,
+            self.m2 + other.m2 + delta * delta * self.n * other.n / n,
+        )
+
+    __radd__ = __add__
+
+    @property
+    def variance(self) -> float:
+        """Sample variance (``inf`` below two values)."""
+        return self.m2 / (self.n - 1) if self.n > 1 else math.inf
+
+
+def batch_rows(width: int = 1, chunk_elements: int | None = None) -> int:
+    """Trials per batch so a ``(rows, width)`` draw stays within the element budget."""
+    budget = chunk_elements or config.SIMULATION_CHUNK_ELEMENTS
+    return max(1, budget // max(1, width))
+
+
+def batches(total: int, size: int) -> Iterator[int]:
+    """Split ``total`` trials into batches of at most ``size``."""
+    full, rest = divmod(total, size)
+    for _ in range(full):
+        yield size
+    if rest:
+        yield rest
+
+
+def accumulate(totals: dict[str, int | float], outcomes: dict[str, np.ndarray]) -> None:
+    """Add one batch's per-trial outcomes into the running ``totals``."""
+    with metrics.stage("reduce"):
+        for key, values in outcomes.items():
+            if isinstance(values, Moments):
+                value = values
+            # Boolean masks count faster than they sum.
+            elif values.dtype == np.bool_:
+                value = int(np.count_nonzero(values))
+            else:
+                value = values.sum().item()
+            totals[key] = totals.get(key, 0) + value
+
+
+def shards(
+    trials: int,
+    seed: int | None = None,
+    *,
+    width: int = 1,
+    shard_elements: int | None = None,
+) -> list[tuple[int, np.random.SeedSequence]]:
+    """Deterministic ``(trials, seed sequence)`` shards for a run."""
+    size = batch_rows(width, shard_elements or config.SIMULATION_SHARD_ELEMENTS)
+    sizes = list(batches(trials, size))
+    return list(zip(sizes, np.random.SeedSequence(seed).spawn(len(sizes))))
+
+
+def merge(a: dict[str, int | float], b: dict[str, int | float]) -> dict[str, int | float]:
+    """Sum two sets of totals into a new dict."""
+    totals = dict(a)
+    for key, value in b.items():
+        totals[key] = totals.get(key, 0) + value
+    return totals
+
+
+def run_shard(
+    step: Step,
+    trials: int,
+    seed: np.random.SeedSequence,
+    width: int = 1,
+    chunk_elements: int | None = None,
+) -> dict[str, int | float]:
+    """Run one shard serially, in bounded batches."""
+    rng = np.random.default_rng(seed)
+    totals: dict[str, int | float] = {}
+    for n in batches(trials, batch_rows(width, chunk_elements)):
+        accumulate(totals, metrics.timed("kernel", step, rng, n))
+    return totals
+
+
+def iterate(
+    step: Step,
+    trials: int,
+    seed: int | None = None,
+    *,
+    width: int = 1,
+    chunk_elements: int | None = None,
+    shard_elements: int | None = None,
+) -> Iterator[tuple[int, dict[str, int | float]]]:
+    """Run serially like :func:`run`, yielding ``(trials_done, totals)`` per batch.
+
+    The batches and shards are the same as :func:`run`'s, so the last totals
+    yielded are exactly what :func:`run` returns for the same arguments.
+    """
+    completed: dict[str, int | float] = {}
+    done = 0
+    plan = shards(trials, seed, width=width, shard_elements=shard_elements)
+    for shard_trials, shard_seed in plan:
+        rng = np.random.default_rng(shard_seed)
+        current: dict[str, int | float] = {}
+        for n in batches(shard_trials, batch_rows(width, chunk_elements)):
+            accumulate(current, metrics.timed("kernel", step, rng, n))
+            done += n
+            yield done, merge(completed, current)
+        completed = merge(completed, current)
+
+
+def outcomes(
+    step: Step,
+    trials: int,
+    seed: int | None = None,
+    *,
+    width: int = 1,
+    chunk_elements: int | None = None,
+    shard_elements: int | None = None,
+) -> Iterator[dict[str, np.ndarray]]:
+    """Yield each batch's per-trial outcomes, unsummed, in :func:`run`'s order.
+
+    The shards and batches are :func:`run`'s, so summing what this yields gives
+    exactly :func:`run`'s totals; only one batch is held at a time.
+    """
+    plan = shards(trials, seed, width=width, shard_elements=shard_elements)
+    for shard_trials, shard_seed in plan:
+        rng = np.random.default_rng(shard_seed)
+        for n in batches(shard_trials, batch_rows(width, chunk_elements)):
+            yield metrics.timed("kernel", step, rng, n)
+
+
+def run_traced(
+    step: Step,
+    trials: int,
+    seed: int | None = None,
+    *,
+    at: np.ndarray,
+    width: int = 1,
+    chunk_elements: int | None = None,
+    shard_elements: int | None = None,
+) -> tuple[dict[str, int | float], dict[str, np.ndarray]]:
+    """Run serially like :func:`run`, also sampling running totals along the way.
+
+    ``at`` holds sorted trial counts; alongside the final totals this returns,
+    per outcome, its sum over the first ``at[i]`` trials. Each batch is summed
+    with a ``cumsum`` read off only at the positions that fall inside it.
+    """
+    totals: dict[str, int | float] = {}
+    running: dict[str, list[np.ndarray]] = {}
+    done = 0
+    plan = shards(trials, seed, width=width, shard_elements=shard_elements)
+    for shard_trials, shard_seed in plan:
+        rng = np.random.default_rng(shard_seed)
+        for n in batches(shard_trials, batch_rows(width, chunk_elements)):
+            outcomes = metrics.timed("kernel", step, rng, n)
+            lo, hi = np.searchsorted(at, [done + 1, done + n + 1])
+            inside = at[lo:hi] - done - 1
+            with metrics.stage("reduce"):
+                for key, values in outcomes.items():
+                    sums = np.cumsum(values, dtype=np.result_type(values.dtype, np.int64))
+                    running.setdefault(key, []).append(sums[inside] + totals.get(key, 0))
+            accumulate(totals, outcomes)
+            done += n
+    return totals, {key: np.concatenate(parts) for key, parts in running.items()}
+
+
+def run_to_precision(
+    step: Step,
+    budget: int,
+    seed: int | None = None,
+    *,
+    error: Callable[[dict[str, int | float], int], float],
+    target: float,
+    width: int = 1,
+    chunk_elements: int | None = None,
+    first_batch: int = 1000,
+) -> tuple[int, dict[str, int | float]]:
+    """Add batches until ``error(totals, trials) <= target`` or ``budget`` runs out.
+
+    Standard errors shrink like 1/√n, so after each round the next one is sized
+    to land just past the projected requirement — but never more than doubles
+    the run, in case the early error estimate was noisy. Returns the number of
+    trials used and their totals. Deterministic for a given seed.
+    """
+    rng = np.random.default_rng(np.random.SeedSequence(seed))
+    totals: dict[str, int | float] = {}
+    done = 0
+    size = first_batch
+    while True:
+        size = min(size, budget - done)
+        for n in batches(size, batch_rows(width, chunk_elements)):
+            accumulate(totals, metrics.timed("kernel", step, rng, n))
+        done += size
+        err = error(totals, done)
+        if err <= target or done >= budget:
+            return done, totals
+        projected = math.ceil(done * (err / target) ** 2 * 1.1)
+        size = min(max(projected - done, first_batch), done)
+
+
+def _pool(workers: int) -> Executor:
+    # One long-lived pool per size; "spawn" avoids forking a threaded server.
+    if workers not in _pools:
+        context = multiprocessing.get_context("spawn")
+        _pools[workers] = ProcessPoolExecutor(max_workers=workers, mp_context=context)
+    return _pools[workers]
+
+
+def shutdown() -> None:
+    """Stop any worker pools started by :func:`run`."""
+    for pool in _pools.values():
+        pool.shutdown(cancel_futures=True)
+    _pools.clear()
+
+
+def run(
+    step: Step,
+    trials: int,
+    seed: int | None = None,
+    *,
+    width: int = 1,
+    chunk_elements: int | None = None,
+    shard_elements: int | None = None,
+    workers: int | None = None,
+) -> dict[str, int | float]:
+    """Run ``trials`` trials of ``step`` and return the summed outcomes.
+
+    ``width`` is the number of values drawn per trial (e.g. the group size for
+    the birthday paradox), so wide trials get proportionally smaller batches.
+    ``workers`` (default ``SIMULATION_WORKERS``) only changes where shards run,
+    never the result.
+    """
+    plan = shards(trials, seed, width=width, shard_elements=shard_elements)
+    workers = config.SIMULATION_WORKERS if workers is None else workers
+    checkpoint = _checkpoint.get()
+    saved = checkpoint.restore(len(plan)) if checkpoint is not None else {}
+
+    todo = [shard for i, shard in enumerate(plan) if i not in saved]
+    args = [(step, n, ss, width, chunk_elements) for n, ss in todo]
+    if workers > 1 and len(args) > 1:
+        results = _pool(workers).map(run_shard, *zip(*args))
+    else:
+        results = (run_shard(*a) for a in args)
+
+    # Merge in shard order so float sums are identical for any worker count.
+    totals: dict[str, int | float] = {}
+    done = sum(plan[i][0] for i in saved)
+    for i, (n, _) in enumerate(plan):
+        shard_totals = saved.get(i)
+        if shard_totals is None:
+            shard_totals = next(results)
+            if checkpoint is not None:
+                done += n
+                checkpoint.save(i, shard_totals, done, trials)
+        totals = merge(totals, shard_totals)
+    return totals
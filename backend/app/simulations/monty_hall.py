@@ -1,32 +1,295 @@
-"""Monty Hall Monte Carlo simulation.
+"""Monty Hall Monte Carlo simulation, classic and generalized.
 
 With the standard rules (the host always opens a goat door he can choose, and
 never your door), switching wins exactly when your *initial* pick was a goat —
 which happens 2/3 of the time. We exploit that fact for a fully vectorized
 simulation: there's no need to model the host's reveal explicitly.
+
+Variants break that shortcut, so they play out the reveal on a ``(games,
+doors)`` matrix instead, still without a per-game loop:
+
+- ``doors`` / ``opened``: N doors, of which the host opens ``opened`` (default
+  all but one besides yours); a switcher picks one of the rest at random.
+- ``host="ignorant"`` ("Monty Fall"): the host opens doors at random and may
+  reveal the car; those games are discarded and the rates are conditional on
+  the car staying hidden.
+- ``host="biased"``: with probability ``host_bias`` the host opens the
+  lowest-numbered doors he may, otherwise random ones. Overall rates match the
+  standard host, but seeing the lowest doors opened changes the odds — reported
+  as ``switch_rate_given_lowest``.
 """
 from __future__ import annotations
 
+from collections.abc import Iterator
+from functools import partial
+
 import numpy as np
 
+from app import metrics
+from app.simulations import engine, precision, sampling, traces
 
-def simulate(games: int, seed: int | None = None) -> dict:
-    """Play ``games`` rounds and report win rates for both strategies."""
-    rng = np.random.default_rng(seed)
-    car = rng.integers(0, 3, size=games)
-    first_choice = rng.integers(0, 3, size=games)
 
+def _batch(rng: np.random.Generator, n: int, raw: bool = False) -> dict[str, np.ndarray]:
+    car = metrics.timed("rng", rng.integers, 0, 3, size=n)
+    first_choice = metrics.timed("rng", rng.integers, 0, 3, size=n)
     # "Stay" wins iff the first choice already had the car.
-    stay_wins = int(np.count_nonzero(car == first_choice))
-    # "Switch" wins on exactly the complementary games.
-    switch_wins = games - stay_wins
+    outcomes = {"stay_wins": car == first_choice}
+    if raw:
+        outcomes.update(car=car.astype(np.int8), first_choice=first_choice.astype(np.int8))
+    return outcomes
+
+
+def _from_uniforms(u: np.ndarray) -> dict[str, np.ndarray]:
+    # The classic game from two uniforms per game: car, then first choice.
+    car = (u[:, 0] * 3).astype(np.int8)
+    first_choice = (u[:, 1] * 3).astype(np.int8)
+    stay = car == first_choice
+    return {"stay_wins": stay, "switch_wins": ~stay}
+
+
+def _batch_variant(
+    rng: np.random.Generator,
+    n: int,
+    doors: int,
+    opened: int,
+    host: str,
+    host_bias: float,
+    raw: bool = False,
+) -> dict[str, np.ndarray]:
+    rows = np.arange(n)
+    car = metrics.timed("rng", rng.integers, 0, doors, size=n)
+    pick = metrics.timed("rng", rng.integers, 0, doors, size=n)
+
+    # The host opens the ``opened`` doors with the smallest keys: random keys
+    # for a random choice, door numbers for a biased host's "lowest" games, and
+    # +inf on doors he may not open (yours, and the car unless he's ignorant).
+    keys = metrics.timed("rng", rng.random, (n, doors))
+    if host == "biased":
+        lowest_games = metrics.timed("rng", rng.random, n) < host_bias
+        keys[lowest_games] = np.arange(doors)
+    keys[rows, pick] = np.inf
+    if host != "ignorant":
+        keys[rows, car] = np.inf
+    shown = np.argpartition(keys, opened - 1, axis=1)[:, :opened]
+
+    # A switcher takes one of the other closed doors at random.
+    closed = np.ones((n, doors), dtype=bool)
+    closed[rows[:, None], shown] = False
+    closed[rows, pick] = False
+    if doors - opened == 2:
+        switch = closed.argmax(axis=1)
+    else:
+        choice = metrics.timed("rng", rng.random, (n, doors))
+        switch = np.where(closed, choice, np.inf).argmin(axis=1)
+
+    hidden = ~(shown == car[:, None]).any(axis=1)
+    outcomes = {
+        "stay_wins": (pick == car) & hidden,
+        "switch_wins": (switch == car) & hidden,
+    }
+    if host == "ignorant":
+        outcomes["car_revealed"] = ~hidden
+    if host == "biased":
+        # The lowest doors other than yours: 0..opened-1, shifted past your pick.
+        lowest = shown.max(axis=1) < opened + (pick < opened)
+        outcomes["lowest_opened"] = lowest
+        outcomes["lowest_switch_wins"] = lowest & (switch == car)
+    if raw:
+        # Doors fit in int8 (at most 100).
+        outcomes.update(
+            car=car.astype(np.int8),
+            first_choice=pick.astype(np.int8),
+            switch=switch.astype(np.int8),
+        )
+    return outcomes
+
+
+def _is_classic(doors: int, opened: int, host: str) -> bool:
+    # The biased host reveals goats too, but which one he opens is reported,
+    # so only the standard host can use the classic kernel.
+    return doors == 3 and opened == 1 and host == "standard"
+
+
+def _step(
+    doors: int, opened: int, host: str, host_bias: float, raw: bool = False
+) -> tuple[engine.Step, int]:
+    if _is_classic(doors, opened, host):
+        return (partial(_batch, raw=True) if raw else _batch), 1
+    step = partial(
+        _batch_variant, doors=doors, opened=opened, host=host, host_bias=host_bias, raw=raw
+    )
+    # Two (games, doors) float matrices per batch.
+    return step, 2 * doors
+
+
+def _counts(totals: dict, games):
+    """``(games that count, stay wins, switch wins)``; works on running arrays too."""
+    valid = games - totals.get("car_revealed", 0)
+    stay = totals["stay_wins"]
+    # The classic step only counts stay wins; switching wins every other game.
+    switch = totals["switch_wins"] if "switch_wins" in totals else valid - stay
+    return valid, stay, switch
+
+
+def _error(totals: dict, games: int) -> float:
+    valid, _, switch = _counts(totals, games)
+    return precision.proportion_se(switch, valid)
+
+
+def _exact_totals(games: int, doors: int, opened: int, host: str, seed: int | None) -> dict:
+    rng = np.random.default_rng(seed)
+    others = doors - 1 - opened
+    if host == "ignorant":
+        # The car is behind your door, another closed door, or a revealed one.
+        probs = [1 / doors, others / doors, opened / doors]
+        stay, elsewhere, revealed = (int(c) for c in rng.multinomial(games, probs))
+    else:
+        stay = int(rng.binomial(games, 1 / doors))
+        elsewhere, revealed = games - stay, 0
+    totals = {"stay_wins": stay, "switch_wins": int(rng.binomial(elsewhere, 1 / others))}
+    if host == "ignorant":
+        totals["car_revealed"] = revealed
+    return totals
+
+
+def simulate(
+    games: int,
+    seed: int | None = None,
+    method: str = "monte-carlo",
+    target_se: float | None = None,
+    confidence: float = 0.95,
+    trace_points: int | None = None,
+    trace_spacing: str = "log",
+    doors: int = 3,
+    opened: int | None = None,
+    host: str = "standard",
+    host_bias: float = 1.0,
+    sampling_mode: str = "iid",
+) -> dict:
+    """Play ``games`` rounds and report win rates for both strategies.
+
+    ``method="exact"`` skips the games and draws the win counts from their
+    exact distribution (Binomial(games, 1/3) stay wins, classically). With
+    ``target_se``, ``games`` is a budget: play only until the switch rate's
+    standard error reaches it. ``trace_points`` adds a ``"trace"`` of the
+    running switch rate (see :mod:`traces`). ``doors``, ``opened``, ``host``
+    and ``host_bias`` select a variant (see the module docstring).
+    ``sampling_mode`` picks a variance-reduced design for the classic game
+    (see :mod:`sampling`) and adds a ``"sampling"`` report on the switch rate.
+    """
+    opened = doors - 2 if opened is None else opened
+    if method == "exact" and host == "biased":
+        raise ValueError("method='exact' supports the standard and ignorant hosts")
+    rules = (doors, opened, host)
+    step, width = _step(doors, opened, host, host_bias)
+    if target_se is not None:
+        games, totals = engine.run_to_precision(
+            step, games, seed, error=_error, target=target_se, width=width
+        )
+        result = _result(games, totals, *rules)
+        result["precision"] = precision.report(
+            result["switch_rate"], _error(totals, games), games, target_se, confidence
+        )
+        return result
+    if trace_points is not None:
+        at = traces.positions(games, trace_points, trace_spacing)
+        totals, running = engine.run_traced(step, games, seed, at=at, width=width)
+        result = _result(games, totals, *rules)
+        valid, _, switch = _counts(running, at)
+        switch_rate = switch / np.maximum(valid, 1)
+        result["trace"] = traces.series(at, switch_rate, trace_points, trace_spacing)
+        return result
+    if sampling_mode != "iid":
+        if not _is_classic(*rules) or sampling_mode == "control-variate":
+            raise ValueError(
+                "Monty Hall supports antithetic, stratified and qmc sampling of the classic game"
+            )
+        totals, report = sampling.run(
+            _from_uniforms, 2, games, seed, sampling_mode, estimand="switch_wins"
+        )
+        result = _result(games, totals, *rules)
+        result["sampling"] = report
+        return result
+    if method == "exact" and _is_classic(*rules):
+        totals = {"stay_wins": int(np.random.default_rng(seed).binomial(games, 1 / 3))}
+    elif method == "exact":
+        totals = _exact_totals(games, *rules, seed)
+    else:
+        totals = engine.run(step, games, seed, width=width)
+    return _result(games, totals, *rules)
+
+
+def stream(
+    games: int,
+    seed: int | None = None,
+    doors: int = 3,
+    opened: int | None = None,
+    host: str = "standard",
+    host_bias: float = 1.0,
+) -> Iterator[dict]:
+    """Like :func:`simulate`, yielding the running result after every batch."""
+    opened = doors - 2 if opened is None else opened
+    step, width = _step(doors, opened, host, host_bias)
+    for done, totals in engine.iterate(step, games, seed, width=width):
+        yield _result(done, totals, doors, opened, host)
+
+
+def export(
+    games: int,
+    seed: int | None = None,
+    doors: int = 3,
+    opened: int | None = None,
+    host: str = "standard",
+    host_bias: float = 1.0,
+) -> Iterator[dict[str, np.ndarray]]:
+    """The per-game data behind :func:`simulate`, one batch of columns at a time.
+
+    Doors are numbered from 0: ``car``, ``first_choice`` and (variants) the
+    door a switcher takes, ``switch``; plus the per-game outcomes that
+    :func:`simulate` counts. Summing the outcomes reproduces its totals.
+    """
+    opened = doors - 2 if opened is None else opened
+    step, width = _step(doors, opened, host, host_bias, raw=True)
+    yield from engine.outcomes(step, games, seed, width=width)
+
+
+def theoretical_rates(
+    doors: int = 3, opened: int = 1, host: str = "standard"
+) -> tuple[float, float]:
+    """Exact ``(stay, switch)`` win rates; conditional on a hidden car if ignorant."""
+    if host == "ignorant":
+        # Every still-closed door is equally likely once the car survives the reveal.
+        return 1 / (doors - opened), 1 / (doors - opened)
+    return 1 / doors, (doors - 1) / doors / (doors - 1 - opened)
+
+
+def _rate(wins: int, games: int) -> float:
+    return wins / games if games else 0.0
+
+
+def _result(
+    games: int, totals: dict, doors: int = 3, opened: int = 1, host: str = "standard"
+) -> dict:
+    valid, stay_wins, switch_wins = _counts(totals, games)
+    theoretical_stay, theoretical_switch = theoretical_rates(doors, opened, host)
 
-    return {
+    result = {
         "games": games,
+        "doors": doors,
+        "opened": opened,
+        "host": host,
         "stay_wins": stay_wins,
         "switch_wins": switch_wins,
-        "stay_rate": stay_wins / games,
-        "switch_rate": switch_wins / games,
-        "theoretical_stay_rate": 1 / 3,
-        "theoretical_switch_rate": 2 / 3,
+        "stay_rate": _rate(stay_wins, valid),
+        "switch_rate": _rate(switch_wins, valid),
+        "theoretical_stay_rate": theoretical_stay,
+        "theoretical_switch_rate": theoretical_switch,
     }
+    if host == "ignorant":
+        result["car_revealed"] = totals["car_revealed"]
+    if host == "biased":
+        result["lowest_opened"] = totals["lowest_opened"]
+        result["switch_rate_given_lowest"] = _rate(
+            totals["lowest_switch_wins"], totals["lowest_opened"]
+        )
+    return result
@@ -0,0 +1,53 @@
+"""Standard errors and confidence intervals for the simulators' headline estimates.
+
+Used by target-precision runs (see :func:`engine.run_to_precision`): instead of
+guessing a trial count, a caller asks for a standard error and the simulator
+keeps adding batches until its estimate is that tight.
+"""
+from __future__ import annotations
+
+import math
+from statistics import NormalDist
+
+
+def z_score(confidence: float) -> float:
+    """Two-sided normal quantile, e.g. 1.96 for 95%."""
+    return NormalDist().inv_cdf((1 + confidence) / 2)
+
+
+def proportion_se(successes: int, n: int) -> float:
+    """Standard error of a proportion, Agresti–Coull adjusted.
+
+    Adding two successes and two failures keeps the error positive when a run
+    has seen no (or only) successes yet, so a rare event can't stop a run early.
+    """
+    p = (successes + 2) / (n + 4)
+    return math.sqrt(p * (1 - p) / (n + 4))
+
+
+def mean_se(moments) -> float:
+    """Standard error of a sample mean from its :class:`engine.Moments`."""
+    if moments.n < 2:
+        return math.inf
+    return math.sqrt(moments.variance / moments.n)
+
+
+def report(
+    estimate: float,
+    standard_error: float,
+    trials: int,
+    target: float,
+    confidence: float,
+) -> dict:
+    """Precision summary attached to a result as ``"precision"``."""
+    half_width = z_score(confidence) * standard_error
+    return {
+        "estimate": estimate,
+        "standard_error": standard_error,
+        "confidence": confidence,
+        "ci_low": estimate - half_width,
+        "ci_high": estimate + half_width,
+        "target_standard_error": target,
+        "target_met": standard_error <= target,
+        "trials_used": trials,
+    }
@@ -0,0 +1,195 @@
+"""Variance-reduced sampling shared by the simulators.
+
+Plain Monte Carlo feeds every trial independent uniforms. The designs here
+correlate them so that an average converges faster, without biasing it:
+
+- ``"antithetic"``: trials come in pairs ``u`` and ``1 - u``. This helps when the
+  outcome is monotone in the draws; it can also hurt, which the report shows.
+- ``"stratified"``: each block of :data:`BLOCK` trials is a Latin hypercube.
+  Every coordinate hits each of the block's ``1/BLOCK`` strata exactly once, so
+  a coin comes up heads exactly half the time and a three-door car is spread
+  evenly over the doors.
+- ``"qmc"``: each block is the first :data:`BLOCK` points of the Halton
+  sequence, randomly shifted modulo 1 (Cranley–Patterson). The shift keeps the
+  points unbiased and makes the blocks independent replicates.
+- ``"control-variate"``: i.i.d. draws, but the estimate is corrected by
+  ``beta * (mean(c) - E[c])`` for a per-trial control ``c`` with a known mean,
+  ``beta`` being the regression slope of the outcome on ``c``.
+
+Because trials within a block are dependent, the standard error comes from the
+spread of *block* means. The same draws also give the i.i.d. standard error,
+and the ratio of their variances is the reported ``variance_reduction``: how
+many plain trials each of these is worth.
+
+Simulators opt in with a ``from_uniforms(u)`` map from an ``(n, dims)`` array
+of uniforms to the same per-trial outcomes their engine step returns.
+"""
+from __future__ import annotations
+
+import math
+from collections.abc import Callable
+from functools import lru_cache
+
+import numpy as np
+
+from app import metrics
+from app.simulations import engine
+
+# Trials per stratified or QMC block (one replicate).
+BLOCK = 256
+
+
+def block_size(mode: str) -> int:
+    """Trials per independent unit under ``mode``."""
+    if mode in ("stratified", "qmc"):
+        return BLOCK
+    return 2 if mode == "antithetic" else 1
+
+
+def _primes(count: int) -> np.ndarray:
+    limit = max(16, int(count * (math.log(count + 1) + math.log(math.log(count + 3)) + 3)))
+    sieve = np.ones(limit, dtype=bool)
+    sieve[:2] = False
+    for p in range(2, int(limit**0.5) + 1):
+        if sieve[p]:
+            sieve[p * p::p] = False
+    return np.flatnonzero(sieve)[:count]
+
+
+@lru_cache(maxsize=16)
+def halton(points: int, dims: int) -> np.ndarray:
+    """The first ``points`` Halton points (from index 1) in ``dims`` dimensions."""
+    index = np.arange(1, points + 1)
+    out = np.empty((points, dims))
+    for d, base in enumerate(_primes(dims).tolist()):
+        # Radical inverse: mirror the base-b digits of the index about the point.
+        value, scale, rest = np.zeros(points), 1.0 / base, index.copy()
+        while rest.any():
+            rest, digit = np.divmod(rest, base)
+            value += digit * scale
+            scale /= base
+        out[:, d] = value
+    out.flags.writeable = False
+    return out
+
+
+def uniforms(rng: np.random.Generator, n: int, dims: int, mode: str) -> np.ndarray:
+    """``(n, dims)`` uniforms under ``mode``; ``n`` should be a multiple of its block."""
+    if mode == "antithetic":
+        half = metrics.timed("rng", rng.random, ((n + 1) // 2, dims))
+        return np.stack([half, 1.0 - half], axis=1).reshape(-1, dims)[:n]
+    if mode == "stratified":
+        blocks = -(-n // BLOCK)
+        # A random permutation of the strata per block and coordinate.
+        ranks = metrics.timed("rng", rng.random, (blocks, BLOCK, dims)).argsort(axis=1)
+        jitter = metrics.timed("rng", rng.random, (blocks, BLOCK, dims))
+        return ((ranks + jitter) / BLOCK).reshape(-1, dims)[:n]
+    if mode == "qmc":
+        blocks = -(-n // BLOCK)
+        shift = metrics.timed("rng", rng.random, (blocks, 1, dims))
+        points = (halton(BLOCK, dims) + shift) % 1.0
+        return points.reshape(-1, dims)[:n]
+    return metrics.timed("rng", rng.random, (n, dims))
+
+
+def run(
+    from_uniforms: Callable[[np.ndarray], dict[str, np.ndarray]],
+    dims: int,
+    trials: int,
+    seed: int | None,
+    mode: str,
+    *,
+    estimand: str,
+    control: str | None = None,
+    control_mean: float | None = None,
+    chunk_elements: int | None = None,
+) -> tuple[dict[str, int | float], dict]:
+    """Run ``trials`` under ``mode``; return the outcome totals and a report.
+
+    ``estimand`` names the per-trial outcome whose mean is being estimated;
+    with ``mode="control-variate"``, ``control`` names the control outcome and
+    ``control_mean`` its exact mean. The report has the estimate, its standard
+    error, the i.i.d. standard error from the same draws, and their variance
+    ratio. Runs serially in batches on one RNG stream.
+    """
+    block = block_size(mode)
+    size = max(block, engine.batch_rows(dims, chunk_elements) // block * block)
+    rng = np.random.default_rng(seed)
+    totals: dict[str, int | float] = {}
+    # Moments of y and c over trials, their co-moment, and moments of complete
+    # blocks' means of y — merged batch by batch like engine.Moments, never
+    # from raw sums of squares.
+    y_moments = c_moments = blocks = engine.Moments(0, 0.0, 0.0)
+    comoment = 0.0
+    for n in engine.batches(trials, size):
+        u = uniforms(rng, n, dims, mode)
+        outcomes = metrics.timed("kernel", from_uniforms, u)
+        engine.accumulate(totals, outcomes)
+        with metrics.stage("reduce"):
+            y = outcomes[estimand].astype(np.float64)
+            batch_y = engine.Moments.of(y)
+            if control:
+                c = outcomes[control].astype(np.float64)
+                batch_c = engine.Moments.of(c)
+                comoment += _comoment(y, c, batch_y, batch_c, y_moments, c_moments)
+                c_moments += batch_c
+            y_moments += batch_y
+            whole = n // block * block
+            blocks += engine.Moments.of(y[:whole].reshape(-1, block).mean(axis=1))
+    return totals, _report(mode, y_moments, c_moments, comoment, blocks, control_mean)
+
+
+def _comoment(
+    y: np.ndarray,
+    c: np.ndarray,
+    batch_y: engine.Moments,
+    batch_c: engine.Moments,
+    seen_y: engine.Moments,
+    seen_c: engine.Moments,
+) -> float:
+    """A batch's contribution to the co-moment of y and c (Chan's update)."""
+    within = float((y - batch_y.mean) @ (c - batch_c.mean))
+    n = seen_y.n + batch_y.n
+    between = (batch_y.mean - seen_y.mean) * (batch_c.mean - seen_c.mean)
+    return within + between * seen_y.n * batch_y.n / n
+
+
+def _report(
+    mode: str,
+    y: engine.Moments,
+    c: engine.Moments,
+    comoment: float,
+    blocks: engine.Moments,
+    control_mean: float | None,
+) -> dict:
+    n = y.n
+    estimate = y.mean
+    iid_variance = y.variance
+    if mode == "control-variate":
+        cov = comoment / (n - 1) if n > 1 else 0.0
+        beta = cov / c.variance if 0 < c.variance < math.inf else 0.0
+        estimate -= beta * (c.mean - control_mean)
+        variance = max(iid_variance - beta * cov, 0.0) / n
+    else:
+        # Block means are i.i.d.; each stands for ``block`` trials.
+        variance = blocks.variance / blocks.n if blocks.n else math.inf
+    iid_se = math.sqrt(iid_variance / n) if n > 1 else math.inf
+    se = math.sqrt(variance)
+    return {
+        "sampling": mode,
+        "estimate": estimate,
+        "standard_error": se,
+        "iid_standard_error": iid_se,
+        # Plain trials each of these is worth; null when the variance vanished.
+        "variance_reduction": iid_se**2 / variance if variance > 0 else None,
+    }
+
+
+def scaled(report: dict, estimate: float, slope: float) -> dict:
+    """``report`` for a smooth function of its estimate, by the delta method."""
+    return {
+        **report,
+        "estimate": estimate,
+        "standard_error": abs(slope) * report["standard_error"],
+        "iid_standard_error": abs(slope) * report["iid_standard_error"],
+    }
@@ -1,12 +1,49 @@
-"""Simpson's paradox: a fixed, illustrative admissions dataset.
+"""Simpson's paradox: a fixed, illustrative admissions dataset, and an analyzer.
 
-This isn't a Monte Carlo simulation — the point is a deterministic dataset where
-a trend reverses on aggregation. The numbers mirror the classic 1973 UC Berkeley
-case: women have a higher acceptance rate in *every* department, yet a lower rate
-overall, because they applied disproportionately to the more selective one.
+:func:`dataset` isn't a Monte Carlo simulation — the point is a deterministic
+dataset where a trend reverses on aggregation. The numbers mirror the classic
+1973 UC Berkeley case: women have a higher acceptance rate in *every*
+department, yet a lower rate overall, because they applied disproportionately
+to the more selective one.
+
+:class:`Table` looks for the same reversal in arbitrary stratified data. Rows
+of ``(stratum, group, success[, count])`` are streamed in chunks — from CSV,
+Parquet or :func:`generate` — and tallied into a ``(strata, groups)`` matrix
+with :func:`numpy.bincount`, so memory depends on the number of strata and
+groups, never on the number of rows.
 """
 from __future__ import annotations
 
+import csv
+import io
+from typing import BinaryIO
+
+import numpy as np
+
+from app import metrics
+from app.simulations import engine
+
+try:
+    import pyarrow.parquet as pq
+except ImportError:  # pragma: no cover - pyarrow is optional
+    pq = None
+
+# Limits on distinct labels, which bound the tally matrices (and the pairwise
+# reversal search, which is quadratic in the number of groups).
+MAX_STRATA = 100_000
+MAX_GROUPS = 50
+
+# Uploaded CSV is parsed in pieces of about this many bytes.
+CSV_CHUNK_BYTES = 4 << 20
+
+# Accepted header names for each column.
+_COLUMNS = {
+    "stratum": ("stratum", "department"),
+    "group": ("group",),
+    "success": ("success", "successes", "admitted"),
+    "count": ("count", "trials", "applied"),
+}
+
 # (department name, male applied/admitted, female applied/admitted)
 _DEPARTMENTS = [
     {"name": "Department A", "male": (100, 80), "female": (20, 18)},
@@ -61,3 +98,262 @@ def dataset() -> dict:
         },
         "paradox": female_wins_all and male_wins_overall,
     }
+
+
+class Table:
+    """Per-stratum, per-group trial and success counts, built up chunk by chunk.
+
+    Each row is one stratum/group cell with ``count`` trials (1 if omitted), of
+    which ``success`` succeeded: a 0/1 outcome for individual records, or a
+    tally for pre-aggregated tables like :data:`_DEPARTMENTS`. Labels may be any
+    strings or numbers; they're kept as strings (so ``1`` in a Parquet column
+    and ``"1"`` in a CSV are the same label) and numbered in order of first
+    appearance.
+    """
+
+    def __init__(
+        self,
+        strata: list[str] | None = None,
+        groups: list[str] | None = None,
+        max_strata: int = MAX_STRATA,
+        max_groups: int = MAX_GROUPS,
+    ) -> None:
+        self.max_strata = max_strata
+        self.max_groups = max_groups
+        self._strata = {label: i for i, label in enumerate(strata or [])}
+        self._groups = {label: i for i, label in enumerate(groups or [])}
+        self.trials = np.zeros((len(self._strata), len(self._groups)), dtype=np.int64)
+        self.successes = np.zeros_like(self.trials)
+        self.rows = 0
+        self._pending: list[bytes] = []
+        self._pending_bytes = 0
+        self._header: dict[str, int] | None = None
+
+    def _codes(self, index: dict, labels: np.ndarray, limit: int, kind: str) -> np.ndarray:
+        """Integer codes for ``labels``, numbering unseen labels as they appear."""
+        uniques, inverse = np.unique(labels, return_inverse=True)
+        lookup = np.fromiter(
+            (index.setdefault(str(label), len(index)) for label in uniques.tolist()),
+            dtype=np.int64,
+            count=len(uniques),
+        )
+        if len(index) > limit:
+            raise ValueError(f"at most {limit:_} distinct {kind} are supported")
+        return lookup[inverse.ravel()]
+
+    def add(self, strata, groups, successes, counts=None) -> None:
+        """Tally a chunk of rows given by label."""
+        s = self._codes(self._strata, np.asarray(strata), self.max_strata, "strata")
+        g = self._codes(self._groups, np.asarray(groups), self.max_groups, "groups")
+        self.add_codes(s, g, successes, counts)
+
+    def add_codes(self, s: np.ndarray, g: np.ndarray, successes, counts=None) -> None:
+        """Tally a chunk of rows given by stratum and group code."""
+        successes = np.asarray(successes, dtype=np.int64)
+        counts = np.ones_like(successes) if counts is None else np.asarray(counts, dtype=np.int64)
+        if len(successes) and (successes.min() < 0 or (successes > counts).any()):
+            raise ValueError("success must be between 0 and count")
+        shape = (len(self._strata), len(self._groups))
+        if shape != self.trials.shape:
+            grow = [(0, new - old) for new, old in zip(shape, self.trials.shape)]
+            self.trials = np.pad(self.trials, grow)
+            self.successes = np.pad(self.successes, grow)
+        with metrics.stage("reduce"):
+            cells = s * shape[1] + g
+            size = shape[0] * shape[1]
+            # bincount sums in float64, exact for any realistic count.
+            self.trials += np.bincount(cells, counts, size).astype(np.int64).reshape(shape)
+            self.successes += np.bincount(cells, successes, size).astype(np.int64).reshape(shape)
+        self.rows += len(successes)
+
+    def _columns(self, names: list[str]) -> dict[str, int]:
+        names = [name.strip().lower() for name in names]
+        found = {}
+        for column, aliases in _COLUMNS.items():
+            match = next((names.index(a) for a in aliases if a in names), None)
+            if match is not None:
+                found[column] = match
+        missing = {"stratum", "group", "success"} - set(found)
+        if missing:
+            raise ValueError(f"missing column(s): {', '.join(sorted(missing))}")
+        return found
+
+    def _parse(self, text: str) -> None:
+        rows = [row for row in csv.reader(io.StringIO(text)) if row]
+        if self._header is None and rows:
+            self._header = self._columns(rows.pop(0))
+        if not rows:
+            return
+        try:
+            columns = {
+                name: np.array([row[i] for row in rows]) for name, i in self._header.items()
+            }
+            numbers = {
+                name: columns[name].astype(np.int64)
+                for name in ("success", "count") if name in columns
+            }
+        except (IndexError, ValueError) as exc:
+            raise ValueError("every row needs integer success (and count) values") from exc
+        self.add(columns["stratum"], columns["group"], numbers["success"], numbers.get("count"))
+
+    def feed_csv(self, data: bytes) -> None:
+        """Add a piece of a CSV file with a header row; call :meth:`close` at the end.
+
+        Input is buffered up to :data:`CSV_CHUNK_BYTES` and parsed a whole line
+        at a time, so quoted fields may not contain newlines.
+        """
+        # Collected as pieces and joined once, not re-copied per network chunk.
+        self._pending.append(data)
+        self._pending_bytes += len(data)
+        if self._pending_bytes < CSV_CHUNK_BYTES:
+            return
+        buffered = b"".join(self._pending)
+        cut = buffered.rfind(b"\n") + 1
+        rest = buffered[cut:]
+        self._pending, self._pending_bytes = [rest], len(rest)
+        if cut:
+            self._parse(buffered[:cut].decode("utf-8-sig"))
+
+    def close(self) -> None:
+        """Parse whatever CSV input is still buffered."""
+        chunk = b"".join(self._pending)
+        self._pending, self._pending_bytes = [], 0
+        self._parse(chunk.decode("utf-8-sig"))
+        if self._header is None:
+            raise ValueError("empty CSV upload")
+
+    def read_parquet(self, file: BinaryIO, batch_rows: int = 1 << 20) -> None:
+        """Add every row of a Parquet file, a record batch at a time (needs pyarrow)."""
+        if pq is None:
+            raise RuntimeError("reading Parquet requires pyarrow")
+        parquet = pq.ParquetFile(file)
+        found = self._columns(parquet.schema_arrow.names)
+        names = [parquet.schema_arrow.names[i] for i in found.values()]
+        for batch in parquet.iter_batches(batch_size=batch_rows, columns=names):
+            columns = dict(zip(found, (c.to_numpy(zero_copy_only=False) for c in batch.columns)))
+            self.add(columns["stratum"], columns["group"], columns["success"], columns.get("count"))
+
+    def _reversals(self, rates: np.ndarray, pooled: np.ndarray) -> list[dict]:
+        """Pairs of groups whose pooled order is the opposite of their within-strata order.
+
+        With thousands of small strata a few will always disagree by chance, so
+        the within-strata order is the Mantel–Haenszel-weighted average of the
+        stratum gaps (weights ``n_i n_j / (n_i + n_j)`` over strata where both
+        groups have trials). ``strata_agreeing`` counts the strata that side
+        with it; ``every_stratum`` is the textbook case where all of them do.
+        """
+        trials = self.trials
+        groups = list(self._groups)
+        found = []
+        for i in range(len(groups) - 1):
+            ni, nj = trials[:, [i]], trials[:, i + 1:]
+            both = (ni > 0) & (nj > 0)
+            weights = np.divide(ni * nj, ni + nj, out=np.zeros(both.shape), where=both)
+            gap = rates[:, [i]] - rates[:, i + 1:]
+            total = weights.sum(axis=0)
+            adjusted = np.divide(
+                (weights * gap).sum(axis=0), total, out=np.zeros_like(total), where=total > 0
+            )
+            pooled_gap = pooled[i] - pooled[i + 1:]
+            flipped = np.sign(adjusted) * np.sign(pooled_gap) < 0
+            for k in np.flatnonzero(flipped).tolist():
+                j = i + 1 + k
+                leader, trailer = (i, j) if pooled_gap[k] > 0 else (j, i)
+                # gap is i's rate minus j's: positive where i leads.
+                ahead = gap[:, k] > 0 if trailer == i else gap[:, k] < 0
+                agreeing = int((ahead & both[:, k]).sum())
+                shared = int(both[:, k].sum())
+                found.append({
+                    "pooled_leader": groups[leader],
+                    "stratum_leader": groups[trailer],
+                    "pooled_gap": abs(float(pooled_gap[k])) * 100,
+                    "adjusted_gap": abs(float(adjusted[k])) * 100,
+                    "strata": shared,
+                    "strata_agreeing": agreeing,
+                    "every_stratum": agreeing == shared,
+                })
+        return found
+
+    def analysis(self, strata_limit: int = 50) -> dict:
+        """Per-group pooled rates, the largest strata, and every reversal found.
+
+        Rates are percentages, as in :func:`dataset`. ``strata`` lists the
+        ``strata_limit`` strata with the most trials; ``strata_count`` is the total.
+        """
+        if len(self._groups) < 2:
+            raise ValueError("need at least two groups to compare")
+        trials, successes = self.trials, self.successes
+        rates = np.divide(successes, trials, out=np.zeros(trials.shape), where=trials > 0)
+        pooled_trials, pooled_successes = trials.sum(axis=0), successes.sum(axis=0)
+        pooled = np.divide(
+            pooled_successes, pooled_trials,
+            out=np.zeros(len(pooled_trials)), where=pooled_trials > 0,
+        )
+        reversals = self._reversals(rates, pooled)
+        names = list(self._strata)
+        largest = np.argsort(-trials.sum(axis=1), kind="stable")[:strata_limit]
+        return {
+            "rows": self.rows,
+            "strata_count": len(names),
+            "groups": [
+                {"name": name, "trials": t, "successes": s, "rate": r}
+                for name, t, s, r in zip(
+                    self._groups, pooled_trials.tolist(), pooled_successes.tolist(),
+                    (pooled * 100).tolist(),
+                )
+            ],
+            "strata": [
+                {
+                    "name": names[i],
+                    "trials": trials[i].tolist(),
+                    "successes": successes[i].tolist(),
+                    "rates": (rates[i] * 100).tolist(),
+                }
+                for i in largest.tolist()
+            ],
+            "reversals": reversals,
+            "pairs_checked": len(self._groups) * (len(self._groups) - 1) // 2,
+            "paradox": bool(reversals),
+        }
+
+
+# How strongly the synthetic groups sort into strata: higher-numbered groups
+# favour the harder strata, which is what flips their pooled rates.
+_SELECTION = 6.0
+
+
+def generate(
+    rows: int,
+    strata: int,
+    groups: int,
+    seed: int | None = None,
+    strata_limit: int = 50,
+) -> dict:
+    """Analyze ``rows`` synthetic admissions built to show Simpson's paradox.
+
+    Strata range from easy (85% admitted) to hard (15%), and each group does a
+    little better than the one before it in every stratum — but also applies
+    more often to the hard strata, so its pooled rate comes out lower.
+    """
+    table = Table(
+        [f"Stratum {s + 1}" for s in range(strata)],
+        [f"Group {g + 1}" for g in range(groups)],
+    )
+    rng = np.random.default_rng(seed)
+    quality = np.linspace(-1, 1, groups)
+    difficulty = np.linspace(-0.5, 0.5, strata)
+    rates = np.clip(np.linspace(0.85, 0.15, strata)[:, None] + 0.05 * quality, 0.01, 0.99)
+    # Each group's stratum CDF, shifted by the group code so one sorted array
+    # serves every row: group g's strata occupy (g, g + 1].
+    cdf = np.cumsum(np.exp(_SELECTION * np.outer(quality, difficulty)), axis=1)
+    cdf /= cdf[:, -1:]
+    cdf[:, -1] = 1.0
+    offsets = (cdf + np.arange(groups)[:, None]).ravel()
+
+    for n in engine.batches(rows, engine.batch_rows(3)):
+        g = metrics.timed("rng", rng.integers, 0, groups, size=n)
+        u = metrics.timed("rng", rng.random, n)
+        s = np.searchsorted(offsets, g + u, side="right") - g * strata
+        admitted = metrics.timed("rng", rng.random, n) < rates[s, g]
+        table.add_codes(s, g, admitted)
+    return table.analysis(strata_limit)
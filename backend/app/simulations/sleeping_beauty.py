@@ -1,17 +1,97 @@
 """Sleeping Beauty: counting awakenings supports the 'thirder' position."""
 from __future__ import annotations
 
+from collections.abc import Iterator
+
 import numpy as np
 
+from app import metrics
+from app.simulations import engine, precision, sampling, traces
+
 HEADS = 0
 TAILS = 1
 
 
-def simulate(trials: int, seed: int | None = None) -> dict:
-    """Run ``trials`` coin tosses; Tails wakes Beauty twice, Heads once."""
-    rng = np.random.default_rng(seed)
-    coins = rng.integers(0, 2, size=trials)
-    heads_count = int(np.count_nonzero(coins == HEADS))
+def _batch(rng: np.random.Generator, n: int) -> dict[str, np.ndarray]:
+    coins = metrics.timed("rng", rng.integers, 0, 2, size=n)
+    return {"heads": coins == HEADS}
+
+
+def _from_uniforms(u: np.ndarray) -> dict[str, np.ndarray]:
+    return {"heads": u[:, 0] < 0.5}
+
+
+def _error(totals: dict, trials: int) -> float:
+    # P(heads | awake) = q / (2 - q) for a heads rate q; delta method.
+    q = totals["heads"] / trials
+    return 2 / (2 - q) ** 2 * precision.proportion_se(totals["heads"], trials)
+
+
+def simulate(
+    trials: int,
+    seed: int | None = None,
+    method: str = "monte-carlo",
+    target_se: float | None = None,
+    confidence: float = 0.95,
+    trace_points: int | None = None,
+    trace_spacing: str = "log",
+    sampling_mode: str = "iid",
+) -> dict:
+    """Run ``trials`` coin tosses; Tails wakes Beauty twice, Heads once.
+
+    ``method="exact"`` draws the heads count directly: Binomial(trials, 1/2).
+    With ``target_se``, ``trials`` is a budget: toss only until the standard
+    error of P(heads | awake) reaches it. ``trace_points`` adds a ``"trace"``
+    of the running P(heads | awake) (see :mod:`traces`). ``sampling_mode``
+    picks a variance-reduced design for the tosses (see :mod:`sampling`) and
+    adds a ``"sampling"`` report on P(heads | awake).
+    """
+    if target_se is not None:
+        trials, totals = engine.run_to_precision(
+            _batch, trials, seed, error=_error, target=target_se
+        )
+        result = _result(trials, totals["heads"])
+        result["precision"] = precision.report(
+            result["p_heads_given_awake"], _error(totals, trials), trials, target_se, confidence
+        )
+        return result
+    if trace_points is not None:
+        at = traces.positions(trials, trace_points, trace_spacing)
+        totals, running = engine.run_traced(_batch, trials, seed, at=at)
+        result = _result(trials, totals["heads"])
+        # Heads wakes Beauty once, tails twice: h / (h + 2(n - h)).
+        p_heads = running["heads"] / (2 * at - running["heads"])
+        result["trace"] = traces.series(at, p_heads, trace_points, trace_spacing)
+        return result
+    if sampling_mode != "iid":
+        if sampling_mode == "control-variate":
+            raise ValueError("Sleeping Beauty has no control variate")
+        totals, report = sampling.run(
+            _from_uniforms, 1, trials, seed, sampling_mode, estimand="heads"
+        )
+        result = _result(trials, totals["heads"])
+        q = report["estimate"]
+        result["sampling"] = sampling.scaled(report, q / (2 - q), 2 / (2 - q) ** 2)
+        return result
+    if method == "exact":
+        heads_count = int(np.random.default_rng(seed).binomial(trials, 0.5))
+    else:
+        heads_count = engine.run(_batch, trials, seed)["heads"]
+    return _result(trials, heads_count)
+
+
+def stream(trials: int, seed: int | None = None) -> Iterator[dict]:
+    """Like :func:`simulate`, yielding the running result after every batch."""
+    for done, totals in engine.iterate(_batch, trials, seed):
+        yield _result(done, totals["heads"])
+
+
+def export(trials: int, seed: int | None = None) -> Iterator[dict[str, np.ndarray]]:
+    """The per-toss ``heads`` flags behind :func:`simulate`, a batch at a time."""
+    yield from engine.outcomes(_batch, trials, seed)
+
+
+def _result(trials: int, heads_count: int) -> dict:
     tails_count = trials - heads_count
 
     # Awakenings, not coin tosses, are what Beauty conditions on.
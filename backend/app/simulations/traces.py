@@ -0,0 +1,58 @@
+"""Downsampled convergence traces: a simulator's running estimate vs. trials.
+
+A trace is read off at a few hundred trial counts chosen up front, so the
+engine only has to sample cumulative sums at those positions as batches go by
+(see :func:`engine.run_traced`) — nothing per-trial is kept or returned.
+
+- ``"log"`` spacing puts points evenly on a log axis, where convergence plots
+  are usually drawn: dense while the estimate is still moving, sparse later.
+- ``"lttb"`` samples a uniform grid of candidates and keeps the points that
+  best preserve the curve's shape (Largest-Triangle-Three-Buckets), for plots
+  on a linear axis.
+"""
+from __future__ import annotations
+
+import numpy as np
+
+# LTTB picks from this many candidates per requested point.
+LTTB_OVERSAMPLE = 32
+
+
+def positions(trials: int, points: int, spacing: str = "log") -> np.ndarray:
+    """Sorted, distinct trial counts (1..trials) at which to sample the sums."""
+    if spacing == "log":
+        grid = np.geomspace(1, trials, points)
+    else:
+        grid = np.linspace(1, trials, min(trials, points * LTTB_OVERSAMPLE))
+    return np.unique(np.rint(grid).astype(np.int64))
+
+
+def lttb(x: np.ndarray, y: np.ndarray, points: int) -> np.ndarray:
+    """Indices of ``points`` (>= 3) samples chosen by Largest-Triangle-Three-Buckets."""
+    n = len(x)
+    if points >= n:
+        return np.arange(n)
+    # First and last points are kept; the rest are split into equal buckets.
+    edges = np.linspace(1, n - 1, points - 1).astype(np.int64)
+    chosen = [0]
+    for b in range(points - 2):
+        lo, hi = edges[b], edges[b + 1]
+        # The next bucket's centroid (or the last point) anchors the triangle.
+        nlo, nhi = hi, edges[b + 2] if b + 2 < len(edges) else n
+        cx, cy = x[nlo:nhi].mean(), y[nlo:nhi].mean()
+        ax, ay = x[chosen[-1]], y[chosen[-1]]
+        area = np.abs((ax - cx) * (y[lo:hi] - ay) - (ax - x[lo:hi]) * (cy - ay))
+        chosen.append(lo + int(np.argmax(area)))
+    chosen.append(n - 1)
+    return np.asarray(chosen)
+
+
+def series(at: np.ndarray, estimates: np.ndarray, points: int, spacing: str) -> list[dict]:
+    """The trace as ``[{"trials", "estimate"}]``, reduced to ``points`` for LTTB."""
+    if spacing == "lttb":
+        keep = lttb(at.astype(np.float64), estimates, points)
+        at, estimates = at[keep], estimates[keep]
+    return [
+        {"trials": int(n), "estimate": float(e)}
+        for n, e in zip(at.tolist(), estimates.tolist())
+    ]
@@ -4,30 +4,260 @@ The flawed argument claims switching always raises your expected value. We put
 that to the test directly: over many rounds, compare an always-stay player with
 an always-switch player drawing from the *same* envelope pairs. Their averages
 converge — switching yields no advantage, which is the resolution of the paradox.
+
+The smaller amount X is drawn from a *prior*:
+
+- ``"uniform"``: an integer in ``1..max_base`` (the default).
+- ``"geometric"``: ``P(X = k) = (1 - ratio) ratio^(k-1)`` for ``k >= 1``.
+- ``"doubling"``: ``X = 2^K`` with ``P(K = k) = (1 - ratio) ratio^k``. For
+  ``ratio >= 1/2`` the expected amount is infinite (Broome's version of the
+  paradox is ``ratio = 2/3``): every conditional argument for switching looks
+  sound, and the running averages never settle.
+- ``"log-uniform"``: a real amount whose logarithm is uniform on
+  ``[0, log(max_base)]``.
+
+Integer priors keep amounts in the smallest dtype that can't overflow; the
+doubling and log-uniform priors use float64. ``2^K`` overflows that once
+``K > 1023``, so requests cap the doubling ratio well below where that is
+reachable (``schemas.DOUBLING_MAX_RATIO``).
 """
 from __future__ import annotations
 
+import math
+from collections.abc import Iterator
+from functools import partial
+
 import numpy as np
 
+from app import metrics
+from app.simulations import engine, precision, sampling, traces
 
-def simulate(trials: int, max_base: int = 100, seed: int | None = None) -> dict:
-    """Compare always-stay vs always-switch over ``trials`` rounds."""
-    rng = np.random.default_rng(seed)
+
+def _base(
+    rng: np.random.Generator, n: int, prior: str, max_base: int, ratio: float
+) -> np.ndarray:
+    """``n`` draws of the smaller amount X."""
+    if prior == "uniform":
+        # 2 * max_base still fits: max_base is capped far below 2**30.
+        return metrics.timed("rng", rng.integers, 1, max_base + 1, size=n, dtype=np.int32)
+    if prior == "geometric":
+        return metrics.timed("rng", rng.geometric, 1 - ratio, size=n)
+    if prior == "doubling":
+        exponent = metrics.timed("rng", rng.geometric, 1 - ratio, size=n) - 1
+        return np.ldexp(1.0, exponent)
+    return np.exp(metrics.timed("rng", rng.random, n) * math.log(max_base))
+
+
+def _inverse_cdf(u: np.ndarray, prior: str, max_base: int, ratio: float) -> np.ndarray:
+    """The smaller amount X as a function of one uniform (same law as :func:`_base`)."""
+    if prior == "uniform":
+        return (u * max_base).astype(np.int32) + 1
+    if prior == "log-uniform":
+        return np.exp(u * math.log(max_base))
+    # P(K >= k) = ratio^k for the geometric step count K = floor(log(1-u) / log r).
+    steps = np.floor(np.log1p(-u) / math.log(ratio)).astype(np.int64)
+    return steps + 1 if prior == "geometric" else np.ldexp(1.0, steps)
+
+
+def _from_uniforms(
+    u: np.ndarray, max_base: int, prior: str, ratio: float
+) -> dict[str, np.ndarray]:
+    # Two uniforms per round: the amount, then which envelope was picked.
+    base = _inverse_cdf(u[:, 0], prior, max_base, ratio)
+    picked_smaller = u[:, 1] < 0.5
+    # Switching gains X or loses X; its sign alone has a known mean (zero)
+    # and tracks the advantage closely — the control variate.
+    sign = np.where(picked_smaller, 1, -1).astype(np.int8)
+    return {
+        "stay": np.where(picked_smaller, base, 2 * base),
+        "switch": np.where(picked_smaller, 2 * base, base),
+        "advantage": sign * base,
+        "sign": sign,
+    }
+
+
+def _batch(
+    rng: np.random.Generator,
+    n: int,
+    max_base: int,
+    prior: str = "uniform",
+    ratio: float = 2 / 3,
+    moments: bool = False,
+    raw: bool = False,
+) -> dict[str, np.ndarray]:
     # The smaller amount X; the envelopes hold X and 2X.
-    base = rng.integers(1, max_base + 1, size=trials)
-    picked_smaller = rng.random(trials) < 0.5
+    base = _base(rng, n, prior, max_base, ratio)
+    picked_smaller = metrics.timed("rng", rng.random, n) < 0.5
+    outcomes = {
+        "stay": np.where(picked_smaller, base, 2 * base),
+        "switch": np.where(picked_smaller, 2 * base, base),
+    }
+    if moments:
+        # Switching gains or loses exactly X.
+        outcomes["advantage"] = engine.Moments.of(np.where(picked_smaller, base, -base))
+    if raw:
+        outcomes.update(base=base, picked_smaller=picked_smaller)
+    return outcomes
+
+
+def _error(totals: dict, trials: int) -> float:
+    return precision.mean_se(totals["advantage"])
+
+
+def _exact_totals(
+    trials: int, max_base: int, prior: str, ratio: float, seed: int | None
+) -> dict[str, int]:
+    # Only the amount totals matter, so draw their sufficient statistics: how
+    # many rounds picked the smaller envelope, then the sum of X over those
+    # rounds and over the rest.
+    rng = np.random.default_rng(seed)
+    smaller = int(rng.binomial(trials, 0.5))
+    if prior == "geometric":
+        # A sum of m Geometric(p) draws is m plus NegativeBinomial(m, p) failures.
+        sum_smaller = smaller + int(rng.negative_binomial(smaller, 1 - ratio)) if smaller else 0
+        larger = trials - smaller
+        sum_larger = larger + int(rng.negative_binomial(larger, 1 - ratio)) if larger else 0
+    else:
+        # Multinomial counts of each base value among the rounds.
+        values = np.arange(1, max_base + 1, dtype=np.int64)
+        uniform = np.full(max_base, 1 / max_base)
+        sum_smaller = int(rng.multinomial(smaller, uniform) @ values)
+        sum_larger = int(rng.multinomial(trials - smaller, uniform) @ values)
+    return {
+        "stay": sum_smaller + 2 * sum_larger,
+        "switch": 2 * sum_smaller + sum_larger,
+    }
+
+
+def expected_base(prior: str = "uniform", max_base: int = 100, ratio: float = 2 / 3) -> float:
+    """E[X] under ``prior``; ``math.inf`` when it diverges."""
+    if prior == "uniform":
+        return (max_base + 1) / 2
+    if prior == "geometric":
+        return 1 / (1 - ratio)
+    if prior == "doubling":
+        # sum (1 - r) (2r)^k converges only for r < 1/2.
+        return (1 - ratio) / (1 - 2 * ratio) if ratio < 0.5 else math.inf
+    return (max_base - 1) / math.log(max_base) if max_base > 1 else 1.0
+
+
+def finite_variance(prior: str = "uniform", ratio: float = 2 / 3) -> bool:
+    """Whether the per-round switch advantage (±X) has a finite variance."""
+    # E[X^2] for the doubling prior is sum (1 - r) (4r)^k.
+    return prior != "doubling" or ratio < 0.25
+
+
+def simulate(
+    trials: int,
+    max_base: int = 100,
+    seed: int | None = None,
+    method: str = "monte-carlo",
+    target_se: float | None = None,
+    confidence: float = 0.95,
+    trace_points: int | None = None,
+    trace_spacing: str = "log",
+    prior: str = "uniform",
+    ratio: float = 2 / 3,
+    sampling_mode: str = "iid",
+) -> dict:
+    """Compare always-stay vs always-switch over ``trials`` rounds.
+
+    ``method="exact"`` samples the amount totals from their exact distribution
+    instead of playing each round (uniform and geometric priors). With
+    ``target_se``, ``trials`` is a budget: play only until the standard error
+    of the switch advantage reaches it (priors with a finite variance only).
+    ``trace_points`` adds a ``"trace"`` of the running switch advantage (see
+    :mod:`traces`). ``prior`` and ``ratio`` choose the distribution of the
+    smaller amount (see the module docstring). ``sampling_mode`` picks a
+    variance-reduced design for the switch advantage (see :mod:`sampling`;
+    the control variate is the sign of the advantage), for priors with a
+    finite variance, and adds a ``"sampling"`` report.
+    """
+    if method == "exact" and prior not in ("uniform", "geometric"):
+        raise ValueError("method='exact' supports the uniform and geometric priors")
+    if (target_se is not None or sampling_mode != "iid") and not finite_variance(prior, ratio):
+        raise ValueError("precision targets and sampling need a prior with a finite variance")
+    rules = {"max_base": max_base, "prior": prior, "ratio": ratio}
+    if target_se is not None:
+        step = partial(_batch, **rules, moments=True)
+        trials, totals = engine.run_to_precision(step, trials, seed, error=_error, target=target_se)
+        result = _result(trials, totals, **rules)
+        result["precision"] = precision.report(
+            result["switch_advantage"], _error(totals, trials), trials, target_se, confidence
+        )
+        return result
+    if trace_points is not None:
+        at = traces.positions(trials, trace_points, trace_spacing)
+        totals, running = engine.run_traced(partial(_batch, **rules), trials, seed, at=at)
+        result = _result(trials, totals, **rules)
+        advantage = (running["switch"] - running["stay"]) / at
+        result["trace"] = traces.series(at, advantage, trace_points, trace_spacing)
+        return result
+    if sampling_mode != "iid":
+        totals, report = sampling.run(
+            partial(_from_uniforms, **rules), 2, trials, seed, sampling_mode,
+            estimand="advantage", control="sign", control_mean=0.0,
+        )
+        result = _result(trials, totals, **rules)
+        result["sampling"] = report
+        return result
+    if method == "exact":
+        totals = _exact_totals(trials, max_base, prior, ratio, seed)
+    else:
+        totals = engine.run(partial(_batch, **rules), trials, seed)
+    return _result(trials, totals, **rules)
+
+
+def stream(
+    trials: int,
+    max_base: int = 100,
+    seed: int | None = None,
+    prior: str = "uniform",
+    ratio: float = 2 / 3,
+) -> Iterator[dict]:
+    """Like :func:`simulate`, yielding the running result after every batch."""
+    rules = {"max_base": max_base, "prior": prior, "ratio": ratio}
+    for done, totals in engine.iterate(partial(_batch, **rules), trials, seed):
+        yield _result(done, totals, **rules)
+
+
+def export(
+    trials: int,
+    max_base: int = 100,
+    seed: int | None = None,
+    prior: str = "uniform",
+    ratio: float = 2 / 3,
+) -> Iterator[dict[str, np.ndarray]]:
+    """The per-round data behind :func:`simulate`, one batch of columns at a time.
+
+    Each round has the smaller amount ``base``, whether the player
+    ``picked_smaller``, and the amounts the ``stay`` and ``switch`` players
+    walk away with.
+    """
+    step = partial(_batch, max_base=max_base, prior=prior, ratio=ratio, raw=True)
+    yield from engine.outcomes(step, trials, seed)
 
-    stay_amount = np.where(picked_smaller, base, 2 * base)
-    switch_amount = np.where(picked_smaller, 2 * base, base)
 
-    avg_stay = float(np.mean(stay_amount))
-    avg_switch = float(np.mean(switch_amount))
+def _result(
+    trials: int,
+    totals: dict,
+    max_base: int = 100,
+    prior: str = "uniform",
+    ratio: float = 2 / 3,
+) -> dict:
+    avg_stay = totals["stay"] / trials
+    avg_switch = totals["switch"] / trials
+    # Either envelope holds X or 2X with equal odds: 1.5 E[X] on average.
+    expected = 1.5 * expected_base(prior, max_base, ratio)
 
     return {
         "trials": trials,
+        "prior": prior,
         "avg_stay": avg_stay,
         "avg_switch": avg_switch,
         # Positive means switching helped; it should hover around zero.
         "switch_advantage": avg_switch - avg_stay,
         "switch_advantage_pct": (avg_switch - avg_stay) / avg_stay * 100,
+        # None when the expectation is infinite (JSON has no infinity).
+        "theoretical_avg": expected if math.isfinite(expected) else None,
     }
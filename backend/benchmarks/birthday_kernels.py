@@ -0,0 +1,45 @@
+"""Throughput of the birthday collision kernels across group sizes.
+
+Run from ``backend/``::
+
+    python -m benchmarks.birthday_kernels [--trials 200000]
+
+Prints millions of groups checked per second for each kernel, which is what the
+thresholds in ``birthday.pick_kernel`` are tuned from.
+"""
+from __future__ import annotations
+
+import argparse
+import time
+
+from app.simulations import birthday
+
+GROUP_SIZES = [2, 5, 10, 23, 30, 50, 100, 150, 200, 250, 365]
+
+
+def measure(kernel: str, group_size: int, trials: int, repeat: int) -> float:
+    best = float("inf")
+    for seed in range(repeat):
+        start = time.perf_counter()
+        birthday.simulate(group_size, trials, seed, kernel=kernel)
+        best = min(best, time.perf_counter() - start)
+    return trials / best / 1e6
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--trials", type=int, default=200_000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    kernels = list(birthday.KERNELS)
+    print(f"{'group':>6} " + " ".join(f"{k:>10}" for k in kernels) + "   auto")
+    for group_size in GROUP_SIZES:
+        rates = [measure(k, group_size, args.trials, args.repeat) for k in kernels]
+        cells = " ".join(f"{r:10.2f}" for r in rates)
+        print(f"{group_size:>6} {cells}   {birthday.pick_kernel(group_size)}")
+    print("(millions of groups per second, best of", args.repeat, "runs)")
+
+
+if __name__ == "__main__":
+    main()
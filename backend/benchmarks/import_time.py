@@ -0,0 +1,91 @@
+"""Cold-start cost of the API: import time and the first requests.
+
+Run from ``backend/``::
+
+    python -m benchmarks.import_time [--runs 5] [--budget-ms 900]
+
+Each run is a fresh interpreter. Reports the median ``import app.main`` time
+from ``-X importtime`` (with the slowest modules), and the time to serve the
+first ``/health`` and ``/api/paradoxes`` requests. Exits non-zero if the import
+exceeds the budget or pulls in NumPy, which should only load with the first
+simulation.
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+
+FIRST_REQUESTS = """
+import json, sys, time
+start = time.perf_counter()
+from fastapi.testclient import TestClient
+from app.main import app
+client = TestClient(app)
+imported = time.perf_counter()
+client.get("/health").raise_for_status()
+health = time.perf_counter()
+client.get("/api/paradoxes").raise_for_status()
+paradoxes = time.perf_counter()
+print(json.dumps({
+    "health_ms": (health - start) * 1e3,
+    "paradoxes_ms": (paradoxes - health) * 1e3,
+    "numpy_loaded": "numpy" in sys.modules,
+}))
+"""
+
+
+def import_profile() -> dict[str, tuple[int, int]]:
+    """``module -> (self us, cumulative us)`` for one fresh ``import app.main``."""
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import app.main"],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    modules = {}
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative, name = line.removeprefix("import time:").split("|")
+        modules[name.strip()] = (int(self_us), int(cumulative))
+    return modules
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--budget-ms", type=float, default=900)
+    parser.add_argument("--top", type=int, default=10)
+    args = parser.parse_args()
+
+    profiles = [import_profile() for _ in range(args.runs)]
+    total = statistics.median(p["app.main"][1] for p in profiles) / 1e3
+    slowest = sorted(profiles[-1].items(), key=lambda item: item[1][0], reverse=True)
+    print(f"import app.main: {total:.1f} ms (median of {args.runs})")
+    for name, (self_us, cumulative) in slowest[: args.top]:
+        print(f"  {self_us / 1e3:8.1f} ms self {cumulative / 1e3:8.1f} ms cumulative  {name}")
+
+    runs = [
+        json.loads(subprocess.run(
+            [sys.executable, "-c", FIRST_REQUESTS], capture_output=True, text=True, check=True
+        ).stdout)
+        for _ in range(args.runs)
+    ]
+    for key in ("health_ms", "paradoxes_ms"):
+        print(f"{key.removesuffix('_ms')}: {statistics.median(r[key] for r in runs):.1f} ms")
+
+    failures = []
+    if total > args.budget_ms:
+        failures.append(f"import took {total:.1f} ms, budget {args.budget_ms:.0f} ms")
+    if "numpy" in profiles[-1] or any(r["numpy_loaded"] for r in runs):
+        failures.append("numpy was imported before any simulation ran")
+    for failure in failures:
+        print("FAIL:", failure)
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
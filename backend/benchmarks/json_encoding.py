@@ -0,0 +1,61 @@
+"""Per-request overhead of the default vs the ``FAST_JSON`` response path.
+
+Run from ``backend/``::
+
+    python -m benchmarks.json_encoding [--requests 200]
+
+Times every JSON endpoint through ``TestClient`` with response-model validation
+and the stock encoder, then with ``FAST_JSON`` on. Simulation bodies are seeded
+so both passes are served from the result cache and the difference is the
+serialization path alone.
+"""
+from __future__ import annotations
+
+import argparse
+
+from fastapi.testclient import TestClient
+
+from app import config, responses
+from app.main import app
+from benchmarks.suite import bench_endpoint
+
+ENDPOINTS = {
+    "paradoxes": ("GET", "/api/paradoxes", None),
+    "monty-hall": ("POST", "/api/monty-hall/simulate", {"games": 10_000, "seed": 1}),
+    "birthday": ("POST", "/api/birthday/simulate", {"trials": 10_000, "seed": 1}),
+    "two-envelopes": ("POST", "/api/two-envelopes/simulate", {"trials": 10_000, "seed": 1}),
+    "sleeping-beauty": ("POST", "/api/sleeping-beauty/simulate", {"trials": 10_000, "seed": 1}),
+    "curve-100": ("GET", "/api/birthday/curve", None),
+    "curve-2000": ("GET", "/api/birthday/curve?max_size=2000", None),
+    "simpsons": ("GET", "/api/simpsons/data", None),
+    "batch-100": (
+        "POST",
+        "/api/batch/simulate",
+        {"requests": [{"paradox": "monty-hall", "games": 100, "seed": s} for s in range(100)]},
+    ),
+}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=200)
+    args = parser.parse_args()
+
+    encoder = "orjson" if responses.orjson is not None else "stdlib json"
+    print(f"fast path encoder: {encoder}")
+    print(f"{'endpoint':<18} {'default ms':>11} {'fast ms':>9} {'saved':>7}")
+    with TestClient(app) as client:
+        for name, (method, path, body) in ENDPOINTS.items():
+            config.FAST_JSON = False
+            default = bench_endpoint(client, method, path, body, args.requests)["seconds"]
+            config.FAST_JSON = True
+            fast = bench_endpoint(client, method, path, body, args.requests)["seconds"]
+            print(
+                f"{name:<18} {default * 1e3:>11.3f} {fast * 1e3:>9.3f} "
+                f"{1 - fast / default:>7.1%}"
+            )
+    print("(median latency per request)")
+
+
+if __name__ == "__main__":
+    main()
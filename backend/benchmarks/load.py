@@ -0,0 +1,355 @@
+"""Load test the API with a realistic traffic mix, per uvicorn worker count.
+
+Run from ``backend/``::
+
+    python -m benchmarks.load [--workers 1,2,4] [--concurrency 16] [--duration 20]
+                              [--mix NAME=WEIGHT,...] [--env KEY=VALUE ...]
+                              [--in-process] [--by-endpoint] [--save NAME]
+
+For each worker count this starts ``uvicorn app.main:app --workers N`` on a free
+local port, keeps ``--concurrency`` requests in flight for ``--duration``
+seconds (after a short warm-up that isn't counted), and reports throughput,
+p50/p95/p99 latency, errors (503s from the executor's queue limits included),
+and the CPU and peak memory of the server's process tree — in total and per
+worker. ``--env`` passes settings such as ``SIMULATION_POOL_SIZE`` to the
+server, so pool sizes can be compared the same way.
+
+Traffic is drawn from :data:`MIX`: unseeded simulate calls (the full request
+path), seeded ones from a small pool of seeds (mostly cache hits), the birthday
+curve and the catalog (static, ETag-backed). ``--mix birthday=0,catalog=5``
+reweights entries. ``--in-process`` drives the app through
+``httpx.ASGITransport`` instead — no sockets or worker processes, handy for
+profiling the app alone; its CPU and memory include the load generator.
+
+CPU and memory come from ``/proc`` and are reported as ``n/a`` elsewhere.
+``--save`` writes the runs to ``benchmarks/baselines/load-NAME.json``.
+Numbers only transfer to a deployment with the same CPU allowance: on a
+shared or throttled instance, run this inside a container with the same
+limits (e.g. ``docker run --cpus``).
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import socket
+import subprocess
+import sys
+import time
+from collections.abc import Callable
+from pathlib import Path
+
+import httpx
+
+BASELINES = Path(__file__).parent / "baselines"
+
+# Seeded requests pick from this many seeds, so most of them hit the cache.
+SEEDS = 32
+
+# name: (weight, method, path, body for a random.Random).
+MIX: dict[str, tuple[float, str, str, Callable[[random.Random], dict | None]]] = {
+    "monty-hall": (3, "POST", "/api/monty-hall/simulate", lambda r: {"games": 100_000}),
+    "birthday": (
+        3, "POST", "/api/birthday/simulate", lambda r: {"group_size": 23, "trials": 100_000}
+    ),
+    "two-envelopes": (2, "POST", "/api/two-envelopes/simulate", lambda r: {"trials": 100_000}),
+    "sleeping-beauty": (
+        2, "POST", "/api/sleeping-beauty/simulate", lambda r: {"trials": 100_000}
+    ),
+    "seeded": (
+        2,
+        "POST",
+        "/api/monty-hall/simulate",
+        lambda r: {"games": 100_000, "seed": r.randrange(SEEDS)},
+    ),
+    "curve": (2, "GET", "/api/birthday/curve?max_size=365", lambda r: None),
+    "catalog": (2, "GET", "/api/paradoxes", lambda r: None),
+}
+
+
+# --- Server processes ----------------------------------------------------
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _start(workers: int, env: dict[str, str]) -> tuple[subprocess.Popen, str]:
+    port = _free_port()
+    command = [
+        sys.executable, "-m", "uvicorn", "app.main:app",
+        "--host", "127.0.0.1", "--port", str(port),
+        "--workers", str(workers), "--log-level", "warning",
+    ]
+    server = subprocess.Popen(
+        command, cwd=Path(__file__).parent.parent, env={**os.environ, **env}
+    )
+    url = f"http://127.0.0.1:{port}"
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        if server.poll() is not None:
+            raise RuntimeError(f"uvicorn exited with {server.returncode}")
+        try:
+            if httpx.get(f"{url}/health", timeout=1).status_code == 200:
+                return server, url
+        except httpx.TransportError:
+            pass
+        time.sleep(0.2)
+    server.terminate()
+    raise RuntimeError("uvicorn didn't become healthy within 60s")
+
+
+def _stop(server: subprocess.Popen) -> None:
+    server.terminate()
+    try:
+        server.wait(timeout=30)
+    except subprocess.TimeoutExpired:
+        server.kill()
+        server.wait()
+
+
+class Usage:
+    """CPU time and resident memory of a process and its descendants (``/proc``)."""
+
+    TICKS = os.sysconf("SC_CLK_TCK") if hasattr(os, "sysconf") else 100
+
+    def __init__(self, pid: int) -> None:
+        self.pid = pid
+        self.available = Path(f"/proc/{pid}/stat").exists()
+        self.peak_rss = 0
+
+    def pids(self) -> list[int]:
+        tree, todo = [], [self.pid]
+        while todo:
+            pid = todo.pop()
+            tree.append(pid)
+            for task in Path(f"/proc/{pid}/task").glob("*/children"):
+                try:
+                    todo.extend(int(child) for child in task.read_text().split())
+                except OSError:
+                    continue
+        return tree
+
+    def cpu_seconds(self) -> float:
+        total = 0
+        for pid in self.pids():
+            try:
+                # utime and stime; the command name may contain spaces, so
+                # count fields from its closing parenthesis.
+                fields = Path(f"/proc/{pid}/stat").read_text().rsplit(")", 1)[1].split()
+            except OSError:
+                continue
+            total += int(fields[11]) + int(fields[12])
+        return total / self.TICKS
+
+    def sample_rss(self) -> None:
+        rss = 0
+        for pid in self.pids():
+            try:
+                status = Path(f"/proc/{pid}/status").read_text()
+            except OSError:
+                continue
+            for line in status.splitlines():
+                if line.startswith("VmRSS:"):
+                    rss += int(line.split()[1]) * 1024
+        self.peak_rss = max(self.peak_rss, rss)
+
+
+# --- Load generation -----------------------------------------------------
+
+async def _drive(
+    client: httpx.AsyncClient,
+    mix: dict[str, tuple[float, str, str, Callable]],
+    concurrency: int,
+    duration: float,
+    warmup: float,
+    usage: Usage | None,
+) -> dict:
+    names = [name for name, entry in mix.items() if entry[0] > 0]
+    weights = [mix[name][0] for name in names]
+    samples: list[tuple[str, float, int]] = []
+    start = time.monotonic()
+    measure_from = start + warmup
+    stop = measure_from + duration
+    cpu = {}
+
+    async def user(seed: int) -> None:
+        rng = random.Random(seed)
+        while (now := time.monotonic()) < stop:
+            name = rng.choices(names, weights)[0]
+            _, method, path, body = mix[name]
+            try:
+                res = await client.request(method, path, json=body(rng))
+                status = res.status_code
+            except httpx.TransportError:
+                status = 0
+            if now >= measure_from:
+                samples.append((name, time.monotonic() - now, status))
+
+    async def monitor() -> None:
+        await asyncio.sleep(warmup)
+        cpu["start"] = usage.cpu_seconds()
+        while time.monotonic() < stop:
+            usage.sample_rss()
+            await asyncio.sleep(0.5)
+        cpu["end"] = usage.cpu_seconds()
+
+    tasks = [user(i) for i in range(concurrency)]
+    if usage is not None and usage.available:
+        tasks.append(monitor())
+    await asyncio.gather(*tasks)
+
+    report = _summarize(samples, duration)
+    report["by_endpoint"] = {
+        name: _summarize([s for s in samples if s[0] == name], duration) for name in names
+    }
+    if cpu:
+        report["cpu_cores"] = (cpu["end"] - cpu["start"]) / duration
+        report["peak_rss_bytes"] = usage.peak_rss
+    return report
+
+
+def _summarize(samples: list[tuple[str, float, int]], duration: float) -> dict:
+    latencies = sorted(latency for _, latency, _ in samples)
+    errors = sum(1 for *_, status in samples if not 200 <= status < 400)
+    if not latencies:
+        return {"requests": 0, "errors": 0, "requests_per_second": 0.0}
+
+    def pct(q: float) -> float:
+        return latencies[int(q * (len(latencies) - 1))]
+
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "requests_per_second": len(latencies) / duration,
+        "p50_seconds": pct(0.50),
+        "p95_seconds": pct(0.95),
+        "p99_seconds": pct(0.99),
+    }
+
+
+def run_server(workers: int, env: dict[str, str], **load) -> dict:
+    server, url = _start(workers, env)
+    try:
+        limits = httpx.Limits(max_connections=load["concurrency"])
+        client = httpx.AsyncClient(base_url=url, timeout=60, limits=limits)
+
+        async def go() -> dict:
+            async with client:
+                return await _drive(client, usage=Usage(server.pid), **load)
+
+        return asyncio.run(go())
+    finally:
+        _stop(server)
+
+
+def run_in_process(env: dict[str, str], **load) -> dict:
+    os.environ.update(env)
+    from app.main import app
+
+    async def go() -> dict:
+        transport = httpx.ASGITransport(app=app)
+        async with app.router.lifespan_context(app), httpx.AsyncClient(
+            transport=transport, base_url="http://load", timeout=60
+        ) as client:
+            return await _drive(client, usage=Usage(os.getpid()), **load)
+
+    return asyncio.run(go())
+
+
+# --- CLI -----------------------------------------------------------------
+
+def _format(label: str, result: dict, workers: int) -> str:
+    parts = [
+        f"{result['requests_per_second']:8.1f} req/s",
+        f"{result['errors']:5d} err",
+    ]
+    if result["requests"]:
+        parts += [
+            f"p50 {result['p50_seconds'] * 1e3:7.1f} ms",
+            f"p95 {result['p95_seconds'] * 1e3:7.1f} ms",
+            f"p99 {result['p99_seconds'] * 1e3:7.1f} ms",
+        ]
+    if "cpu_cores" in result:
+        rss = result["peak_rss_bytes"] / 2**20
+        parts += [
+            f"cpu {result['cpu_cores']:5.2f} ({result['cpu_cores'] / workers:4.2f}/worker)",
+            f"rss {rss:7.1f} MiB ({rss / workers:6.1f}/worker)",
+        ]
+    elif workers:
+        parts.append("cpu n/a  rss n/a")
+    return f"{label:<22} " + "  ".join(parts)
+
+
+def _mix(spec: str) -> dict:
+    mix = dict(MIX)
+    for item in filter(None, spec.split(",")):
+        name, _, weight = item.partition("=")
+        if name not in mix:
+            raise SystemExit(f"unknown mix entry {name!r}; choose from {', '.join(MIX)}")
+        mix[name] = (float(weight), *mix[name][1:])
+    return mix
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--workers", default="1,2,4", help="Comma-separated worker counts.")
+    parser.add_argument("--concurrency", type=int, default=16, help="Requests in flight.")
+    parser.add_argument("--duration", type=float, default=20, help="Measured seconds per run.")
+    parser.add_argument("--warmup", type=float, default=3, help="Unmeasured seconds first.")
+    parser.add_argument("--mix", default="", help="Reweight entries: NAME=WEIGHT,...")
+    parser.add_argument(
+        "--env", action="append", default=[], metavar="KEY=VALUE", help="Server setting."
+    )
+    parser.add_argument("--in-process", action="store_true", help="Use ASGITransport.")
+    parser.add_argument("--by-endpoint", action="store_true", help="Per-endpoint rows too.")
+    parser.add_argument("--save", metavar="NAME", help="Store as baselines/load-NAME.json.")
+    args = parser.parse_args()
+
+    env = dict(item.split("=", 1) for item in args.env)
+    load = {
+        "mix": _mix(args.mix),
+        "concurrency": args.concurrency,
+        "duration": args.duration,
+        "warmup": args.warmup,
+    }
+    runs = {}
+    counts = [1] if args.in_process else [int(w) for w in args.workers.split(",")]
+    for workers in counts:
+        if args.in_process:
+            label, result = "in-process", run_in_process(env, **load)
+        else:
+            label, result = f"workers={workers}", run_server(workers, env, **load)
+        runs[label] = result
+        print(_format(label, result, workers), flush=True)
+        if args.by_endpoint:
+            for name, part in result["by_endpoint"].items():
+                print(_format(f"  {name}", part, 0), flush=True)
+
+    if args.save:
+        BASELINES.mkdir(exist_ok=True)
+        path = BASELINES / f"load-{args.save}.json"
+        results = {
+            "machine": {
+                "python": platform.python_version(),
+                "platform": platform.platform(),
+                "cpus": os.cpu_count(),
+            },
+            "settings": {
+                "concurrency": args.concurrency,
+                "duration": args.duration,
+                "mix": {name: entry[0] for name, entry in load["mix"].items()},
+                "env": env,
+            },
+            "runs": runs,
+        }
+        path.write_text(json.dumps(results, indent=2, sort_keys=True) + "\n")
+        print(f"saved {path}")
+
+
+if __name__ == "__main__":
+    main()
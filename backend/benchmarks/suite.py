@@ -0,0 +1,210 @@
+"""Throughput, peak-memory and HTTP-latency benchmarks with stored baselines.
+
+Run from ``backend/``::
+
+    python -m benchmarks.suite run [--save NAME] [--max-trials N] [-k FILTER]
+    python -m benchmarks.suite compare BASELINE [CANDIDATE] [--threshold 0.1]
+
+``run`` times every simulator at 1e3..1e7 trials, records the peak memory the
+run allocated (via :mod:`tracemalloc`, which sees NumPy buffers too), and
+measures end-to-end request latency through ``TestClient``. ``--save`` writes
+the results to ``benchmarks/baselines/NAME.json``.
+
+``compare`` diffs two saved runs, or a saved run against a fresh one, and exits
+non-zero if any case got slower or hungrier than ``--threshold``. Timings only
+compare meaningfully on the same machine, so record a baseline before a change
+and compare after it.
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+import tracemalloc
+from collections.abc import Callable
+from functools import partial
+from pathlib import Path
+
+import numpy as np
+
+from app.simulations import birthday, monty_hall, sleeping_beauty, two_envelopes
+
+BASELINES = Path(__file__).parent / "baselines"
+
+TRIAL_SIZES = [10**3, 10**4, 10**5, 10**6, 10**7]
+
+SIMULATORS: dict[str, Callable[[int, int], dict]] = {
+    "monty-hall": lambda n, seed: monty_hall.simulate(n, seed),
+    "birthday": lambda n, seed: birthday.simulate(23, n, seed),
+    "two-envelopes": lambda n, seed: two_envelopes.simulate(n, 100, seed),
+    "sleeping-beauty": lambda n, seed: sleeping_beauty.simulate(n, seed),
+}
+
+# Unseeded bodies skip the result cache, so these time the full request path;
+# the "cached" case times a cache hit.
+ENDPOINTS: dict[str, tuple[str, str, dict | None]] = {
+    "health": ("GET", "/health", None),
+    "monty-hall": ("POST", "/api/monty-hall/simulate", {"games": 10_000}),
+    "birthday": ("POST", "/api/birthday/simulate", {"group_size": 23, "trials": 10_000}),
+    "two-envelopes": ("POST", "/api/two-envelopes/simulate", {"trials": 10_000}),
+    "sleeping-beauty": ("POST", "/api/sleeping-beauty/simulate", {"trials": 10_000}),
+    "birthday-curve": ("GET", "/api/birthday/curve?max_size=365", None),
+    "cached": ("POST", "/api/monty-hall/simulate", {"games": 10_000, "seed": 1}),
+}
+
+
+def bench_simulator(fn: Callable[[int, int], dict], trials: int, repeat: int) -> dict:
+    """Best wall time over ``repeat`` runs, plus the peak memory of one run."""
+    times = []
+    for seed in range(repeat):
+        start = time.perf_counter()
+        fn(trials, seed)
+        times.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    fn(trials, repeat)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    best = min(times)
+    return {
+        "seconds": best,
+        "trials_per_second": trials / best,
+        "peak_bytes": peak,
+    }
+
+
+def bench_endpoint(client, method: str, path: str, body: dict | None, requests: int) -> dict:
+    """Latency percentiles for ``requests`` sequential calls after one warm-up."""
+    call = partial(client.request, method, path, json=body)
+    call().raise_for_status()
+    latencies = []
+    for _ in range(requests):
+        start = time.perf_counter()
+        call()
+        latencies.append(time.perf_counter() - start)
+    latencies.sort()
+    return {
+        "seconds": statistics.median(latencies),
+        "p95_seconds": latencies[int(0.95 * (len(latencies) - 1))],
+    }
+
+
+def run(max_trials: int, repeat: int, requests: int, pattern: str) -> dict:
+    from fastapi.testclient import TestClient
+
+    from app.main import app
+
+    cases: dict[str, dict] = {}
+    for name, fn in SIMULATORS.items():
+        for trials in TRIAL_SIZES:
+            case = f"simulate/{name}/1e{len(str(trials)) - 1}"
+            if trials > max_trials or pattern not in case:
+                continue
+            cases[case] = bench_simulator(fn, trials, repeat)
+            print(_format(case, cases[case]), flush=True)
+
+    with TestClient(app) as client:
+        for name, (method, path, body) in ENDPOINTS.items():
+            case = f"http/{name}"
+            if pattern not in case:
+                continue
+            cases[case] = bench_endpoint(client, method, path, body, requests)
+            print(_format(case, cases[case]), flush=True)
+
+    return {
+        "machine": {
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+        },
+        "cases": cases,
+    }
+
+
+def compare(baseline: dict, candidate: dict, threshold: float) -> list[str]:
+    """Print a side-by-side table and return the cases that regressed."""
+    regressions = []
+    print(f"{'case':<32} {'metric':<12} {'baseline':>12} {'candidate':>12} {'change':>8}")
+    for case, new in candidate["cases"].items():
+        old = baseline["cases"].get(case)
+        if old is None:
+            continue
+        for metric in ("seconds", "peak_bytes"):
+            if metric not in new or metric not in old or not old[metric]:
+                continue
+            change = new[metric] / old[metric] - 1
+            flag = ""
+            if change > threshold:
+                flag = "  REGRESSED"
+                regressions.append(f"{case} {metric}")
+            print(
+                f"{case:<32} {metric:<12} {old[metric]:>12.4g} {new[metric]:>12.4g} "
+                f"{change:>+8.1%}{flag}"
+            )
+    return regressions
+
+
+def _format(case: str, result: dict) -> str:
+    parts = [f"{result['seconds'] * 1e3:9.2f} ms"]
+    if "trials_per_second" in result:
+        parts.append(f"{result['trials_per_second'] / 1e6:8.2f} M trials/s")
+        parts.append(f"{result['peak_bytes'] / 2**20:8.2f} MiB peak")
+    else:
+        parts.append(f"p95 {result['p95_seconds'] * 1e3:7.2f} ms")
+    return f"{case:<32} " + "  ".join(parts)
+
+
+def _load(name: str) -> dict:
+    path = Path(name)
+    if not path.exists():
+        path = BASELINES / f"{name}.json"
+    return json.loads(path.read_text())
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    options = argparse.ArgumentParser(add_help=False)
+    options.add_argument("--max-trials", type=int, default=TRIAL_SIZES[-1])
+    options.add_argument("--repeat", type=int, default=3)
+    options.add_argument("--requests", type=int, default=50)
+    options.add_argument("-k", dest="pattern", default="", help="Only cases containing this.")
+
+    run_cmd = commands.add_parser("run", parents=[options], help="Run the suite.")
+    run_cmd.add_argument("--save", metavar="NAME", help="Store as baselines/NAME.json.")
+
+    compare_cmd = commands.add_parser("compare", parents=[options], help="Diff two runs.")
+    compare_cmd.add_argument("baseline", help="Baseline name or JSON path.")
+    compare_cmd.add_argument("candidate", nargs="?", help="Defaults to a fresh run.")
+    compare_cmd.add_argument("--threshold", type=float, default=0.1)
+
+    args = parser.parse_args()
+    if args.command == "run":
+        results = run(args.max_trials, args.repeat, args.requests, args.pattern)
+        if args.save:
+            BASELINES.mkdir(exist_ok=True)
+            path = BASELINES / f"{args.save}.json"
+            path.write_text(json.dumps(results, indent=2, sort_keys=True) + "\n")
+            print(f"saved {path}")
+        return
+
+    baseline = _load(args.baseline)
+    if args.candidate:
+        candidate = _load(args.candidate)
+    else:
+        candidate = run(args.max_trials, args.repeat, args.requests, args.pattern)
+    regressions = compare(baseline, candidate, args.threshold)
+    if regressions:
+        print(f"{len(regressions)} regression(s) beyond {args.threshold:.0%}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
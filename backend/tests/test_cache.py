@@ -0,0 +1,137 @@
+"""Tests for the seeded-result cache and its wiring into the API."""
+from __future__ import annotations
+
+import asyncio
+import time
+
+from fastapi.testclient import TestClient
+
+from app import cache, schemas
+from app.main import app
+
+client = TestClient(app)
+
+
+class FakeClock:
+    def __init__(self) -> None:
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def test_key_is_canonical():
+    a = schemas.MontyHallRequest(games=10, seed=1)
+    b = schemas.MontyHallRequest.model_validate({"seed": 1, "games": 10})
+    assert cache.cache_key("monty-hall", a) == cache.cache_key("monty-hall", b)
+    assert cache.cache_key("monty-hall", a) != cache.cache_key("birthday", a)
+
+
+def test_memory_backend_evicts_lru_and_expired():
+    clock = FakeClock()
+    store = cache.MemoryBackend(max_size=2, ttl=10, clock=clock)
+    store.set("a", {"v": 1})
+    store.set("b", {"v": 2})
+    assert store.get("a") == {"v": 1}  # "a" is now most recent
+    store.set("c", {"v": 3})
+    assert store.get("b") is None
+    clock.now = 11
+    assert store.get("a") is None and store.get("c") is None
+
+
+def test_sqlite_backend_evicts_least_recently_used(tmp_path):
+    clock = FakeClock()
+    store = cache.SQLiteBackend(str(tmp_path / "lru.sqlite"), max_size=2, ttl=10, clock=clock)
+    store.set("a", {"v": 1})
+    clock.now = 1
+    store.set("b", {"v": 2})
+    clock.now = 2
+    assert store.get("a") == {"v": 1}  # "a" is now most recent
+    clock.now = 3
+    store.set("c", {"v": 3})
+    assert store.get("b") is None and store.get("a") == {"v": 1}
+    clock.now = 20
+    assert store.get("a") is None and store.get("c") is None
+
+
+def test_unseeded_requests_bypass_cache():
+    results = cache.ResultCache(cache.MemoryBackend(8, 60))
+    req = schemas.SleepingBeautyRequest(trials=10)
+    for _ in range(2):
+        results.put("sleeping-beauty", req, {"trials": 10})
+        assert results.get("sleeping-beauty", req) is None
+    assert results.bypassed == 2 and len(results.local) == 0
+
+
+def test_shared_sqlite_backend_is_reused(tmp_path):
+    path = str(tmp_path / "cache.sqlite")
+    req = schemas.MontyHallRequest(games=10, seed=3)
+    first = cache.ResultCache(cache.MemoryBackend(8, 60), cache.SQLiteBackend(path, 8, 60))
+    assert first.get("monty-hall", req) is None
+    first.put("monty-hall", req, {"games": 10})
+
+    # A second worker with a cold local cache finds it in the shared store.
+    second = cache.ResultCache(cache.MemoryBackend(8, 60), cache.SQLiteBackend(path, 8, 60))
+    assert second.get("monty-hall", req) == {"games": 10}
+    assert second.shared_hits == 1 and second.misses == 0
+
+
+def test_seeded_endpoint_hits_cache():
+    before = client.get("/api/cache/stats").json()
+    body = {"trials": 1234, "seed": 99}
+    first = client.post("/api/sleeping-beauty/simulate", json=body).json()
+    second = client.post("/api/sleeping-beauty/simulate", json=body).json()
+    after = client.get("/api/cache/stats").json()
+    assert first == second
+    assert after["misses"] == before["misses"] + 1
+    assert after["hits"] == before["hits"] + 1
+
+
+def test_single_flight_shares_one_computation():
+    flights = cache.SingleFlight()
+    calls = []
+
+    async def compute():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return {"value": len(calls)}
+
+    async def main():
+        same = [flights.run("a", compute) for _ in range(5)]
+        return await asyncio.gather(*same, flights.run("b", compute))
+
+    results = asyncio.run(main())
+    assert results[:5] == [results[0]] * 5 and len(calls) == 2
+    assert flights.stats() == {
+        "leaders": 2, "coalesced": 4, "in_flight": 0, "coalesced_rate": 4 / 6,
+    }
+
+
+def test_concurrent_seeded_requests_are_coalesced(monkeypatch):
+    from app.routers import paradoxes
+    from app.simulations import sleeping_beauty
+
+    calls = []
+    simulate = sleeping_beauty.simulate
+
+    def slow(*args, **kwargs):
+        calls.append(1)
+        time.sleep(0.1)
+        return simulate(*args, **kwargs)
+
+    monkeypatch.setattr(sleeping_beauty, "simulate", slow)
+    seeded = schemas.SleepingBeautyRequest(trials=1000, seed=4321)
+    unseeded = schemas.SleepingBeautyRequest(trials=1000)
+
+    async def main():
+        return await asyncio.gather(
+            *[paradoxes._simulate("sleeping-beauty", seeded) for _ in range(8)],
+            *[paradoxes._simulate("sleeping-beauty", unseeded) for _ in range(2)],
+        )
+
+    results = asyncio.run(main())
+    assert results[:8] == [results[0]] * 8
+    # One run for the eight seeded requests, one per unseeded request.
+    assert len(calls) == 3
+    stats = client.get("/api/cache/stats").json()["single_flight"]
+    assert stats["coalesced"] >= 7
@@ -0,0 +1,69 @@
+"""Tests for the simulation executor's pool offloading and backpressure."""
+from __future__ import annotations
+
+import asyncio
+import threading
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app import executor
+from app.main import app
+
+client = TestClient(app)
+
+
+def test_runs_off_the_event_loop():
+    pool = executor.SimulationExecutor(workers=1)
+
+    async def main():
+        return await pool.run("x", threading.current_thread)
+
+    try:
+        assert asyncio.run(main()) is not threading.main_thread()
+    finally:
+        pool.shutdown()
+
+
+def test_rejects_when_limit_and_queue_are_full():
+    pool = executor.SimulationExecutor(workers=2, concurrency=1, queue_depth=1)
+    release = threading.Event()
+
+    async def main():
+        first = asyncio.create_task(pool.run("x", release.wait))
+        second = asyncio.create_task(pool.run("x", lambda: "queued"))
+        await asyncio.sleep(0.05)
+        with pytest.raises(executor.Busy):
+            await pool.run("x", lambda: "rejected")
+        # Other endpoints have their own limit.
+        assert await pool.run("y", lambda: "ok") == "ok"
+        release.set()
+        return await first, await second
+
+    try:
+        assert asyncio.run(main()) == (True, "queued")
+        assert pool.stats()["endpoints"]["x"]["rejected"] == 1
+    finally:
+        release.set()
+        pool.shutdown()
+
+
+def test_busy_endpoint_returns_503(monkeypatch):
+    saturated = executor.SimulationExecutor(workers=1, concurrency=0, queue_depth=0)
+    monkeypatch.setattr(executor, "simulations", saturated)
+    saturated._limits["monty-hall"] = executor._Limit(0)
+    try:
+        res = client.post("/api/monty-hall/simulate", json={"games": 10})
+        assert res.status_code == 503
+        assert res.headers["retry-after"] == "1"
+        assert client.get("/health").status_code == 200
+    finally:
+        saturated.shutdown()
+
+
+def test_lifespan_shuts_down_and_restarts_pools():
+    for _ in range(2):
+        with TestClient(app) as started:
+            res = started.post("/api/monty-hall/simulate", json={"games": 10, "seed": 1})
+            assert res.status_code == 200
+    assert not executor.simulations.threads._shutdown
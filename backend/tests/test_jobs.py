@@ -0,0 +1,225 @@
+"""Tests for background jobs: checkpointed resume, reruns and the HTTP API."""
+from __future__ import annotations
+
+import threading
+import time
+from functools import partial
+
+import pytest
+from fastapi.testclient import TestClient
+from pydantic import ValidationError
+
+from app import config, jobs, schemas
+from app.main import app
+from app.routers import paradoxes
+from app.simulations import engine, monty_hall, sleeping_beauty
+
+client = TestClient(app)
+
+
+class _Interrupt(Exception):
+    pass
+
+
+class _Memory:
+    """An in-memory checkpoint that can fail after a number of saves."""
+
+    def __init__(self, fail_after: int | None = None) -> None:
+        self.saved: dict[int, dict] = {}
+        self.fail_after = fail_after
+
+    def restore(self, shards):
+        return dict(self.saved)
+
+    def save(self, shard, totals, done, trials):
+        if self.fail_after is not None and len(self.saved) >= self.fail_after:
+            raise _Interrupt
+        self.saved[shard] = totals
+
+
+def test_checkpointed_run_resumes_with_identical_totals(monkeypatch):
+    monkeypatch.setattr(config, "SIMULATION_SHARD_ELEMENTS", 10_000)
+    calls = []
+
+    def step(rng, n):
+        calls.append(n)
+        return monty_hall._batch(rng, n)
+
+    expected = engine.run(monty_hall._batch, 100_000, seed=7)
+    checkpoint = _Memory(fail_after=4)
+    with pytest.raises(_Interrupt), engine.checkpointing(checkpoint):
+        engine.run(step, 100_000, seed=7)
+    assert len(checkpoint.saved) == 4
+
+    calls.clear()
+    checkpoint.fail_after = None
+    with engine.checkpointing(checkpoint):
+        assert engine.run(step, 100_000, seed=7) == expected
+    # Only the six missing shards ran again.
+    assert sum(calls) == 60_000 and len(checkpoint.saved) == 10
+
+
+def test_store_claims_once_and_reclaims_stale_jobs(tmp_path):
+    now = [1000.0]
+    store = jobs.JobStore(str(tmp_path / "jobs.sqlite3"), clock=lambda: now[0])
+    job, _ = store.create("sleeping-beauty", {"trials": 10, "seed": 1}, key="k")
+    stale = store.claim(lease=30)
+    assert stale["id"] == job["id"]
+    assert store.claim(lease=30) is None
+    now[0] += 31
+    fresh = store.claim(lease=30)
+    assert fresh["id"] == job["id"] and fresh["token"] != stale["token"]
+    assert store.find("k")["status"] == "running"
+
+    # The worker that lost its claim can't save, finish or clean up any more.
+    assert store.checkpoint(job["id"], fresh["token"], 0, 0, 2, {"n": 1})
+    assert not store.checkpoint(job["id"], stale["token"], 0, 1, 2, {"n": 1})
+    assert not store.update(job["id"], stale["token"], status="done", result={})
+    store.drop_checkpoints(job["id"], stale["token"])
+    assert store.checkpoints(job["id"], 0) == [(0, 2, {"n": 1})]
+    assert store.get(job["id"])["status"] == "running"
+
+
+def test_store_keeps_one_live_job_per_key(tmp_path):
+    path = str(tmp_path / "jobs.sqlite3")
+    # Two workers' stores racing past find(): the insert itself deduplicates.
+    first, created = jobs.JobStore(path).create("sleeping-beauty", {"trials": 10}, key="k")
+    again, created_again = jobs.JobStore(path).create("sleeping-beauty", {"trials": 10}, key="k")
+    assert created and not created_again and again["id"] == first["id"]
+
+    # A cancelled job no longer holds its key.
+    store = jobs.JobStore(path)
+    store.cancel(first["id"])
+    retry, created = store.create("sleeping-beauty", {"trials": 10}, key="k")
+    assert created and retry["id"] != first["id"]
+
+
+@pytest.fixture
+def runner(tmp_path, monkeypatch):
+    runner = jobs.JobRunner(str(tmp_path / "jobs.sqlite3"), poll=0.01)
+    monkeypatch.setattr(jobs, "runner", runner)
+    yield runner
+    runner.shutdown()
+
+
+def _wait(job_id: str, timeout: float = 10) -> dict:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        job = client.get(f"/api/jobs/{job_id}").json()
+        if job["status"] not in ("queued", "running"):
+            return job
+        time.sleep(0.01)
+    raise AssertionError(f"job {job_id} didn't finish")
+
+
+def test_job_endpoints_run_and_deduplicate(runner, monkeypatch):
+    monkeypatch.setattr(config, "SIMULATION_SHARD_ELEMENTS", 50_000)
+    body = {"paradox": "sleeping-beauty", "trials": 200_000, "seed": 3}
+    res = client.post("/api/jobs", json=body)
+    assert res.status_code == 202
+    job = _wait(res.json()["id"])
+    assert job["status"] == "done" and job["progress"] == 1.0
+    assert job["result"] == sleeping_beauty.simulate(200_000, 3)
+
+    again = client.post("/api/jobs", json=body)
+    assert again.status_code == 200 and again.json()["id"] == job["id"]
+    assert again.json()["result"] == job["result"]
+
+    unseeded = client.post("/api/jobs", json={"paradox": "monty-hall", "games": 1000}).json()
+    assert unseeded["request"]["seed"] is not None
+    assert _wait(unseeded["id"])["status"] == "done"
+    assert client.get("/api/jobs/missing").status_code == 404
+
+
+def test_job_resumes_from_checkpoints_after_a_restart(runner, monkeypatch):
+    monkeypatch.setattr(config, "SIMULATION_SHARD_ELEMENTS", 20_000)
+    params = {"paradox": "monty-hall", "games": 100_000, "seed": 5}
+    job, _ = runner.store.create("monty-hall", params)
+    # A worker that died after four shards.
+    claim = runner.store.claim(lease=0)
+    with pytest.raises(_Interrupt):
+        call = paradoxes.run_job("monty-hall", params)
+        checkpoint = jobs._Checkpoint(runner.store, job["id"], claim["token"])
+        checkpoint.save = partial(_fail_after, checkpoint, checkpoint.save, 4)
+        with engine.checkpointing(checkpoint):
+            call()
+    assert 0 < runner.store.get(job["id"])["progress"] < 1
+
+    runner.lease = 0
+    runner.start(paradoxes.run_job)
+    done = _wait(job["id"])
+    assert done["result"] == monty_hall.simulate(100_000, 5)
+
+
+def _fail_after(checkpoint, save, limit, shard, *args):
+    if shard >= limit:
+        raise _Interrupt
+    save(shard, *args)
+
+
+def test_cancelled_and_failed_jobs_drop_their_checkpoints(tmp_path):
+    store = jobs.JobStore(str(tmp_path / "jobs.sqlite3"))
+    cancelled, _ = store.create("monty-hall", {"games": 10})
+    token = store.claim(lease=30)["token"]
+    store.checkpoint(cancelled["id"], token, 0, 0, 2, {"stay_wins": 1})
+    store.cancel(cancelled["id"])
+    assert store.checkpoints(cancelled["id"], 0) == []
+
+    runner = jobs.JobRunner(str(tmp_path / "jobs.sqlite3"))
+    failed, _ = runner.store.create("monty-hall", {"games": 10})
+    claim = runner.store.claim(lease=30)
+
+    def broken():
+        runner.store.checkpoint(failed["id"], claim["token"], 0, 0, 2, {"stay_wins": 1})
+        raise RuntimeError("out of memory")
+
+    runner._resolve = lambda paradox, params: broken
+    runner._run(claim)
+    assert runner.store.get(failed["id"])["status"] == "failed"
+    assert runner.store.checkpoints(failed["id"], 0) == []
+
+
+def test_job_cancelled_after_its_last_shard_stays_cancelled(tmp_path):
+    runner = jobs.JobRunner(str(tmp_path / "jobs.sqlite3"))
+    job, _ = runner.store.create("monty-hall", {"games": 10})
+
+    def cancelled_at_the_end():
+        runner.store.cancel(job["id"])
+        return {"games": 10}
+
+    runner._resolve = lambda paradox, params: cancelled_at_the_end
+    runner._run(runner.store.claim(lease=30))
+    assert runner.store.get(job["id"])["status"] == "cancelled"
+
+
+def test_heartbeat_keeps_a_slow_job_claimed(tmp_path):
+    path = str(tmp_path / "jobs.sqlite3")
+    runner = jobs.JobRunner(path, lease=0.3)
+    job, _ = runner.store.create("monty-hall", {"games": 10})
+    def slow_shard():
+        # Outlasts the lease several times over without a checkpoint.
+        time.sleep(1.2)
+        return {"games": 10}
+
+    runner._resolve = lambda paradox, params: slow_shard
+    slow = threading.Thread(target=runner._run, args=(runner.store.claim(runner.lease),))
+    slow.start()
+    other = jobs.JobStore(path)
+    try:
+        for _ in range(4):
+            time.sleep(0.25)
+            assert other.claim(runner.lease) is None
+    finally:
+        slow.join()
+    assert runner.store.get(job["id"])["result"] == {"games": 10}
+
+
+def test_job_caps_and_validation():
+    with pytest.raises(ValidationError):
+        schemas.MontyHallRequest(games=2 * 10**8)
+    schemas.MontyHallJobItem(paradox="monty-hall", games=2 * 10**8)
+    with pytest.raises(ValidationError):
+        schemas.MontyHallJobItem(paradox="monty-hall", games=10**12)
+
+    bad = {"paradox": "birthday", "trials": 1000, "trace_points": 10}
+    assert client.post("/api/jobs", json=bad).status_code == 422
@@ -0,0 +1,56 @@
+"""Tests for per-request stage timings, /metrics and debug profiles."""
+from __future__ import annotations
+
+import time
+
+from fastapi.testclient import TestClient
+
+from app import config, metrics
+from app.main import app
+
+client = TestClient(app)
+
+
+def test_nested_stages_record_self_time():
+    trace = metrics.Trace()
+    token = metrics._trace.set(trace)
+    try:
+        with metrics.stage("outer"):
+            time.sleep(0.02)
+            with metrics.stage("inner"):
+                time.sleep(0.02)
+        metrics.timed("inner", bytearray, 64)
+    finally:
+        metrics._trace.reset(token)
+
+    outer, inner = trace.stages["outer"], trace.stages["inner"]
+    assert 0.015 < outer[0] < 0.035 and inner[0] > 0.015
+    assert inner[2] == 2 and outer[2] == 1
+    # Untraced stages are no-ops.
+    with metrics.stage("ignored"):
+        pass
+    assert metrics.timed("ignored", sum, [1, 2]) == 3
+
+
+def test_server_timing_and_prometheus_metrics():
+    res = client.post("/api/birthday/simulate", json={"group_size": 40, "trials": 5000})
+    timing = res.headers["server-timing"]
+    for name in ("rng", "sort", "kernel", "reduce", "encode", "total"):
+        assert f"{name};dur=" in timing
+
+    text = client.get("/metrics").text
+    assert (
+        'paradoxes_requests_total{route="/api/birthday/simulate",method="POST",status="200"}'
+        in text
+    )
+    assert 'paradoxes_stage_bytes_total{route="/api/birthday/simulate",stage="rng"}' in text
+    assert "# TYPE paradoxes_request_duration_seconds histogram" in text
+
+
+def test_debug_header_writes_a_profile(tmp_path, monkeypatch):
+    monkeypatch.setattr(config, "PROFILE_DIR", str(tmp_path))
+    body = {"games": 1000}
+    assert "x-profile-file" not in client.post("/api/monty-hall/simulate", json=body).headers
+
+    res = client.post("/api/monty-hall/simulate", json=body, headers={"X-Debug-Profile": "1"})
+    assert (tmp_path / res.headers["x-profile-file"]).stat().st_size > 0
@@ -6,14 +6,29 @@ phenomenon (e.g. "switching wins ~2/3") rather than a brittle exact value.
 """
 from __future__ import annotations
 
+import io
+import json
+import math
+import subprocess
+import sys
+from functools import partial
+from pathlib import Path
+
+import numpy as np
+import pytest
 from fastapi.testclient import TestClient
 
+from app import config, schemas
 from app.main import app
 from app.simulations import (
     birthday,
+    columnar,
+    engine,
     monty_hall,
+    sampling,
     simpsons,
     sleeping_beauty,
+    traces,
     two_envelopes,
 )
 
@@ -33,6 +48,29 @@ def test_monty_hall_is_seed_reproducible():
     assert monty_hall.simulate(1000, seed=7) == monty_hall.simulate(1000, seed=7)
 
 
+def test_monty_hall_variants_track_theory():
+    for rules in (
+        {"doors": 10},
+        {"doors": 10, "opened": 3},
+        {"doors": 5, "opened": 2, "host": "ignorant"},
+        {"host": "biased", "host_bias": 0.5},
+    ):
+        res = monty_hall.simulate(200_000, seed=3, **rules)
+        assert abs(res["stay_rate"] - res["theoretical_stay_rate"]) < 0.01, rules
+        assert abs(res["switch_rate"] - res["theoretical_switch_rate"]) < 0.01, rules
+
+    # Monty Fall: once the car survives a random reveal, switching doesn't help.
+    res = monty_hall.simulate(200_000, seed=4, host="ignorant")
+    assert res["theoretical_switch_rate"] == 0.5
+    assert abs(res["car_revealed"] / 200_000 - 1 / 3) < 0.01
+    exact = monty_hall.simulate(200_000, seed=4, host="ignorant", method="exact")
+    assert abs(exact["switch_rate"] - 0.5) < 0.01
+
+    # An always-biased host opening the lowest door leaves a 50/50 choice: 2 / (3 + q).
+    res = monty_hall.simulate(200_000, seed=5, host="biased", host_bias=1.0)
+    assert abs(res["switch_rate_given_lowest"] - 0.5) < 0.01
+
+
 # --- Birthday ------------------------------------------------------------
 
 def test_birthday_theoretical_known_values():
@@ -47,6 +85,59 @@ def test_birthday_simulation_tracks_theory():
     assert res["difference"] < 0.02
 
 
+def test_birthday_kernels_agree_with_theory():
+    for kernel in birthday.KERNELS:
+        for group_size in (2, 23, 60):
+            res = birthday.simulate(group_size, 20000, seed=4, kernel=kernel)
+            assert res["difference"] < 0.02, (kernel, group_size)
+
+
+def test_birthday_sweep_tracks_theory_at_every_size():
+    results = birthday.sweep([40, 10, 23], trials=20000, seed=6)
+    assert [r["group_size"] for r in results] == [40, 10, 23]
+    assert all(r["difference"] < 0.02 for r in results)
+    # Prefix groups: a match among 10 people is also one among 23 and 40.
+    assert results[1]["matches"] <= results[2]["matches"] <= results[0]["matches"]
+
+
+def test_birthday_calendars_track_theory():
+    for calendar in (
+        {"days": 366, "weights": birthday.leap_year_weights()},
+        {"weights": [2.0] * 90 + [1.0] * 275},
+        {"window": 1},
+        {"days": 100, "window": 3},
+    ):
+        res = birthday.simulate(20, 100_000, seed=2, **calendar)
+        assert res["difference"] < 0.01, calendar
+    # Near matches among 2 people on 365 days: 2·window + 1 days out of 365.
+    assert birthday.calendar_probability(2, window=7) == pytest.approx(15 / 365)
+    # Unequal days make a shared birthday more likely.
+    skewed = birthday.calendar_probability(23, weights=tuple([2.0] * 90 + [1.0] * 275))
+    assert skewed > birthday.theoretical_probability(23)
+
+    prob, alias = birthday.alias_table((1.0, 3.0, 0.0, 4.0))
+    kept = prob / 4
+    donated = np.bincount(alias, weights=(1 - prob) / 4, minlength=4)
+    assert np.allclose(kept + donated, [1 / 8, 3 / 8, 0, 1 / 2])
+
+
+def test_birthday_cross_group_kernels_agree():
+    # One person per group: a cross match is just the two being close.
+    res = birthday.simulate(1, 100_000, seed=3, groups=2, window=5)
+    assert res["theoretical_probability"] is None
+    assert abs(res["simulated_probability"] - 11 / 365) < 0.003
+    # Sorted (day, group) keys and occupancy counting answer the same question.
+    calendar = {"group_size": 12, "days": 365, "table": None, "groups": 3}
+    rates = [
+        engine.run(step, 50_000, seed=5)["matches"] / 50_000
+        for step in (
+            partial(birthday._batch_calendar, window=0, **calendar),
+            partial(birthday._batch_cross, **calendar),
+        )
+    ]
+    assert abs(rates[0] - rates[1]) < 0.015
+
+
 def test_birthday_curve_is_monotonic():
     points = birthday.curve(100)["points"]
     probs = [p["probability"] for p in points]
@@ -54,6 +145,28 @@ def test_birthday_curve_is_monotonic():
     assert probs[-1] > 0.99
 
 
+def test_birthday_table_matches_product_formula():
+    prob_no_match = 1.0
+    for n in range(1, 60):
+        prob_no_match *= (365 - n + 1) / 365
+        assert birthday.theoretical_probability(n) == 1.0 - prob_no_match
+
+
+def test_birthday_k_way_matches():
+    # Classic results: 88 people for a 50% triple, 187 for a quadruple.
+    assert abs(birthday.theoretical_probability(88, k=3) - 0.511) < 0.001
+    assert abs(birthday.theoretical_probability(187, k=4) - 0.503) < 0.001
+    assert birthday.theoretical_probability(731, k=3) == 1.0
+
+
+def test_birthday_curve_endpoint_with_custom_calendar():
+    res = client.get("/api/birthday/curve", params={"max_size": 30, "days": 10, "k": 2})
+    assert res.status_code == 200
+    body = res.json()
+    assert body["days"] == 10 and len(body["points"]) == 30
+    assert body["points"][-1]["probability"] == 1.0
+
+
 # --- Two Envelopes -------------------------------------------------------
 
 def test_two_envelopes_switching_has_no_edge():
@@ -62,6 +175,31 @@ def test_two_envelopes_switching_has_no_edge():
     assert abs(res["switch_advantage_pct"]) < 5.0
 
 
+def test_two_envelopes_priors_match_their_expectations():
+    for prior, ratio in (("geometric", 0.8), ("doubling", 0.2), ("log-uniform", 0.5)):
+        res = two_envelopes.simulate(400_000, max_base=1000, seed=5, prior=prior, ratio=ratio)
+        expected = res["theoretical_avg"]
+        assert abs(res["avg_stay"] / expected - 1) < 0.02, prior
+        assert abs(res["avg_switch"] / expected - 1) < 0.02, prior
+
+    exact = two_envelopes.simulate(10**12, seed=5, prior="geometric", ratio=0.8, method="exact")
+    assert abs(exact["avg_stay"] - 7.5) < 1e-3 and abs(exact["switch_advantage"]) < 1e-3
+
+    # Broome's prior has no mean to converge to.
+    res = two_envelopes.simulate(100_000, seed=5, prior="doubling")
+    assert res["theoretical_avg"] is None and res["avg_stay"] > 0
+
+
+def test_moments_merge_like_one_pass():
+    values = np.random.default_rng(0).pareto(2.5, 10_001) * 1e6
+    merged = 0 + sum(
+        (engine.Moments.of(part) for part in np.array_split(values, 7)), engine.Moments.of([])
+    )
+    assert merged.n == len(values)
+    assert abs(merged.mean / values.mean() - 1) < 1e-12
+    assert abs(merged.variance / values.var(ddof=1) - 1) < 1e-9
+
+
 # --- Sleeping Beauty -----------------------------------------------------
 
 def test_sleeping_beauty_supports_thirder():
@@ -81,8 +219,320 @@ def test_simpsons_paradox_present():
     assert data["overall"]["male_rate"] > data["overall"]["female_rate"]
 
 
+def _berkeley_csv(repeat=1):
+    rows = ["department,group,applied,admitted"]
+    for dept in simpsons._DEPARTMENTS:
+        for group in ("male", "female"):
+            rows += [f"{dept['name']},{group},{dept[group][0]},{dept[group][1]}"] * repeat
+    return ("\n".join(rows) + "\n").encode()
+
+
+def test_simpsons_table_streams_csv_and_finds_the_reversal(monkeypatch):
+    monkeypatch.setattr(simpsons, "CSV_CHUNK_BYTES", 64)
+    data = _berkeley_csv(repeat=50)
+    table = simpsons.Table()
+    for i in range(0, len(data), 7):
+        table.feed_csv(data[i:i + 7])
+    table.close()
+    result = table.analysis()
+
+    assert result["rows"] == 200 and result["strata_count"] == 2
+    overall = simpsons.dataset()["overall"]
+    assert {g["name"]: g["rate"] for g in result["groups"]} == {
+        "male": overall["male_rate"], "female": overall["female_rate"],
+    }
+    (reversal,) = result["reversals"]
+    assert reversal["pooled_leader"] == "male" and reversal["stratum_leader"] == "female"
+    assert reversal["every_stratum"] and result["paradox"]
+
+
+def test_simpsons_generator_reverses_every_adjacent_pair():
+    result = simpsons.generate(200_000, strata=50, groups=4, seed=1, strata_limit=5)
+    assert result["rows"] == 200_000 and len(result["strata"]) == 5
+    assert sum(g["trials"] for g in result["groups"]) == 200_000
+    rates = [g["rate"] for g in result["groups"]]
+    assert rates == sorted(rates, reverse=True)
+    # Later groups do better within strata, so every pair reverses.
+    assert len(result["reversals"]) == result["pairs_checked"] == 6
+    assert all(r["stratum_leader"] > r["pooled_leader"] for r in result["reversals"])
+
+
+def test_simpsons_endpoints():
+    res = client.post("/api/simpsons/analyze", content=_berkeley_csv())
+    assert res.status_code == 200 and res.json()["paradox"] is True
+    assert client.post("/api/simpsons/analyze", content=b"a,b\n1,2\n").status_code == 422
+    bad = b"stratum,group,success,count\nA,x,3,2\nA,y,1,1\n"
+    assert client.post("/api/simpsons/analyze", content=bad).status_code == 422
+
+    body = {"rows": 20_000, "strata": 10, "seed": 3, "strata_limit": 0}
+    res = client.post("/api/simpsons/generate", json=body).json()
+    assert res["strata"] == [] and res["paradox"] is True
+
+
+def test_simpsons_reads_parquet(tmp_path):
+    pa = pytest.importorskip("pyarrow")
+    import pyarrow.parquet as pq
+
+    path = tmp_path / "admissions.parquet"
+    pq.write_table(
+        pa.table({"stratum": ["A", "A", "B", "B"], "group": ["m", "f", "m", "f"],
+                  "count": [100, 20, 20, 100], "success": [80, 18, 10, 60]}),
+        path,
+    )
+    table = simpsons.Table()
+    with open(path, "rb") as f:
+        table.read_parquet(f, batch_rows=2)
+    assert table.analysis()["paradox"] is True
+
+
+def test_simpsons_numeric_labels_become_strings():
+    table = simpsons.Table()
+    table.add(np.array([1, 1, 2, 2]), np.array([10, 20, 10, 20]), [1, 0, 1, 1])
+    table.add(["1"], ["10"], [0])  # The same labels, as a CSV would spell them.
+    result = table.analysis()
+    assert [g["name"] for g in result["groups"]] == ["10", "20"]
+    assert [s["name"] for s in result["strata"]] == ["1", "2"] and result["rows"] == 5
+
+    pa = pytest.importorskip("pyarrow")
+    import pyarrow.parquet as pq
+
+    sink = io.BytesIO()
+    pq.write_table(
+        pa.table({"stratum": [1, 1, 2, 2], "group": [10, 20, 10, 20], "success": [1, 0, 1, 1]}),
+        sink,
+    )
+    res = client.post(
+        "/api/simpsons/analyze",
+        content=sink.getvalue(),
+        headers={"Content-Type": "application/vnd.apache.parquet"},
+    )
+    assert res.status_code == 200
+    assert [g["name"] for g in res.json()["groups"]] == ["10", "20"]
+
+
+# --- Raw exports ---------------------------------------------------------
+
+def test_export_columns_replay_the_simulated_run(monkeypatch):
+    monkeypatch.setattr(config, "SIMULATION_CHUNK_ELEMENTS", 7_000)
+    data = b"".join(columnar.encode("npy", monty_hall.export(50_000, 3, doors=5), 50_000))
+    games = np.load(io.BytesIO(data))
+    assert games.shape == (50_000,) and games["car"].dtype == np.int8
+    result = monty_hall.simulate(50_000, 3, doors=5)
+    assert games["switch_wins"].sum() == result["switch_wins"]
+    assert ((games["switch"] == games["car"]) == games["switch_wins"]).all()
+
+    batches = two_envelopes.export(20_000, seed=4, prior="geometric")
+    switched = sum(int(batch["switch"].sum()) for batch in batches)
+    result = two_envelopes.simulate(20_000, seed=4, prior="geometric")
+    assert switched / 20_000 == result["avg_switch"]
+
+
+def test_export_endpoint():
+    body = {"group_size": 23, "trials": 30_000, "seed": 5}
+    res = client.post("/api/birthday/export", json=body)
+    assert res.headers["content-disposition"] == 'attachment; filename="birthday-5.npy"'
+    groups = np.load(io.BytesIO(res.content))
+    assert groups["matches"].sum() == birthday.simulate(23, 30_000, 5)["matches"]
+
+    res = client.post("/api/sleeping-beauty/export", json={"trials": 1000})
+    seed = int(res.headers["x-seed"])
+    assert np.load(io.BytesIO(res.content))["heads"].sum() == (
+        sleeping_beauty.simulate(1000, seed)["heads_count"]
+    )
+    exact = {**body, "method": "exact"}
+    assert client.post("/api/birthday/export", json=exact).status_code == 422
+
+
+def test_export_arrow_and_parquet():
+    pa = pytest.importorskip("pyarrow")
+    import pyarrow.parquet as pq
+
+    body = {"trials": 30_000, "seed": 6}
+    res = client.post("/api/two-envelopes/export?format=arrow", json=body)
+    table = pa.ipc.open_stream(res.content).read_all()
+    assert table.num_rows == 30_000 and table.column_names[-2:] == ["base", "picked_smaller"]
+    res = client.post("/api/two-envelopes/export?format=parquet", json=body)
+    assert pq.read_table(io.BytesIO(res.content)).equals(table)
+
+
+# --- Exact sampling ------------------------------------------------------
+
+def _count_moments(samples):
+    n = len(samples)
+    mean = sum(samples) / n
+    return mean, sum((x - mean) ** 2 for x in samples) / (n - 1)
+
+
+def test_exact_method_matches_monte_carlo_distribution():
+    # Small runs repeated over many seeds: the win-count distribution of both
+    # methods should share Binomial(30, 1/3)'s mean (10) and variance (6.67).
+    for method in ("monte-carlo", "exact"):
+        wins = [monty_hall.simulate(30, seed=s, method=method)["stay_wins"] for s in range(3000)]
+        mean, var = _count_moments(wins)
+        assert abs(mean - 10) < 0.2 and abs(var - 20 / 3) < 0.6, method
+
+
+def test_two_envelopes_exact_totals_distribution():
+    for method in ("monte-carlo", "exact"):
+        stays = [
+            two_envelopes.simulate(20, max_base=10, seed=s, method=method)["avg_stay"]
+            for s in range(3000)
+        ]
+        mean, var = _count_moments(stays)
+        # E = 1.5 * 5.5; per-round variance is (E[X²] + E[4X²]) / 2 - E² = 28.1875.
+        assert abs(mean - 8.25) < 0.1 and abs(var - 28.1875 / 20) < 0.1, method
+
+
+def test_exact_method_handles_huge_runs():
+    res = sleeping_beauty.simulate(10**12, seed=1, method="exact")
+    assert abs(res["p_heads_given_awake"] - 1 / 3) < 1e-5
+    res = birthday.simulate(23, 10**12, seed=1, method="exact")
+    assert res["difference"] < 1e-5
+
+
+def test_monte_carlo_cap_only_applies_to_monte_carlo():
+    body = {"games": 10**9, "seed": 1}
+    assert client.post("/api/monty-hall/simulate", json=body).status_code == 422
+    res = client.post("/api/monty-hall/simulate", json={**body, "method": "exact"})
+    assert res.status_code == 200 and res.json()["games"] == 10**9
+
+
+# --- Engine --------------------------------------------------------------
+
+def test_engine_batches_cover_every_trial():
+    assert list(engine.batches(10, 4)) == [4, 4, 2]
+    assert engine.batch_rows(width=365, chunk_elements=1000) == 2
+
+
+def test_engine_small_batches_match_statistics():
+    step = monty_hall._batch
+    totals = engine.run(step, 20000, seed=5, chunk_elements=997)
+    assert abs(totals["stay_wins"] / 20000 - 1 / 3) < 0.02
+    assert totals == engine.run(step, 20000, seed=5, chunk_elements=997)
+
+
+def test_engine_result_is_independent_of_worker_count():
+    step = partial(two_envelopes._batch, max_base=50)
+    kwargs = {"seed": 11, "shard_elements": 3000, "chunk_elements": 700}
+    serial = engine.run(step, 20000, workers=1, **kwargs)
+    assert len(engine.shards(20000, 11, shard_elements=3000)) == 7
+    try:
+        assert engine.run(step, 20000, workers=3, **kwargs) == serial
+    finally:
+        engine.shutdown()
+
+
+def test_stream_ends_on_the_simulate_result():
+    updates = list(sleeping_beauty.stream(2500, seed=8))
+    assert [u["trials"] for u in updates] == [2500]
+    assert updates[-1] == sleeping_beauty.simulate(2500, seed=8)
+
+    done = [d for d, _ in engine.iterate(monty_hall._batch, 1000, seed=3, chunk_elements=300)]
+    assert done == [300, 600, 900, 1000]
+
+
+def test_precision_target_stops_early_and_reports_ci():
+    res = monty_hall.simulate(10_000_000, seed=4, target_se=0.005)
+    prec = res["precision"]
+    assert prec["target_met"] and prec["standard_error"] <= 0.005
+    assert prec["trials_used"] == res["games"] < 20_000
+    assert prec["ci_low"] < 2 / 3 < prec["ci_high"]
+    assert res == monty_hall.simulate(10_000_000, seed=4, target_se=0.005)
+
+    # Rare events need far more trials for the same precision.
+    res = birthday.simulate(80, 1_000_000, seed=4, target_se=0.0001)
+    assert res["precision"]["target_met"] and res["trials"] > 10_000
+
+    res = two_envelopes.simulate(500, seed=4, target_se=0.01)
+    assert res["trials"] == 500 and not res["precision"]["target_met"]
+
+    res = sleeping_beauty.simulate(10**6, seed=4, target_se=0.002)
+    assert abs(res["precision"]["estimate"] - 1 / 3) < 0.01
+
+
+def test_trace_converges_and_matches_the_plain_run():
+    res = sleeping_beauty.simulate(200_000, seed=6, trace_points=40)
+    trace = res.pop("trace")
+    assert res == sleeping_beauty.simulate(200_000, seed=6)
+    assert trace[0]["trials"] == 1 and trace[-1]["trials"] == 200_000
+    assert trace[-1]["estimate"] == res["p_heads_given_awake"]
+    assert abs(trace[-1]["estimate"] - 1 / 3) < abs(trace[5]["estimate"] - 1 / 3) + 0.01
+
+    at = traces.positions(10_000, 5)
+    step = monty_hall._batch
+    totals, running = engine.run_traced(step, 10_000, seed=1, at=at, chunk_elements=999)
+    assert totals == engine.run(step, 10_000, seed=1, chunk_elements=999)
+    assert running["stay_wins"][-1] == totals["stay_wins"] and len(running["stay_wins"]) == 5
+
+
+def test_sampling_designs_reduce_variance_without_bias():
+    # One coin per trial: antithetic pairs and strata split heads exactly.
+    for mode in ("antithetic", "stratified"):
+        report = sleeping_beauty.simulate(10_240, seed=1, sampling_mode=mode)["sampling"]
+        assert report["estimate"] == pytest.approx(1 / 3)
+        assert report["standard_error"] == 0 and report["variance_reduction"] is None
+
+    report = monty_hall.simulate(100_000, seed=2, sampling_mode="qmc")["sampling"]
+    assert abs(report["estimate"] - 2 / 3) < 3 * report["standard_error"]
+    assert report["variance_reduction"] > 3
+
+    res = birthday.simulate(23, 100_000, seed=3, sampling_mode="control-variate")
+    report = res["sampling"]
+    assert abs(report["estimate"] - res["theoretical_probability"]) < 4 * report["standard_error"]
+    assert report["variance_reduction"] > 2
+
+    res = two_envelopes.simulate(
+        100_000, seed=4, prior="geometric", sampling_mode="control-variate"
+    )
+    assert abs(res["sampling"]["estimate"]) < 4 * res["sampling"]["standard_error"]
+    assert res["sampling"]["variance_reduction"] > 1.5
+    with pytest.raises(ValueError):
+        monty_hall.simulate(1000, doors=4, sampling_mode="qmc")
+
+
+def test_sampling_report_survives_a_large_offset():
+    # Raw sums of squares lose every digit of a 1/12 variance around 1e9.
+    def offset(u):
+        return {"y": 1e9 + u[:, 0], "c": 1e9 + u[:, 0] + u[:, 1]}
+
+    _, report = sampling.run(
+        offset, 2, 20_000, 1, "control-variate",
+        estimand="y", control="c", control_mean=1e9 + 1.0, chunk_elements=5_000,
+    )
+    assert report["iid_standard_error"] == pytest.approx(math.sqrt(1 / 12 / 20_000), rel=0.05)
+    # Half of c's spread is y's, so the control removes about half the variance.
+    assert report["variance_reduction"] == pytest.approx(2, rel=0.1)
+
+
+def test_lttb_keeps_endpoints_and_extremes():
+    x = np.arange(1000.0)
+    y = np.where(x == 500, 10.0, np.sin(x / 40))
+    keep = traces.lttb(x, y, 25)
+    assert len(keep) == 25 and keep[0] == 0 and keep[-1] == 999
+    assert 500 in keep and np.all(np.diff(keep) > 0)
+    res = two_envelopes.simulate(50_000, seed=2, trace_points=30, trace_spacing="lttb")
+    assert len(res["trace"]) == 30
+
+
+def test_birthday_chunking_bounds_rows():
+    seen = []
+
+    def step(rng, n):
+        seen.append(n)
+        return birthday._batch_sort(rng, n, group_size=50)
+
+    totals = engine.run(step, 1000, seed=2, width=50, chunk_elements=5000)
+    assert max(seen) == 100 and sum(seen) == 1000
+    assert 0 <= totals["matches"] <= 1000
+
+
 # --- API -----------------------------------------------------------------
 
+def test_app_import_defers_numpy():
+    code = "import sys, app.main; assert 'numpy' not in sys.modules"
+    subprocess.run([sys.executable, "-c", code], check=True, cwd=Path(__file__).parents[1])
+
+
 def test_health_ok():
     assert client.get("/health").json()["status"] == "ok"
 
@@ -94,12 +544,181 @@ def test_list_paradoxes():
     assert ids == {"monty-hall", "birthday", "two-envelopes", "sleeping-beauty", "simpsons"}
 
 
+def test_static_responses_revalidate_with_etags():
+    for path in ("/api/paradoxes", "/api/simpsons/data", "/api/birthday/curve?max_size=20"):
+        first = client.get(path)
+        etag = first.headers["etag"]
+        assert etag.startswith('"') and "max-age" in first.headers["cache-control"]
+        assert client.get(path).content == first.content
+
+        cached = client.get(path, headers={"If-None-Match": f'"other", W/{etag}'})
+        assert cached.status_code == 304 and cached.content == b""
+        assert cached.headers["etag"] == etag
+        assert client.get(path, headers={"If-None-Match": '"other"'}).status_code == 200
+
+    other = client.get("/api/birthday/curve?max_size=21").headers["etag"]
+    assert other != client.get("/api/birthday/curve?max_size=20").headers["etag"]
+
+
+def test_two_envelopes_prior_validation():
+    url = "/api/two-envelopes/simulate"
+    ok = client.post(url, json={"trials": 1000, "seed": 1, "prior": "doubling", "ratio": 0.6})
+    assert ok.status_code == 200 and ok.json()["theoretical_avg"] is None
+    for bad in (
+        {"prior": "doubling", "method": "exact"},
+        {"prior": "doubling", "ratio": 0.3, "precision": {"standard_error": 1}},
+        {"prior": "geometric", "ratio": 1},
+        # 2^K would overflow float64 and the averages would come out NaN.
+        {"prior": "doubling", "ratio": 0.99, "trials": 100_000},
+    ):
+        assert client.post(url, json=bad).status_code == 422, bad
+    steep = client.post(url, json={"prior": "doubling", "ratio": 0.9, "trials": 100_000})
+    assert steep.status_code == 200 and math.isfinite(steep.json()["avg_switch"])
+
+
 def test_monty_hall_endpoint():
     res = client.post("/api/monty-hall/simulate", json={"games": 5000, "seed": 1})
     assert res.status_code == 200
     assert abs(res.json()["switch_rate"] - 2 / 3) < 0.03
 
 
+def test_monty_hall_variant_endpoint():
+    body = {"games": 5000, "seed": 1, "doors": 4, "host": "ignorant"}
+    res = client.post("/api/monty-hall/simulate", json=body).json()
+    assert res["doors"] == 4 and res["opened"] == 2 and "car_revealed" in res
+    assert "car_revealed" not in client.post("/api/monty-hall/simulate", json={"seed": 1}).json()
+    for bad in (
+        {"doors": 4, "opened": 3},
+        {"host": "biased", "method": "exact"},
+        {"doors": 100, "games": 10**7},
+    ):
+        assert client.post("/api/monty-hall/simulate", json=bad).status_code == 422, bad
+
+
+def test_stream_endpoint_ndjson_and_sse():
+    body = {"trials": 3000, "seed": 2}
+    res = client.post("/api/two-envelopes/stream", json=body)
+    assert res.headers["content-type"].startswith("application/x-ndjson")
+    lines = [json.loads(line) for line in res.text.splitlines()]
+    assert lines[-1]["done"] and lines[-1]["progress"] == 1
+    simulated = client.post("/api/two-envelopes/simulate", json=body).json()
+    assert lines[-1]["result"] == simulated
+
+    res = client.post(
+        "/api/monty-hall/stream",
+        json={"games": 100, "method": "exact"},
+        headers={"Accept": "text/event-stream"},
+    )
+    assert res.text.startswith("data: ") and res.text.endswith("\n\n")
+
+
+def test_batch_endpoint_mixes_paradoxes():
+    body = {
+        "requests": [
+            {"paradox": "birthday", "group_size": 10, "trials": 5000, "seed": 1},
+            {"paradox": "monty-hall", "games": 500, "seed": 4},
+            {"paradox": "birthday", "group_size": 50, "trials": 5000, "seed": 1},
+            {"paradox": "sleeping-beauty", "trials": 100, "method": "exact"},
+        ]
+    }
+    res = client.post("/api/batch/simulate", json=body)
+    assert res.status_code == 200
+    results = res.json()["results"]
+    assert [r["paradox"] for r in results] == [
+        "birthday", "monty-hall", "birthday", "sleeping-beauty",
+    ]
+    assert [results[0]["result"]["group_size"], results[2]["result"]["group_size"]] == [10, 50]
+    single = client.post("/api/monty-hall/simulate", json={"games": 500, "seed": 4}).json()
+    assert results[1]["result"] == single
+
+
+def test_batch_rejects_too_much_total_work():
+    item = {"paradox": "monty-hall", "games": 60_000_000}
+    res = client.post("/api/batch/simulate", json={"requests": [item, item]})
+    assert res.status_code == 422
+    # Each paradox counts against its own cap: ten birthday items at 10M trials
+    # would be ten times what one /birthday/simulate may run.
+    item = {"paradox": "birthday", "group_size": 365, "trials": 10_000_000}
+    res = client.post("/api/batch/simulate", json={"requests": [item] * 10})
+    assert res.status_code == 422
+    half = {"paradox": "birthday", "trials": 5_000_000, "method": "exact"}
+    assert schemas.BatchRequest(requests=[half, {**item, "trials": 5_000_000}])
+
+
+def test_precision_endpoint_accepts_half_width():
+    body = {"games": 10**6, "seed": 1, "precision": {"half_width": 0.01}}
+    res = client.post("/api/monty-hall/simulate", json=body)
+    assert res.status_code == 200
+    prec = res.json()["precision"]
+    assert prec["ci_high"] - prec["ci_low"] <= 0.02 + 1e-9
+    assert prec["trials_used"] < 10**6
+
+    for precision in ({}, {"standard_error": 0.1, "half_width": 0.1}):
+        res = client.post("/api/monty-hall/simulate", json={"precision": precision})
+        assert res.status_code == 422
+    res = client.post("/api/monty-hall/simulate", json={**body, "method": "exact"})
+    assert res.status_code == 422
+
+
+def test_trace_endpoint():
+    body = {"group_size": 23, "trials": 20_000, "seed": 3, "trace_points": 12}
+    res = client.post("/api/birthday/simulate", json=body).json()
+    assert len(res["trace"]) == 12
+    assert res["trace"][-1]["estimate"] == res["simulated_probability"]
+    assert "trace" not in client.post("/api/birthday/simulate", json={"seed": 3}).json()
+    res = client.post("/api/birthday/simulate", json={**body, "method": "exact"})
+    assert res.status_code == 422
+
+
+def test_sampling_endpoint():
+    body = {"group_size": 23, "trials": 20_000, "seed": 3, "sampling": "stratified"}
+    res = client.post("/api/birthday/simulate", json=body).json()
+    assert res["sampling"]["sampling"] == "stratified"
+    assert "sampling" not in client.post("/api/birthday/simulate", json={"seed": 3}).json()
+    bad = [
+        ("/api/sleeping-beauty/simulate", {"trials": 1000, "sampling": "control-variate"}),
+        ("/api/birthday/simulate", {"trials": 100, "sampling": "qmc"}),
+        ("/api/birthday/simulate", {**body, "method": "exact"}),
+        ("/api/monty-hall/simulate", {"games": 1000, "doors": 4, "sampling": "qmc"}),
+        ("/api/two-envelopes/simulate", {"prior": "doubling", "sampling": "qmc"}),
+    ]
+    for path, body in bad:
+        assert client.post(path, json=body).status_code == 422, body
+
+
+def test_birthday_calendar_endpoint():
+    body = {"group_size": 10, "trials": 20_000, "seed": 1, "groups": 2}
+    res = client.post("/api/birthday/simulate", json=body).json()
+    assert res["groups"] == 2 and res["theoretical_probability"] is None
+    leap = {"days": 366, "weights": [1.0] * 59 + [0.25] + [1.0] * 306, "method": "exact"}
+    assert client.post("/api/birthday/simulate", json=leap).json()["days"] == 366
+    for bad in (
+        {"weights": [1.0] * 10},
+        {"days": 10, "window": 5},
+        {**body, "method": "exact"},
+        {**body, "sampling": "qmc"},
+        # Few people, but occupancy counting walks 10 × 5000 cells per trial.
+        {"days": 5000, "groups": 10, "group_size": 125, "trials": 800_000},
+    ):
+        assert client.post("/api/birthday/simulate", json=bad).status_code == 422, bad
+
+
 def test_validation_rejects_out_of_range():
     res = client.post("/api/birthday/simulate", json={"group_size": 9999, "trials": 10})
     assert res.status_code == 422
+
+
+def test_fast_json_matches_validated_responses(monkeypatch):
+    calls = [
+        ("get", "/api/paradoxes", None),
+        ("post", "/api/monty-hall/simulate", {"games": 500, "seed": 1}),
+        ("post", "/api/birthday/simulate", {"trials": 500, "seed": 1}),
+        ("post", "/api/two-envelopes/simulate", {"trials": 500, "seed": 1}),
+        ("post", "/api/sleeping-beauty/simulate", {"trials": 500, "seed": 1}),
+        ("get", "/api/birthday/curve?max_size=50", None),
+        ("get", "/api/simpsons/data", None),
+        ("post", "/api/batch/simulate", {"requests": [{"paradox": "birthday", "seed": 2}]}),
+    ]
+    expected = [client.request(m, path, json=body).json() for m, path, body in calls]
+    monkeypatch.setattr(config, "FAST_JSON", True)
+    assert [client.request(m, path, json=body).json() for m, path, body in calls] == expected
@@ -79,12 +79,16 @@ export function Birthday() {
             />
             <StatCard
               label="Theoretical"
-              value={`${(result.theoretical_probability * 100).toFixed(1)}%`}
+              value={
+                result.theoretical_probability === null
+                  ? "—"
+                  : `${(result.theoretical_probability * 100).toFixed(1)}%`
+              }
               accent="text-ink"
             />
             <StatCard
               label="Difference"
-              value={`${(result.difference * 100).toFixed(2)}%`}
+              value={result.difference === null ? "—" : `${(result.difference * 100).toFixed(2)}%`}
               accent="text-slate-500"
             />
           </div>
@@ -30,36 +30,94 @@ export async function postJSON<T>(path: string, body: unknown): Promise<T> {
 
 // --- Response types (mirror backend/app/schemas.py) ----------------------
 
+// Present when the request set `precision`.
+export interface PrecisionReport {
+  estimate: number;
+  standard_error: number;
+  confidence: number;
+  ci_low: number;
+  ci_high: number;
+  target_standard_error: number;
+  target_met: boolean;
+  trials_used: number;
+}
+
+// Running estimate vs. trials; present when the request set `trace_points`.
+export interface TracePoint {
+  trials: number;
+  estimate: number;
+}
+
+// Present when the request set `sampling` to a design other than "iid".
+export type Sampling = "iid" | "antithetic" | "stratified" | "qmc" | "control-variate";
+
+export interface SamplingReport {
+  sampling: Sampling;
+  estimate: number;
+  standard_error: number;
+  iid_standard_error: number;
+  // Plain trials each sampled trial is worth; null when the variance vanished.
+  variance_reduction: number | null;
+}
+
+export type MontyHallHost = "standard" | "ignorant" | "biased";
+
 export interface MontyHallResult {
   games: number;
+  doors: number;
+  opened: number;
+  host: MontyHallHost;
   stay_wins: number;
   switch_wins: number;
   stay_rate: number;
   switch_rate: number;
   theoretical_stay_rate: number;
   theoretical_switch_rate: number;
+  car_revealed?: number;
+  lowest_opened?: number;
+  switch_rate_given_lowest?: number;
+  precision?: PrecisionReport;
+  trace?: TracePoint[];
+  sampling?: SamplingReport;
 }
 
 export interface BirthdayResult {
   group_size: number;
   trials: number;
   matches: number;
+  days: number;
+  window: number;
+  groups: number;
   simulated_probability: number;
-  theoretical_probability: number;
-  difference: number;
+  // null when the calendar has no closed form (e.g. several groups).
+  theoretical_probability: number | null;
+  difference: number | null;
+  precision?: PrecisionReport;
+  trace?: TracePoint[];
+  sampling?: SamplingReport;
 }
 
 export interface BirthdayCurve {
   max_size: number;
+  days: number;
+  k: number;
   points: { group_size: number; probability: number }[];
 }
 
+export type TwoEnvelopesPrior = "uniform" | "geometric" | "doubling" | "log-uniform";
+
 export interface TwoEnvelopesResult {
   trials: number;
+  prior: TwoEnvelopesPrior;
   avg_stay: number;
   avg_switch: number;
   switch_advantage: number;
   switch_advantage_pct: number;
+  // 1.5 × E[smaller amount]; null when the prior's expectation is infinite.
+  theoretical_avg: number | null;
+  precision?: PrecisionReport;
+  trace?: TracePoint[];
+  sampling?: SamplingReport;
 }
 
 export interface SleepingBeautyResult {
@@ -71,6 +129,9 @@ export interface SleepingBeautyResult {
   p_tails_given_awake: number;
   halfer_position: number;
   thirder_position: number;
+  precision?: PrecisionReport;
+  trace?: TracePoint[];
+  sampling?: SamplingReport;
 }
 
 export interface SimpsonsDepartment {
@@ -95,3 +156,38 @@ export interface SimpsonsData {
   };
   paradox: boolean;
 }
+
+// POST /api/simpsons/analyze (CSV/Parquet body) and /api/simpsons/generate.
+// Rates are percentages; per-stratum arrays follow the order of `groups`.
+export interface SimpsonsAnalysis {
+  rows: number;
+  strata_count: number;
+  groups: { name: string; trials: number; successes: number; rate: number }[];
+  strata: { name: string; trials: number[]; successes: number[]; rates: number[] }[];
+  reversals: {
+    pooled_leader: string;
+    stratum_leader: string;
+    pooled_gap: number;
+    adjusted_gap: number;
+    strata: number;
+    strata_agreeing: number;
+    every_stratum: boolean;
+  }[];
+  pairs_checked: number;
+  paradox: boolean;
+}
+
+// POST /api/jobs (a batch item with raised caps), GET/DELETE /api/jobs/{id}.
+export type JobStatus = "queued" | "running" | "done" | "failed" | "cancelled";
+
+export interface Job {
+  id: string;
+  paradox: string;
+  request: Record<string, unknown>;
+  status: JobStatus;
+  progress: number;
+  created: number;
+  updated: number;
+  result?: MontyHallResult | BirthdayResult | TwoEnvelopesResult | SleepingBeautyResult;
+  error?: string;
+}